@@ -2,9 +2,14 @@
 Tone Detection API using Flask
 """
 import os
+import re
+import time
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, g, request
 from flask_smorest import Api
+from metrics_service import metrics, tracing
+from resources.admin import blp as AdminBlueprint
+from resources.metrics import blp as MetricsBlueprint
 from resources.tone import blp as ToneBlueprint
 
 load_dotenv()
@@ -24,8 +29,29 @@ app.config[
 api = Api(app)
 
 api.register_blueprint(ToneBlueprint)
+api.register_blueprint(MetricsBlueprint)
+api.register_blueprint(AdminBlueprint)
+
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    g.trace = tracing.start_trace(request.path)
+
+
+@app.teardown_request
+def finish_request_timing(exc):
+    start = g.pop("request_start", None)
+    if start is not None and request.endpoint:
+        # e.g. Tone.SlackEvents -> http_tone_slackevents_seconds
+        name = "http_" + re.sub(r"[^a-z0-9]+", "_", request.endpoint.lower()) + "_seconds"
+        metrics.histogram(name, f"Time to answer {request.path}").observe(time.perf_counter() - start)
+    tracing.end_trace(g.pop("trace", None))
 
 
 
 if __name__ == "__main__":
+    # Under gunicorn, post_fork in gunicorn.conf.py starts the scheduler in each worker
+    from worker_service.reminder_scheduler import reminders
+    reminders.start()
     app.run(debug=True, host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+bench_async_llm.py
+Compares the threaded detect_tone path with the asyncio path.
+Gemini is replaced by an in-process stand-in with a fixed latency, so the
+benchmark measures how many calls each path keeps in flight, not the model.
+
+Usage:
+    python -m benchmarks.bench_async_llm --calls 400 --latency 0.5 --threads 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import types as pytypes
+from concurrent.futures import ThreadPoolExecutor, wait
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from llm_service import llm_functions
+from llm_service.async_bridge import bridge
+from llm_service.async_llm_functions import detect_tone_async
+
+
+def _answer(contents):
+    return pytypes.SimpleNamespace(text=json.dumps({
+        "original_message": contents,
+        "tone": "neutral",
+        "explanation": "Benchmark answer.",
+        "urgency": "not urgent",
+        "confidence": 90,
+        "quick_replies": ["Ok", "Thanks", "Noted"]
+    }))
+
+
+class FakeModels:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency)
+        return _answer(contents)
+
+
+class FakeAsyncModels:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(self.latency)
+        return _answer(contents)
+
+
+def bench_threaded(texts, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        wait([pool.submit(llm_functions.detect_tone, text) for text in texts])
+    return time.perf_counter() - start
+
+
+def bench_async(texts):
+    start = time.perf_counter()
+    futures = [bridge.submit(detect_tone_async(text)) for text in texts]
+    wait(futures)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated Gemini latency in seconds")
+    parser.add_argument("--threads", type=int, default=8, help="Threads for the threaded path (gunicorn --threads)")
+    args = parser.parse_args()
+
+    llm_functions.client = pytypes.SimpleNamespace(
+        models=FakeModels(args.latency),
+        aio=pytypes.SimpleNamespace(models=FakeAsyncModels(args.latency))
+    )
+    # Unique texts so the tone cache never answers
+    threaded_texts = [f"threaded message {i}" for i in range(args.calls)]
+    async_texts = [f"async message {i}" for i in range(args.calls)]
+
+    threads_before = threading.active_count()
+    threaded = bench_threaded(threaded_texts, args.threads)
+    async_elapsed = bench_async(async_texts)
+    async_threads = threading.active_count() - threads_before
+
+    print(f"{args.calls} calls, {args.latency * 1000:.0f} ms simulated latency")
+    print(f"threaded ({args.threads} threads): {threaded:7.2f} s  {args.calls / threaded:8.1f} calls/s")
+    print(f"async (1 loop, {async_threads} extra thread): {async_elapsed:7.2f} s  {args.calls / async_elapsed:8.1f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+bench_block_rendering.py
+Compares building tone blocks as dicts with rendering the precompiled templates.
+"dicts" is the previous path: nested dicts and lists built per message, which
+the Slack SDK then serializes with json.dumps. "templates" renders JSON text
+from block_templates; the SDK then only escapes it as one string.
+
+Usage:
+    python -m benchmarks.bench_block_rendering --messages 20000
+"""
+import argparse
+import json
+import time
+
+from llm_service.llm_functions import ToneDetectionResponse
+from slack_service.slack_functions import TONE_EMOJIS, _build_tone_blocks
+from llm_service.translation import language_flag, language_name
+
+
+def dict_tone_blocks(tone_response, language):
+    tone = tone_response.tone.value.lower()
+    buttons = [
+        {"type": "button", "text": {"type": "plain_text", "text": reply}, "value": reply, "action_id": f"quick_reply_{i}"}
+        for i, reply in enumerate(tone_response.quick_replies)
+        if isinstance(reply, str) and reply.strip() and len(reply) <= 75
+    ]
+    buttons.append({
+        "type": "button",
+        "text": {"type": "plain_text", "text": f"{language_flag(language)} Translate to {language_name(language)}"},
+        "value": tone_response.original_message,
+        "action_id": f"translate_to_{language}"
+    })
+    return [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": (
+                    f"{TONE_EMOJIS.get(tone, '😖')} *Detected Tone:* {tone.capitalize()}\n"
+                    f"*Original Message:* {tone_response.original_message}\n"
+                    f"*Why:* {tone_response.explanation}\n"
+                    f"*Urgency:* {tone_response.urgency.value.capitalize()}\n"
+                    f"*Confidence:* {tone_response.confidence}%"
+                )
+            }
+        },
+        {"type": "divider"},
+        {"type": "section", "text": {"type": "mrkdwn", "text": "*Quick Replies:*" if buttons else "_No quick replies available._"}},
+        {"type": "actions", "elements": buttons}
+    ]
+
+
+def sample_responses(n):
+    return [
+        ToneDetectionResponse(
+            original_message=f"Message {i}: can you \"double-check\" the deploy ASAP? 🚀\nThanks",
+            tone=("positive", "angry", "confused", "neutral")[i % 4],
+            explanation="The sender asks for a quick check and signals urgency.",
+            urgency="urgent" if i % 3 else "not urgent",
+            confidence=70 + i % 30,
+            quick_replies=["On it.", "Checking now.", f"Give me {i % 10} minutes."]
+        )
+        for i in range(n)
+    ]
+
+
+def bench(render, responses):
+    start = time.perf_counter()
+    for response in responses:
+        render(response)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--language", default="el")
+    args = parser.parse_args()
+
+    responses = sample_responses(args.messages)
+    for response in responses[:100]:
+        if json.loads(_build_tone_blocks(response, args.language)) != dict_tone_blocks(response, args.language):
+            raise SystemExit("Template output differs from the dict path")
+
+    paths = {
+        "dicts": lambda response: dict_tone_blocks(response, args.language),
+        "templates": lambda response: _build_tone_blocks(response, args.language),
+    }
+    print(f"{args.messages} tone messages, outputs checked equal")
+    for name, build in paths.items():
+        built = bench(build, responses)
+        # What the SDK then does with either: json.dumps of the request body holding the blocks
+        sent = bench(lambda response: json.dumps({"blocks": build(response)}), responses)
+        print(
+            f"{name:<10} build {built / args.messages * 1e6:6.1f} µs/message  "
+            f"build and serialize {sent / args.messages * 1e6:6.1f} µs/message"
+        )
+
+
+if __name__ == "__main__":
+    main()
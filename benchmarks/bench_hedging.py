@@ -0,0 +1,96 @@
+"""
+bench_hedging.py
+Measures tail latency of LLM calls with one provider, with a hedged second
+provider, and with a failing primary. Providers are in-process stand-ins whose
+calls usually take --latency seconds and sometimes --tail-latency more, so the
+benchmark measures the router, not a model.
+
+Usage:
+    python -m benchmarks.bench_hedging --calls 400 --latency 0.05 --tail-rate 0.03 --tail-latency 0.5
+"""
+import argparse
+import random
+import threading
+import time
+import types as pytypes
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.loadtest import percentile
+from llm_service.providers import Provider, ProviderRouter
+
+
+class StandInProvider(Provider):
+    """
+    Answers after latency seconds, tail_latency more for a tail_rate share of
+    calls, and fails an error_rate share of them.
+    """
+    kind = "stand-in"
+
+    def __init__(self, name, latency, tail_rate=0.0, tail_latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(name, f"{name}-model")
+        self.latency = latency
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, contents, config=None):
+        with self._lock:
+            self.calls += 1
+            slow, failed = self._random.random() < self.tail_rate, self._random.random() < self.error_rate
+        time.sleep(self.latency + (self.tail_latency if slow else 0.0))
+        if failed:
+            raise ConnectionError(f"{self.name} is unavailable")
+        return pytypes.SimpleNamespace(text=contents)
+
+
+def run(router, calls, concurrency):
+    latencies, failed = [], 0
+
+    def one(i):
+        start = time.perf_counter()
+        router.call(f"message {i}")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(one, i) for i in range(calls)]:
+            try:
+                latencies.append(future.result())
+            except ConnectionError:
+                failed += 1
+    return latencies, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Usual latency of both providers in seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.03, help="Share of calls that are slow")
+    parser.add_argument("--tail-latency", type=float, default=0.5, help="Extra seconds of a slow call")
+    args = parser.parse_args()
+
+    def provider(name, seed, error_rate=0.0):
+        return StandInProvider(name, args.latency, args.tail_rate, args.tail_latency, error_rate, seed)
+
+    scenarios = {
+        "one provider": lambda: [provider("primary", 1)],
+        "hedged": lambda: [provider("primary", 1), provider("secondary", 2)],
+        "primary failing 30%": lambda: [provider("primary", 1, error_rate=0.3), provider("secondary", 2)],
+    }
+    print(f"{args.calls} calls, {args.latency * 1000:.0f} ms usual latency, "
+          f"{args.tail_rate:.0%} of calls {args.tail_latency * 1000:.0f} ms slower")
+    for name, build in scenarios.items():
+        providers = build()
+        latencies, failed = run(ProviderRouter(providers), args.calls, args.concurrency)
+        sent = sum(p.calls for p in providers)
+        print(
+            f"{name:<20} p50={percentile(latencies, 50) * 1000:6.1f}ms p95={percentile(latencies, 95) * 1000:6.1f}ms "
+            f"p99={percentile(latencies, 99) * 1000:6.1f}ms  failed={failed}  extra calls={sent / args.calls - 1:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
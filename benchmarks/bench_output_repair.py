@@ -0,0 +1,85 @@
+"""
+bench_output_repair.py
+Measures how many defective tone analysis answers strict validation rejects,
+and how many of them the repairing parser saves, without calling a model.
+Answers are built from a valid one with the defects models commonly produce:
+cut off by max_output_tokens, near-miss tone labels, confidence as a fraction,
+and too many or too few quick replies.
+
+Usage:
+    python -m benchmarks.bench_output_repair --answers 2000 --defect-rate 0.2
+"""
+import argparse
+import json
+import random
+import time
+
+from llm_service.llm_functions import ToneAnalysis, parse_tone_fields
+
+ANSWER = {
+    "tone": "neutral",
+    "explanation": "The message is a request with urgency.",
+    "urgency": "urgent",
+    "confidence": 92,
+    "quick_replies": ["I'm on it and will get back to you ASAP.", "Received, I'll update you shortly.", "I'll prioritize this and respond soon."],
+}
+
+
+def defective(rng, defect_rate):
+    answer = dict(ANSWER)
+    if rng.random() < defect_rate:
+        answer["tone"] = rng.choice(["Frustrated", "upset", "netural", "Enthusiastic"])
+    if rng.random() < defect_rate:
+        answer["confidence"] = rng.choice([0.92, "92%", 120])
+    if rng.random() < defect_rate:
+        answer["quick_replies"] = ANSWER["quick_replies"][:rng.choice([1, 2])] if rng.random() < 0.5 else ANSWER["quick_replies"] + ["Thanks!"]
+    raw = json.dumps(answer)
+    if rng.random() < defect_rate:
+        raw = raw[:rng.randrange(len(raw) // 3, len(raw))]
+    return raw
+
+
+def strict(raw):
+    try:
+        ToneAnalysis.model_validate(json.loads(raw))
+        return True
+    except ValueError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--answers", type=int, default=2000)
+    parser.add_argument("--defect-rate", type=float, default=0.2, help="Chance of each kind of defect per answer")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    answers = [defective(rng, args.defect_rate) for _ in range(args.answers)]
+
+    start = time.perf_counter()
+    accepted = sum(strict(raw) for raw in answers)
+    strict_seconds = time.perf_counter() - start
+
+    complete = partial = unusable = 0
+    start = time.perf_counter()
+    for raw in answers:
+        try:
+            _, missing = parse_tone_fields(raw)
+        except ValueError:
+            unusable += 1
+            continue
+        if missing:
+            partial += 1
+        else:
+            complete += 1
+    repair_seconds = time.perf_counter() - start
+
+    n = args.answers
+    print(f"{n} answers, {args.defect_rate:.0%} chance of each defect")
+    print(f"strict:    {accepted / n:6.1%} accepted, {1 - accepted / n:6.1%} need a full re-call  "
+          f"{strict_seconds / n * 1e6:6.1f} us/answer")
+    print(f"repairing: {complete / n:6.1%} complete, {partial / n:6.1%} re-prompt for missing fields, "
+          f"{unusable / n:6.1%} need a full re-call  {repair_seconds / n * 1e6:6.1f} us/answer")
+
+
+if __name__ == "__main__":
+    main()
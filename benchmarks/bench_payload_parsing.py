@@ -0,0 +1,143 @@
+"""
+bench_payload_parsing.py
+Measures the cost of turning a Slack request into a payload object.
+"eager" is the previous path: request.form or request.get_json() and every
+attribute copied at construction. "lazy" checks the signature, then decodes the
+raw body on first access with each installed JSON decoder; "lazy, unsigned"
+skips the signature check, as when no signing secret is set. "forged" is a
+request with a wrong signature, rejected before its body is decoded. Each request reads
+the attributes its handler needs.
+
+Usage:
+    python -m benchmarks.bench_payload_parsing --requests 20000
+"""
+import argparse
+import io
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+os.environ.setdefault("SLACK_SIGNING_SECRET", "benchmark-secret")
+
+from flask import Flask, Request
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from benchmarks.loadtest import DEFAULT_STREAM, load_stream, sign
+from slack_service import payload
+
+
+class EagerSlashPayload:
+    def __init__(self, request):
+        form = request.form
+        for key in ("token", "team_id", "team_domain", "channel_id", "channel_name", "user_id",
+                    "user_name", "command", "text", "response_url", "trigger_id"):
+            setattr(self, key, form.get(key))
+
+
+class EagerEventPayload:
+    def __init__(self, request):
+        json_data = request.get_json()
+        for key in ("token", "team_id", "context_team_id", "context_enterprise_id", "api_app_id", "event", "type",
+                    "event_id", "event_time", "authorizations", "is_ext_shared_channel", "event_context", "challenge"):
+            setattr(self, key, json_data.get(key))
+        self.retry_num = request.headers.get('X-Slack-Retry-Num')
+        self.retry_reason = request.headers.get('X-Slack-Retry-Reason')
+
+
+class EagerInteractionPayload:
+    def __init__(self, request):
+        json_data = json.loads(request.form['payload'])
+        for key in ("type", "token", "action_ts", "response_url", "user", "team", "container",
+                    "trigger_id", "channel", "callback_id", "message"):
+            setattr(self, key, json_data.get(key))
+        self.actions = json_data.get('actions', [])
+
+
+READS = {
+    "event": lambda p: (p.type, p.event, p.event_id),
+    "interaction": lambda p: (p.type, p.actions, p.channel, p.user),
+    "slash": lambda p: (p.channel_id, p.user_id, p.text, p.response_url),
+}
+CLASSES = {
+    "eager": {"event": EagerEventPayload, "interaction": EagerInteractionPayload, "slash": EagerSlashPayload},
+    "lazy": {"event": payload.EventPayload, "interaction": payload.InteractionPayload, "slash": payload.SlashPayload},
+}
+
+
+def environs(stream, secret, forged=False):
+    """
+    Builds one WSGI environ per stream line, signed as Slack would.
+    """
+    built = []
+    for line in stream:
+        kind, body = line["kind"], line["body"]
+        if kind == "event":
+            data, content_type = json.dumps(body), "application/json"
+        elif kind == "interaction":
+            data, content_type = urlencode({"payload": json.dumps(body)}), "application/x-www-form-urlencoded"
+        else:
+            data, content_type = urlencode(body), "application/x-www-form-urlencoded"
+        data = data.encode("utf-8")
+        headers = sign("forged" if forged else secret, data)
+        environ = EnvironBuilder(method="POST", data=data, content_type=content_type, headers=headers).get_environ()
+        built.append((kind, environ, data))
+    return built
+
+
+def bench(built, requests, make):
+    start = time.perf_counter()
+    for i in range(requests):
+        kind, environ, data = built[i % len(built)]
+        # A fresh request per iteration, since requests cache what they parse
+        request = Request(dict(environ, **{"wsgi.input": io.BytesIO(data)}))
+        make(kind, request)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--stream", default=DEFAULT_STREAM)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    stream = load_stream(args.stream)
+    secret = os.environ["SLACK_SIGNING_SECRET"]
+    signed = environs(stream, secret)
+    forged = environs(stream, secret, forged=True)
+
+    def read(style):
+        return lambda kind, request: READS[kind](CLASSES[style][kind](request))
+
+    def reject(kind, request):
+        try:
+            CLASSES["lazy"][kind](request)
+        except HTTPException:
+            return
+        raise SystemExit("A forged request was accepted")
+
+    decoders = {"json": json.loads}
+    for name in ("orjson", "msgspec"):
+        try:
+            decoders[name] = payload._json_decoder(name)[0]
+        except ImportError:
+            print(f"{name} is not installed, skipped")
+
+    with Flask(__name__).app_context():
+        baseline = bench(signed, args.requests, lambda kind, request: None)
+        print(f"{args.requests} requests cycled from {len(stream)}; creating the request objects took "
+              f"{baseline / args.requests * 1e6:.1f} µs each, which is subtracted below")
+        secret_bytes = payload._secret
+        rows = [("eager (json)", signed, read("eager"), json.loads, None)]
+        rows.append(("lazy, unsigned", signed, read("lazy"), json.loads, None))
+        rows += [(f"lazy ({name})", signed, read("lazy"), decoder, secret_bytes) for name, decoder in decoders.items()]
+        rows.append(("forged", forged, reject, json.loads, secret_bytes))
+        for name, built, make, decoder, check in rows:
+            payload.loads, payload._secret, payload.ALLOW_UNSIGNED = decoder, check, check is None
+            elapsed = bench(built, args.requests, make) - baseline
+            print(f"{name:<16} {elapsed / args.requests * 1e6:6.1f} µs/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+bench_prompt_tokens.py
+Compares tokens and latency of tone detection before and after the prompt changes.
+"before" sends the instruction that asks the model to echo original_message,
+with the message as is; "after" uses tone_config() and tone_prompt(), which
+drop the echo and normalize and shorten long messages; "after+cache" also
+refers to the instruction as Gemini cached content. Runs against the local
+Gemini stand-in unless --live is given, in which case GEMINI_API_KEY is used.
+
+Usage:
+    python -m benchmarks.bench_prompt_tokens --latency 0.2 --output-token-latency 0.005
+    python -m benchmarks.bench_prompt_tokens --live
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("LOG_TOKEN_USAGE", "0")
+
+from benchmarks.fake_servers import FakeGemini
+from benchmarks.loadtest import DEFAULT_STREAM, load_stream, percentile
+
+LEGACY_ECHO_LINE = '        - include the original message as "original_message" in the JSON output.\n'
+
+
+def messages_from_stream(path, long_chars):
+    texts = []
+    for line in load_stream(path):
+        body = line["body"]
+        text = body.get("event", {}).get("text") or body.get("text")
+        if text and text not in texts:
+            texts.append(text)
+    paragraph = (
+        "Following up on yesterday's incident review: the rollback worked, but we still do not know\n\n"
+        "why the   health checks passed while the queue was backing up. "
+    )
+    texts.append((paragraph * (long_chars // len(paragraph) + 1))[:long_chars] + " Can someone own this by Friday?")
+    return texts
+
+
+def run(name, texts, config, prompt, parse):
+    from llm_service.llm_functions import generate
+    prompt_tokens, cached_tokens, output_tokens, latencies, failed = [], [], [], [], 0
+    for text in texts:
+        start = time.perf_counter()
+        response = generate(config=config, contents=prompt(text))
+        latencies.append(time.perf_counter() - start)
+        usage = response.usage_metadata
+        prompt_tokens.append(usage.prompt_token_count or 0)
+        cached_tokens.append(usage.cached_content_token_count or 0)
+        output_tokens.append(usage.candidates_token_count or 0)
+        try:
+            parse(response.text or "")
+        except ValueError:
+            # Includes answers cut off by max_output_tokens
+            failed += 1
+    n = len(texts)
+    print(
+        f"{name:<12} prompt={sum(prompt_tokens) / n:7.1f} cached={sum(cached_tokens) / n:7.1f} "
+        f"output={sum(output_tokens) / n:6.1f} tokens/call  invalid={failed}/{n}  "
+        f"p50={percentile(latencies, 50) * 1000:7.1f}ms p95={percentile(latencies, 95) * 1000:7.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--stream", default=DEFAULT_STREAM, help="Event stream the messages are taken from")
+    parser.add_argument("--long-chars", type=int, default=12000, help="Length of the long message added to the stream's")
+    parser.add_argument("--live", action="store_true", help="Call Gemini instead of the local stand-in")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stand-in latency per call in seconds")
+    parser.add_argument("--output-token-latency", type=float, default=0.005, help="Stand-in latency per output token in seconds")
+    args = parser.parse_args()
+
+    gemini = None
+    if not args.live:
+        gemini = FakeGemini(latency=args.latency, output_token_latency=args.output_token_latency)
+        os.environ["GEMINI_BASE_URL"] = gemini.start()
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+    from google.genai import types
+    from llm_service.context_cache import ContextCache
+    from llm_service.llm_functions import (
+        MODEL, ModelConfig, ToneAnalysis, ToneDetectionResponse, _cached_tone_config, get_client, tone_config, tone_prompt
+    )
+
+    texts = messages_from_stream(args.stream, args.long_chars)
+    print(f"{len(texts)} messages, the longest {max(map(len, texts))} characters")
+
+    legacy = types.GenerateContentConfig(
+        system_instruction=ModelConfig.DETECT_TONE_INSTRUCTION.replace(
+            "        Analyze the following message and return:\n",
+            "        Analyze the following message and return:\n" + LEGACY_ECHO_LINE
+        ),
+        **ModelConfig.DETECT_TONE_SETTINGS,
+        response_schema=ToneDetectionResponse,
+        response_mime_type="application/json"
+    )
+    run("before", texts, legacy, lambda text: f"Message: \"{text}\"", ToneDetectionResponse.model_validate_json)
+    run("after", texts, tone_config(), tone_prompt, ToneAnalysis.model_validate_json)
+
+    context = ContextCache(get_client, MODEL, ModelConfig.DETECT_TONE_INSTRUCTION, ttl=600, retry_after=3600)
+    deadline = time.monotonic() + 15
+    while context.name() is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if context.name() is None:
+        print("after+cache  unavailable: Gemini did not create cached content for this model and instruction")
+    else:
+        run("after+cache", texts, _cached_tone_config(context.name()), tone_prompt, ToneAnalysis.model_validate_json)
+
+    if gemini is not None:
+        gemini.stop()
+
+
+if __name__ == "__main__":
+    main()
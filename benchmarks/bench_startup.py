@@ -0,0 +1,83 @@
+"""
+bench_startup.py
+Measures cold-start cost of the app in fresh interpreters.
+Reports `python -X importtime` totals with the slowest imports, the time until
+the first request is served, and the deferred LLM set-up paid by warm_up().
+No network calls are made.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5 --top 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+FIRST_REQUEST = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get("/detect-tone")
+served = time.perf_counter()
+from llm_service.llm_functions import warm_up
+warm_up()
+warmed = time.perf_counter()
+print(imported - start, served - start, warmed - served)
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("SLACK_BOT_TOKEN", "xoxb-benchmark")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    return env
+
+
+def import_profile():
+    """
+    Returns [(cumulative microseconds, module)] for one `-X importtime` run of `import app`.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output=True, text=True, env=_env(), check=True
+    )
+    profile = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        profile.append((int(cumulative), module.rstrip()))
+    return profile
+
+
+def first_request():
+    output = subprocess.run([sys.executable, "-c", FIRST_REQUEST], capture_output=True, text=True, env=_env(), check=True)
+    return [float(value) for value in output.stdout.strip().splitlines()[-1].split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    profile = import_profile()
+    total = next(cumulative for cumulative, module in profile if module.strip() == "app")
+    print(f"import app: {total / 1000:.1f} ms (-X importtime)")
+    # importtime indents two spaces per nesting level after one leading space; depth 1 is what app imports
+    top_level = [(cumulative, module) for cumulative, module in profile if len(module) - len(module.lstrip()) == 3]
+    for cumulative, module in sorted(top_level, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {module.strip()}")
+
+    runs = [first_request() for _ in range(args.runs)]
+    imported, served, warmed = (statistics.median(column) for column in zip(*runs))
+    print(f"median of {args.runs} runs:")
+    print(f"  import app:            {imported * 1000:8.1f} ms")
+    print(f"  time to first request: {served * 1000:8.1f} ms")
+    print(f"  deferred LLM warm-up:  {warmed * 1000:8.1f} ms (paid by the first analysis, or by the master with GUNICORN_PRELOAD=1)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+bench_user_directory.py
+Measures start-up cost of the Slack user directory.
+users.list is replaced by an in-process stand-in that pages through a synthetic
+workspace with a fixed latency per page, and the snapshot goes to a temp file.
+
+Usage:
+    python -m benchmarks.bench_user_directory --users 20000 --page-latency 0.3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from slack_service.user_directory import UserDirectory
+
+
+class FakeClient:
+    def __init__(self, users, page_latency):
+        self.users = users
+        self.page_latency = page_latency
+        self.pages = 0
+
+    def users_list(self, limit):
+        for start in range(0, self.users, limit):
+            time.sleep(self.page_latency)
+            self.pages += 1
+            yield {"members": [
+                {"id": f"U{i:08d}", "name": f"user{i}", "is_bot": False}
+                for i in range(start, min(start + limit, self.users))
+            ]}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def import_time(module):
+    # A fresh interpreter, so nothing is already imported
+    env = dict(os.environ)
+    env.setdefault("SLACK_BOT_TOKEN", "xoxb-benchmark")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--page-latency", type=float, default=0.3, help="Simulated users.list latency per page in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, "slack_users.json")
+
+        cold_client = FakeClient(args.users, args.page_latency)
+        cold = UserDirectory(cold_client, snapshot_path=snapshot)
+        construct, _ = timed(lambda: UserDirectory(cold_client, snapshot_path=snapshot))
+        cold_lookup, _ = timed(lambda: cold.get_name("U00000001"))
+
+        warm_client = FakeClient(args.users, args.page_latency)
+        warm = UserDirectory(warm_client, snapshot_path=snapshot)
+        warm_lookup, _ = timed(lambda: warm.get_name("U00000001"))
+        hot_lookup, _ = timed(lambda: warm.get_name("U00000002"))
+
+    print(f"{args.users} users, {cold_client.pages} pages at {args.page_latency * 1000:.0f} ms")
+    print(f"import slack_service.slack_functions: {import_time('slack_service.slack_functions') * 1000:9.1f} ms (no API call)")
+    print(f"construct directory:                  {construct * 1000:9.3f} ms")
+    print(f"first lookup, cold (API + snapshot):  {cold_lookup * 1000:9.1f} ms")
+    print(f"first lookup, warm (snapshot):        {warm_lookup * 1000:9.1f} ms, {warm_client.pages} API pages")
+    print(f"later lookups:                        {hot_lookup * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
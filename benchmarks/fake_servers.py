@@ -0,0 +1,294 @@
+"""
+fake_servers.py
+Local stand-ins for the Slack Web API and the Gemini API.
+Each server answers on 127.0.0.1 with a configurable latency, slow tail, error
+rate and rate of 429 responses, counts the calls it receives and records when
+response_url deliveries arrive, so load tests never touch the real services.
+
+Usage:
+    python -m benchmarks.fake_servers --slack-port 9001 --gemini-port 9002
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TONES = ("positive", "negative", "neutral", "angry", "sad", "happy", "confused", "excited")
+
+
+class FakeServer:
+    """
+    A threaded HTTP server whose handler subclasses implement respond().
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=0,
+                 tail_rate=0.0, tail_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        # A tail_rate share of calls takes tail_latency seconds longer
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.errors_served = Counter()
+        self.rate_limits_served = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def start(self, port=0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def _roll(self):
+        with self._lock:
+            tail = self.tail_latency if self._random.random() < self.tail_rate else 0.0
+            return self._random.random(), self._random.uniform(-self.jitter, self.jitter) + tail
+
+    def _handle(self, handler):
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        route = self.route(handler.path)
+        with self._lock:
+            self.calls[route] += 1
+        roll, jitter = self._roll()
+        time.sleep(max(0.0, self.latency + jitter))
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.rate_limits_served[route] += 1
+            status, headers, body = self.rate_limited()
+            headers = dict(headers, **{"Retry-After": str(self.retry_after)})
+        elif roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.errors_served[route] += 1
+            status, headers, body = self.server_error()
+        else:
+            status, headers, body = self.respond(handler.path, handler.headers, raw)
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def route(self, path):
+        return urlparse(path).path
+
+    def rate_limited(self):
+        return 429, {"Content-Type": "application/json"}, {"ok": False, "error": "ratelimited"}
+
+    def server_error(self):
+        return 500, {"Content-Type": "application/json"}, {"ok": False, "error": "internal_error"}
+
+    def respond(self, path, headers, raw):
+        raise NotImplementedError
+
+
+class FakeSlack(FakeServer):
+    """
+    Answers chat.*, conversations.* and users.list under /api/, and response_url
+    deliveries under /response/<id>.
+    """
+
+    def __init__(self, users=2000, history_size=20, **kwargs):
+        super().__init__(**kwargs)
+        self.users = users
+        self.history_size = history_size
+        # response_url id -> monotonic time the delivery arrived
+        self.deliveries = {}
+
+    def route(self, path):
+        path = urlparse(path).path
+        if path.startswith("/response/"):
+            return "response_url"
+        return path.rsplit("/", 1)[-1]
+
+    def _args(self, headers, raw):
+        if "json" in (headers.get("Content-Type") or ""):
+            return json.loads(raw or b"{}")
+        return {key: values[0] for key, values in parse_qs(raw.decode("utf-8")).items()}
+
+    def respond(self, path, headers, raw):
+        route = self.route(path)
+        json_type = {"Content-Type": "application/json"}
+        if route == "response_url":
+            with self._lock:
+                self.deliveries[urlparse(path).path.rsplit("/", 1)[-1]] = time.monotonic()
+            return 200, {"Content-Type": "text/plain"}, "ok"
+
+        args = self._args(headers, raw)
+        now = f"{time.time():.6f}"
+        if route in ("chat.postMessage", "chat.update"):
+            return 200, json_type, {"ok": True, "channel": args.get("channel"), "ts": now}
+        if route == "chat.postEphemeral":
+            return 200, json_type, {"ok": True, "message_ts": now}
+        if route in ("conversations.history", "conversations.replies"):
+            base = time.time() - 3600
+            messages = [
+                {"type": "message", "user": f"U{i % 50:08d}", "text": f"Message {i}: can you check the deploy?", "ts": f"{base + i:.6f}"}
+                for i in range(int(args.get("limit") or self.history_size))
+            ]
+            return 200, json_type, {"ok": True, "messages": messages[::-1], "has_more": False}
+        if route == "users.list":
+            start = int(args.get("cursor") or 0)
+            limit = int(args.get("limit") or 200)
+            members = [{"id": f"U{i:08d}", "name": f"user{i}", "is_bot": False} for i in range(start, min(start + limit, self.users))]
+            cursor = str(start + limit) if start + limit < self.users else ""
+            return 200, json_type, {"ok": True, "members": members, "response_metadata": {"next_cursor": cursor}}
+        return 200, json_type, {"ok": True}
+
+
+class FakeGemini(FakeServer):
+    """
+    Answers generateContent and streamGenerateContent with answers that match
+    the requested response schema: one tone, a batch of tones, tone plus
+    translation, a list of translations, or plain text. Token counts are
+    estimated at four characters per token; answers longer than maxOutputTokens
+    are cut off, and each output token adds output_token_latency seconds.
+    """
+
+    def __init__(self, output_token_latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.output_token_latency = output_token_latency
+        # cachedContents name -> system instruction, for context caching
+        self.cached_contents = {}
+
+    def route(self, path):
+        return urlparse(path).path.rsplit(":", 1)[-1]
+
+    def rate_limited(self):
+        return 429, {"Content-Type": "application/json"}, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}}
+
+    def server_error(self):
+        return 500, {"Content-Type": "application/json"}, {"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}}
+
+    @staticmethod
+    def tone(text, properties):
+        lowered = text.lower()
+        answer = {"original_message": text} if "original_message" in properties else {}
+        return dict(answer, **{
+            "tone": TONES[sum(map(ord, text)) % len(TONES)],
+            "explanation": "Generated by the load-test stand-in.",
+            "urgency": "urgent" if "asap" in lowered or "urgent" in lowered else "not urgent",
+            "confidence": 80,
+            "quick_replies": ["On it.", "Thanks for the heads-up.", "Let me check."],
+        })
+
+    def answer(self, request):
+        prompt = " ".join(part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", []))
+        schema = request.get("generationConfig", {}).get("responseSchema")
+        if schema is None:
+            return f"Stand-in answer for a {len(prompt)} character prompt."
+        if schema.get("type") == "ARRAY":
+            properties = schema.get("items", {}).get("properties", {})
+            if "language" in properties:
+                codes = re.findall(r"\b([a-z]{2}) \(", prompt)
+                return json.dumps([{"language": code, "translation": f"[{code}] {prompt[-60:]}"} for code in codes])
+            messages = re.findall(r"^\d+\. Message: \"(.*)\"$", prompt, flags=re.MULTILINE)
+            return json.dumps([self.tone(message, properties) for message in messages])
+        properties = schema.get("properties", {})
+        message = re.search(r"Message: \"(.*)\"", prompt, flags=re.DOTALL)
+        message = message.group(1) if message else prompt
+        answer = self.tone(message, properties)
+        if "translation" in properties:
+            answer["translation"] = f"[translated] {message}"
+        return json.dumps(answer)
+
+    def respond(self, path, headers, raw):
+        request = json.loads(raw or b"{}")
+        if urlparse(path).path.endswith("/cachedContents"):
+            name = f"cachedContents/{len(self.cached_contents) + 1}"
+            with self._lock:
+                self.cached_contents[name] = request.get("systemInstruction")
+            return 200, {"Content-Type": "application/json"}, {"name": name, "model": request.get("model")}
+        text = self.answer(request)
+        cached = self.cached_contents.get(request.get("cachedContent"))
+        cached_tokens = len(json.dumps(cached)) // 4 + 1 if cached else 0
+        prompt_tokens = cached_tokens + len(json.dumps([request.get("contents", []), request.get("systemInstruction")])) // 4 + 1
+        finish_reason = "STOP"
+        max_output_tokens = request.get("generationConfig", {}).get("maxOutputTokens")
+        if max_output_tokens and len(text) > max_output_tokens * 4:
+            text, finish_reason = text[:max_output_tokens * 4], "MAX_TOKENS"
+        output_tokens = len(text) // 4 + 1
+        time.sleep(output_tokens * self.output_token_latency)
+
+        def chunk(part, final):
+            body = {"candidates": [{"content": {"parts": [{"text": part}], "role": "model"}, "index": 0}]}
+            if final:
+                body["candidates"][0]["finishReason"] = finish_reason
+                body["usageMetadata"] = {
+                    "promptTokenCount": prompt_tokens,
+                    "cachedContentTokenCount": cached_tokens,
+                    "candidatesTokenCount": output_tokens,
+                    "totalTokenCount": prompt_tokens + output_tokens,
+                }
+            return body
+
+        if self.route(path) == "streamGenerateContent":
+            third = max(1, len(text) // 3)
+            parts = [text[i:i + third] for i in range(0, len(text), third)]
+            events = "".join(f"data: {json.dumps(chunk(part, i == len(parts) - 1))}\r\n\r\n" for i, part in enumerate(parts))
+            return 200, {"Content-Type": "text/event-stream"}, events
+        return 200, {"Content-Type": "application/json"}, chunk(text, True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--slack-port", type=int, default=9001)
+    parser.add_argument("--gemini-port", type=int, default=9002)
+    parser.add_argument("--slack-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    slack = FakeSlack(latency=args.slack_latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    gemini = FakeGemini(latency=args.gemini_latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    print(f"SLACK_API_URL={slack.start(args.slack_port)}/api/")
+    print(f"GEMINI_BASE_URL={gemini.start(args.gemini_port)}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        slack.stop()
+        gemini.stop()
+
+
+if __name__ == "__main__":
+    main()
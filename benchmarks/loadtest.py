@@ -0,0 +1,324 @@
+"""
+loadtest.py
+Replays a recorded Slack event stream against the app running under gunicorn.
+Slack and Gemini are replaced by the local stand-ins in fake_servers.py, so the
+run is offline and repeatable. Reports throughput, acknowledgement latency per
+request kind, Slack deadline violations and how long /detect-tone results took
+to reach their response_url.
+
+Usage:
+    python -m benchmarks.loadtest --speed 1 --workers 1 --threads 8
+    python -m benchmarks.loadtest --synthesize 2000 --rate 100 --gemini-latency 0.8 --rate-limit-rate 0.02
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+from benchmarks.fake_servers import FakeGemini, FakeSlack
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STREAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "event_stream.jsonl")
+# Slack retries, and shows the user an error, when a request is not acknowledged within 3 seconds
+SLACK_DEADLINE_SECONDS = 3.0
+
+_local = threading.local()
+
+
+def load_stream(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _vary(line, cycle, unique_texts):
+    """
+    Copies a recorded line for its cycle-th replay, with new event ids and
+    timestamps so the app does not drop it as a duplicate.
+    """
+    line = json.loads(json.dumps(line))
+    if cycle == 0:
+        return line
+    body = line["body"]
+
+    def shift(ts):
+        seconds, _, fraction = ts.partition(".")
+        return f"{int(seconds) + cycle * 100000}.{fraction}"
+
+    if line["kind"] == "event":
+        body["event_id"] = f"{body.get('event_id', 'Ev')}-{cycle}"
+        event = body["event"]
+        event["ts"] = shift(event["ts"])
+        if unique_texts:
+            event["text"] = f"{event['text']} ({cycle})"
+    elif line["kind"] == "interaction":
+        for action in body.get("actions", []):
+            if action.get("action_id") == "analyze_message":
+                action["value"] = shift(action["value"])
+            elif unique_texts:
+                action["value"] = f"{action['value']} ({cycle})"
+    elif unique_texts and body.get("text"):
+        body["text"] = f"{body['text']} ({cycle})"
+    return line
+
+
+def build_schedule(stream, speed, repeat, synthesize, rate, unique_texts):
+    """
+    Returns the lines to send with their send offsets in seconds. Recorded
+    offsets are divided by speed; with synthesize the stream is cycled at rate
+    requests per second instead.
+    """
+    if synthesize:
+        return [
+            (i / rate, _vary(stream[i % len(stream)], i // len(stream), unique_texts))
+            for i in range(synthesize)
+        ]
+    span = max(line["at"] for line in stream) + 1.0
+    return [
+        ((cycle * span + line["at"]) / speed, _vary(line, cycle, unique_texts))
+        for cycle in range(repeat)
+        for line in stream
+    ]
+
+
+def _session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def sign(secret, body):
+    """
+    Returns the headers Slack signs a request body with.
+    """
+    timestamp = str(int(time.time()))
+    digest = hmac.new(secret.encode(), f"v0:{timestamp}:".encode() + body, hashlib.sha256).hexdigest()
+    return {"X-Slack-Request-Timestamp": timestamp, "X-Slack-Signature": f"v0={digest}"}
+
+
+def send(app_url, line, slack_url, sent_slash, timeout, secret, forged=False):
+    """
+    Sends one line the way Slack would, signed with secret, and returns
+    (kind, seconds, status or error). A forged line carries a wrong signature.
+    """
+    kind, body = line["kind"], line["body"]
+    if kind == "event":
+        url, data, content_type = f"{app_url}/slack/events", json.dumps(body), "application/json"
+    elif kind == "interaction":
+        url, data, content_type = f"{app_url}/slack/interactions", urlencode({"payload": json.dumps(body)}), "application/x-www-form-urlencoded"
+    else:
+        delivery_id = uuid.uuid4().hex
+        body = dict(body, response_url=f"{slack_url}/response/{delivery_id}")
+        url, data, content_type = f"{app_url}{line.get('path', '/detect-tone')}", urlencode(body), "application/x-www-form-urlencoded"
+    data = data.encode("utf-8")
+    headers = dict(sign("forged" if forged else secret, data), **{"Content-Type": content_type})
+    if forged:
+        kind = "forged"
+    start = time.monotonic()
+    if kind == "slash":
+        sent_slash[delivery_id] = start
+    try:
+        response = _session().post(url, data=data, headers=headers, timeout=timeout)
+        return kind, time.monotonic() - start, response.status_code
+    except requests.RequestException as e:
+        return kind, time.monotonic() - start, type(e).__name__
+
+
+def replay(app_url, schedule, slack_url, concurrency, timeout, secret, forged_rate=0.0):
+    """
+    Sends every line at its offset, without waiting for earlier responses, and
+    returns the results and the wall time of the run. A forged_rate share of
+    the lines is sent with a wrong signature instead.
+    """
+    sent_slash = {}
+    futures = []
+    rng = random.Random(0)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.monotonic()
+        for offset, line in sorted(schedule, key=lambda item: item[0]):
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            forged = rng.random() < forged_rate
+            futures.append(pool.submit(send, app_url, line, slack_url, sent_slash, timeout, secret, forged))
+        results = [future.result() for future in futures]
+    return results, time.monotonic() - start, sent_slash
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def _latency_row(label, values):
+    ms = [v * 1000 for v in values]
+    return (
+        f"  {label:<12} n={len(ms):<6} p50={percentile(ms, 50):8.1f}ms p95={percentile(ms, 95):8.1f}ms "
+        f"p99={percentile(ms, 99):8.1f}ms max={max(ms, default=float('nan')):8.1f}ms"
+    )
+
+
+def start_app(port, workers, threads, env, log_path):
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "--workers", str(workers),
+         "--threads", str(threads), "--timeout", "0", "app:app"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}, see {log_path}")
+        try:
+            if requests.get(f"{url}/metrics", timeout=1).status_code == 200:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not start within 60s, see {log_path}")
+
+
+def _free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--stream", default=DEFAULT_STREAM, help="Recorded event stream (JSON lines)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up of the recorded offsets")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the recorded stream is replayed")
+    parser.add_argument("--synthesize", type=int, default=0, help="Send this many requests cycled from the stream instead")
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests per second with --synthesize")
+    parser.add_argument("--unique-texts", action="store_true", help="Make every replayed message text unique (no cache hits)")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn --workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn --threads")
+    parser.add_argument("--concurrency", type=int, default=64, help="Client connections sending requests")
+    parser.add_argument("--slack-latency", type=float, default=0.05, help="Stand-in Slack API latency in seconds")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="Stand-in Gemini latency in seconds")
+    parser.add_argument("--gemini-tail-rate", type=float, default=0.0, help="Share of stand-in Gemini calls that are slow")
+    parser.add_argument("--gemini-tail-latency", type=float, default=0.0, help="Extra seconds of a slow stand-in Gemini call")
+    parser.add_argument("--backup-gemini-latency", type=float, default=None,
+                        help="Start a second Gemini stand-in with this latency as provider 'standin', for hedging and failover")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on both latencies in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stand-in calls answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of stand-in calls answered with a 429")
+    parser.add_argument("--forged-rate", type=float, default=0.0, help="Share of requests sent with a wrong signature")
+    parser.add_argument("--drain", type=float, default=30.0, help="Seconds to wait for response_url deliveries after the replay")
+    parser.add_argument("--keep-log", action="store_true", help="Print the path of the gunicorn log instead of deleting it")
+    args = parser.parse_args()
+
+    slack = FakeSlack(latency=args.slack_latency, jitter=args.jitter, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    gemini = FakeGemini(
+        latency=args.gemini_latency, jitter=args.jitter, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        tail_rate=args.gemini_tail_rate, tail_latency=args.gemini_tail_latency
+    )
+    slack_url = slack.start()
+    gemini_url = gemini.start()
+    backup = None
+    if args.backup_gemini_latency is not None:
+        backup = FakeGemini(latency=args.backup_gemini_latency, jitter=args.jitter, seed=1)
+        backup_url = backup.start()
+
+    stream = load_stream(args.stream)
+    schedule = build_schedule(stream, args.speed, args.repeat, args.synthesize, args.rate, args.unique_texts)
+
+    tmp = tempfile.TemporaryDirectory(prefix="tonebot-loadtest-")
+    env = dict(
+        os.environ,
+        SLACK_API_URL=f"{slack_url}/api/",
+        GEMINI_BASE_URL=gemini_url,
+        SLACK_BOT_TOKEN=os.getenv("SLACK_BOT_TOKEN", "xoxb-loadtest"),
+        GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "loadtest"),
+        SLACK_SIGNING_SECRET=os.getenv("SLACK_SIGNING_SECRET", "loadtest-secret"),
+        USER_PREFS_DB=os.path.join(tmp.name, "user_prefs.db"),
+        REMINDER_DB=os.path.join(tmp.name, "reminders.db"),
+        SLACK_USERS_SNAPSHOT=os.path.join(tmp.name, "slack_users.json"),
+        # Read by the per-process rate limiters and message history, like gunicorn itself does
+        WEB_CONCURRENCY=str(args.workers),
+        PYTHONUNBUFFERED="1",
+    )
+    if backup is not None:
+        env.update(LLM_PROVIDERS="standin", LLM_PROVIDER_STANDIN_BASE_URL=backup_url)
+    # Everyone in the stream is opted in, so events go through the whole pipeline
+    from slack_service.user_prefs import UserPrefsStore
+    prefs = UserPrefsStore(env["USER_PREFS_DB"])
+    for _, line in schedule:
+        body = line["body"]
+        user = body.get("event", {}).get("user") or body.get("user_id") or body.get("user", {}).get("id")
+        if user and not prefs.is_opted_in(user):
+            prefs.set_opt_in(user, True)
+
+    log_path = os.path.join(tempfile.gettempdir() if args.keep_log else tmp.name, f"tonebot-loadtest-{os.getpid()}.log")
+    process, app_url = start_app(_free_port(), args.workers, args.threads, env, log_path)
+    try:
+        print(f"Replaying {len(schedule)} requests against {args.workers} worker(s) x {args.threads} thread(s)")
+        results, elapsed, sent_slash = replay(
+            app_url, schedule, slack_url, args.concurrency, SLACK_DEADLINE_SECONDS * 3, env["SLACK_SIGNING_SECRET"], args.forged_rate
+        )
+
+        deadline = time.monotonic() + args.drain
+        while time.monotonic() < deadline and len(slack.deliveries) < len(sent_slash):
+            time.sleep(0.1)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        slack.stop()
+        gemini.stop()
+        if backup is not None:
+            backup.stop()
+
+    by_kind = defaultdict(list)
+    failures = defaultdict(int)
+    violations = 0
+    for kind, seconds, status in results:
+        by_kind[kind].append(seconds)
+        # Forged requests should be turned away, quickly
+        ok = status == 401 if kind == "forged" else isinstance(status, int) and 200 <= status < 300
+        if not ok:
+            failures[f"{kind} {status}"] += 1
+        if not ok or seconds > SLACK_DEADLINE_SECONDS:
+            violations += 1
+
+    print(f"Throughput:       {len(results) / elapsed:.1f} requests/s over {elapsed:.2f}s")
+    print("Acknowledgement latency:")
+    print(_latency_row("all", [seconds for _, seconds, _ in results]))
+    for kind in sorted(by_kind):
+        print(_latency_row(kind, by_kind[kind]))
+    print(f"Deadline misses:  {violations} of {len(results)} (slower than {SLACK_DEADLINE_SECONDS:.0f}s, failed or timed out)")
+    for failure, count in sorted(failures.items()):
+        print(f"  {failure}: {count}")
+    delivered = [slack.deliveries[key] - sent for key, sent in sent_slash.items() if key in slack.deliveries]
+    print(f"Slash results:    {len(delivered)} of {len(sent_slash)} delivered to response_url")
+    if delivered:
+        print(_latency_row("delivery", delivered))
+    print(f"Slack stand-in:   {dict(slack.calls)} (429s: {sum(slack.rate_limits_served.values())}, 500s: {sum(slack.errors_served.values())})")
+    print(f"Gemini stand-in:  {dict(gemini.calls)} (429s: {sum(gemini.rate_limits_served.values())}, 500s: {sum(gemini.errors_served.values())})")
+    if backup is not None:
+        print(f"Backup stand-in:  {dict(backup.calls)}")
+    if args.keep_log:
+        print(f"gunicorn log:     {log_path}")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
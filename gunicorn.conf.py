@@ -0,0 +1,23 @@
+"""
+Gunicorn settings read automatically from the working directory.
+Command-line flags in the Dockerfile and app.yml still take precedence.
+"""
+import os
+
+# With GUNICORN_PRELOAD=1 the app is imported once in the master and the
+# deferred LLM set-up is done there too, so forked workers start warm.
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+
+def when_ready(server):
+    # Runs in the master before any worker is forked
+    if preload_app:
+        from llm_service.llm_functions import warm_up
+        warm_up()
+        server.log.info("Warmed LLM configuration before forking workers")
+
+
+def post_fork(server, worker):
+    # Reminders saved before a restart must fire even if no new message arrives
+    from worker_service.reminder_scheduler import reminders
+    reminders.start()
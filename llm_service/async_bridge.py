@@ -0,0 +1,55 @@
+"""
+async_bridge.py
+Bridge between Flask's request threads and an asyncio event loop.
+This module runs one event loop per process in a background thread, so sync
+code can start coroutines and get back concurrent.futures.Future objects.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class AsyncBridge:
+    """
+    Owns a background event loop. The loop is started on first use and again after a fork.
+    """
+
+    def __init__(self, name="llm-loop"):
+        self.name = name
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        if self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                self._loop = loop
+                self._pid = os.getpid()
+        return self._loop
+
+    def submit(self, coro):
+        """
+        Schedules coro on the loop and returns a concurrent.futures.Future.
+        Cancelling the Future cancels the running coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    def run(self, coro, timeout=None):
+        """
+        Runs coro on the loop and blocks the calling thread until it finishes.
+        The coroutine is cancelled if it does not finish within timeout seconds.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+
+bridge = AsyncBridge()
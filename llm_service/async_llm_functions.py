@@ -0,0 +1,196 @@
+"""
+async_llm_functions.py
+Asyncio variants of the LLM functions.
+This module uses the providers' async clients so that many calls can wait on the
+network from one event loop, bounded by a concurrency limit and a per-call timeout.
+"""
+import asyncio
+import os
+import weakref
+
+from llm_service.llm_functions import (
+    MODEL,
+    ToneDetectionResponse,
+    fast_tone,
+    finish_tone_response,
+    merge_missing_fields,
+    missing_fields_config,
+    missing_fields_prompt,
+    parse_tone_fields,
+    router,
+    summary_flight,
+    summary_prompt,
+    tone_cache,
+    tone_cache_key,
+    tone_config,
+    tone_flight,
+    tone_prompt,
+    translation_prompt,
+    usage_recorder
+)
+from llm_service.output_repair import count_reprompt
+from llm_service.response_cache import content_key
+from metrics_service.tracing import stage
+from llm_service.translation import (
+    language_name,
+    split_tone_translation,
+    tone_translation_config,
+    translation_cache,
+    translation_flight,
+    translation_key
+)
+
+MAX_CONCURRENT_CALLS = int(os.getenv("LLM_ASYNC_MAX_CONCURRENCY", "200"))
+CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "20"))
+
+# One semaphore per event loop, since asyncio primitives are bound to the loop that first uses them
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+async def _generate_content(contents, config=None, parse=None, timeout=None):
+    """
+    Sends a request through the provider router under the concurrency limit,
+    hedged and failed over like generate. Returns parse(response) when parse is given.
+    Raises asyncio.TimeoutError when the call takes longer than timeout seconds;
+    cancelling the awaiting task cancels the requests too.
+    """
+    async with _semaphore():
+        with stage("llm_call") as span:
+            return await asyncio.wait_for(
+                router.call_async(contents, config, parse, usage_recorder(span)),
+                timeout=CALL_TIMEOUT if timeout is None else timeout
+            )
+
+
+async def detect_tone_async(text: str, timeout=None):
+    """
+    Async counterpart of detect_tone, sharing its cache.
+
+    Args:
+        text (str): The message to analyze.
+        timeout (float): Seconds to wait for Gemini, defaults to LLM_CALL_TIMEOUT_SECONDS.
+
+    Returns:
+        ToneDetectionResponse: The structured tone analysis.
+    """
+    fast = fast_tone(text)
+    if fast is not None:
+        return fast
+
+    cache_key = tone_cache_key(text)
+    cached = tone_cache.get(cache_key)
+    if cached is not None:
+        return ToneDetectionResponse.from_json(cached)
+
+    # Shares the call with identical analyses running on threads or other tasks
+    return await tone_flight.do_async(cache_key, _detect_tone_uncached_async, text, cache_key, timeout)
+
+
+async def _detect_tone_uncached_async(text, cache_key, timeout):
+    cached = tone_cache.get(cache_key)
+    if cached is not None:
+        return ToneDetectionResponse.from_json(cached)
+    fields, missing = await _generate_content(
+        timeout=timeout,
+        config=tone_config(),
+        contents=tone_prompt(text),
+        parse=lambda response: parse_tone_fields(response.text)
+    )
+    if missing:
+        # Asks for only the missing fields, like complete_tone_fields
+        count_reprompt()
+        fields = await _generate_content(
+            timeout=timeout,
+            config=missing_fields_config(tuple(missing)),
+            contents=missing_fields_prompt(text, fields, missing),
+            parse=lambda response: merge_missing_fields(fields, missing, response.text)
+        )
+    return finish_tone_response(text, cache_key, fields)
+
+
+async def translate_async(text, language="el", timeout=None):
+    """
+    Async counterpart of translation.translate, sharing its cache.
+    """
+    key = translation_key(text, language)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+    return await translation_flight.do_async(key, _translate_uncached_async, text, language, key, timeout)
+
+
+async def _translate_uncached_async(text, language, key, timeout):
+    response = await _generate_content(
+        timeout=timeout,
+        contents=translation_prompt(text, language_name(language))
+    )
+    translated = response.text.strip()
+    translation_cache.set(key, translated)
+    return translated
+
+
+async def translate_to_greek_with_tone_async(text, timeout=None):
+    """
+    Async counterpart of translate_to_greek_with_tone.
+    """
+    return await translate_async(text, "el", timeout=timeout)
+
+
+async def detect_tone_and_translate_async(text, language, timeout=None):
+    """
+    Async counterpart of translation.detect_tone_and_translate.
+
+    Returns:
+        tuple: (ToneDetectionResponse, translation or None)
+    """
+    key = translation_key(text, language)
+    translated = translation_cache.get(key)
+    cache_key = tone_cache_key(text)
+    if translated is not None or fast_tone(text) is not None or tone_cache.get(cache_key) is not None:
+        return await detect_tone_async(text, timeout=timeout), translated
+    tone_response = await tone_flight.do_async(
+        cache_key, _detect_tone_and_translate_uncached_async, text, language, cache_key, timeout
+    )
+    return tone_response, translation_cache.get(key)
+
+
+async def _detect_tone_and_translate_uncached_async(text, language, cache_key, timeout):
+    cached = tone_cache.get(cache_key)
+    if cached is not None:
+        return ToneDetectionResponse.from_json(cached)
+    try:
+        tone_response, _ = await _generate_content(
+            timeout=timeout,
+            config=tone_translation_config(language),
+            contents=tone_prompt(text),
+            parse=lambda response: split_tone_translation(text, language, response.text)
+        )
+        return tone_response
+    except ValueError as e:
+        print(f"Error in combined tone and translation: {e}")
+        return await _detect_tone_uncached_async(text, cache_key, timeout)
+
+
+async def summarize_conversation_async(messages, timeout=None):
+    """
+    Async counterpart of summarize_conversation. Returns the summary text.
+    """
+    prompt = summary_prompt(messages)
+    return await summary_flight.do_async(content_key(MODEL, prompt), _summarize_async, prompt, timeout)
+
+
+async def _summarize_async(prompt, timeout):
+    response = await _generate_content(
+        timeout=timeout,
+        contents=prompt
+    )
+    return response.text.strip()
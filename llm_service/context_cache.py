@@ -0,0 +1,72 @@
+"""
+context_cache.py
+Gemini context caching of a static system instruction.
+This module uploads an instruction once as cached content, so calls can refer to
+it by name instead of sending it again, and refreshes it in the background
+before it expires. Models or instructions the API cannot cache fall back to
+sending the instruction inline.
+"""
+import threading
+import time
+
+from metrics_service import metrics
+
+_created = metrics.counter("llm_context_caches_created_total", "Gemini cached contents created for system instructions")
+_failures = metrics.counter("llm_context_cache_failures_total", "Gemini cached contents that could not be created")
+
+
+class ContextCache:
+    """
+    Holds the name of the cached content for one model and system instruction.
+    name() never blocks: it returns None, and the caller sends the instruction
+    inline, while the cached content is being created or after creating it failed.
+    """
+
+    def __init__(self, get_client, model, instruction, ttl=3600, retry_after=600):
+        self.get_client = get_client
+        self.model = model
+        self.instruction = instruction
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._name = None
+        self._expires_at = 0.0
+        # Refreshed a tenth of the ttl before the cached content expires
+        self._refresh_at = 0.0
+        self._retry_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def name(self):
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._refresh_at and now >= self._retry_at and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, name="context-cache", daemon=True).start()
+            # The old cached content is still used while the new one is created
+            return self._name if now < self._expires_at else None
+
+    def _refresh(self):
+        try:
+            from google.genai import types
+            cached = self.get_client().caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=self.instruction,
+                    ttl=f"{int(self.ttl)}s",
+                )
+            )
+        except Exception as e:
+            # Usually the instruction is shorter than the model's minimum for caching
+            print(f"Context caching unavailable for {self.model}, sending the instruction inline: {e}")
+            _failures.inc()
+            with self._lock:
+                self._retry_at = time.monotonic() + self.retry_after
+                self._refreshing = False
+            return
+        _created.inc()
+        now = time.monotonic()
+        with self._lock:
+            self._name = cached.name
+            self._expires_at = now + self.ttl
+            self._refresh_at = now + self.ttl * 0.9
+            self._refreshing = False
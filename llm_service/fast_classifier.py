@@ -0,0 +1,225 @@
+"""
+fast_classifier.py
+Local, CPU-only tone classification for trivial messages.
+This module answers short acknowledgements ("ok", "thanks!", "+1", emoji) from a
+lexicon and other short messages from a logistic model over hashed n-grams, so
+they skip the Gemini round trip when the model is confident enough.
+"""
+import os
+import re
+import threading
+import zlib
+
+from llm_service.llm_functions import AllowedTones, AllowedUrgency, ToneDetectionResponse
+from metrics_service import metrics
+
+WEIGHTS_PATH = os.getenv("FAST_CLASSIFIER_WEIGHTS", "fast_classifier.npz")
+THRESHOLD = float(os.getenv("FAST_PATH_THRESHOLD", "0.9"))
+MAX_CHARS = int(os.getenv("FAST_PATH_MAX_CHARS", "120"))
+ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+
+TONES = [tone.value for tone in AllowedTones]
+N_FEATURES = 1 << 16
+
+# Refusals and replies whose tone depends on what they answer, such as "no" or
+# "sure", are left out, so the LLM reads them
+LEXICON = {
+    "ok": AllowedTones.NEUTRAL, "okay": AllowedTones.NEUTRAL, "k": AllowedTones.NEUTRAL,
+    "kk": AllowedTones.NEUTRAL, "got it": AllowedTones.NEUTRAL, "noted": AllowedTones.NEUTRAL,
+    "done": AllowedTones.NEUTRAL, "yes": AllowedTones.NEUTRAL, "yep": AllowedTones.NEUTRAL,
+    "ack": AllowedTones.NEUTRAL,
+    "thanks": AllowedTones.POSITIVE, "thank you": AllowedTones.POSITIVE, "thx": AllowedTones.POSITIVE,
+    "ty": AllowedTones.POSITIVE, "+1": AllowedTones.POSITIVE, "lgtm": AllowedTones.POSITIVE,
+    "sounds good": AllowedTones.POSITIVE, "will do": AllowedTones.POSITIVE,
+    "np": AllowedTones.POSITIVE, "no problem": AllowedTones.POSITIVE, "cool": AllowedTones.POSITIVE,
+    "great": AllowedTones.HAPPY, "nice": AllowedTones.HAPPY, "awesome": AllowedTones.EXCITED,
+    "👍": AllowedTones.POSITIVE, "🙏": AllowedTones.POSITIVE, "🙌": AllowedTones.HAPPY,
+    "🎉": AllowedTones.EXCITED, "😂": AllowedTones.HAPPY, "😊": AllowedTones.HAPPY,
+    "😢": AllowedTones.SAD, "😞": AllowedTones.SAD, "😠": AllowedTones.ANGRY, "🤔": AllowedTones.CONFUSED,
+    ":+1:": AllowedTones.POSITIVE, ":thumbsup:": AllowedTones.POSITIVE, ":pray:": AllowedTones.POSITIVE,
+    ":tada:": AllowedTones.EXCITED, ":joy:": AllowedTones.HAPPY, ":slightly_smiling_face:": AllowedTones.HAPPY,
+    ":white_check_mark:": AllowedTones.NEUTRAL, ":eyes:": AllowedTones.NEUTRAL, ":thinking_face:": AllowedTones.CONFUSED,
+}
+
+QUICK_REPLIES = {
+    AllowedTones.POSITIVE: ["👍", "Glad to hear it!", "Thanks for letting me know."],
+    AllowedTones.NEGATIVE: ["Sorry to hear that.", "What can I do to help?", "Let's talk it through."],
+    AllowedTones.NEUTRAL: ["👍", "Thanks!", "Noted."],
+    AllowedTones.ANGRY: ["I understand, let's sort it out.", "Sorry about that.", "Can we talk about it?"],
+    AllowedTones.SAD: ["Sorry to hear that.", "Is there anything I can do?", "Here if you need me."],
+    AllowedTones.HAPPY: ["😊", "Great to hear!", "Love it!"],
+    AllowedTones.CONFUSED: ["Happy to clarify.", "Which part is unclear?", "Let me explain."],
+    AllowedTones.EXCITED: ["🎉", "That's great news!", "Congrats!"],
+}
+
+# Confidence of a lexicon hit, and of an emoji-only message without a known emoji
+LEXICON_CONFIDENCE = 0.95
+UNKNOWN_EMOJI_CONFIDENCE = 0.7
+
+_EMOJI_ONLY = re.compile(r"^(?::[a-z0-9_+\-]+:|[\U0001F000-\U0001FAFF☀-➿️‍]|\s)+$")
+_EMOJI_TOKEN = re.compile(r":[a-z0-9_+\-]+:|[\U0001F000-\U0001FAFF☀-➿]")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+_lexicon_hits = metrics.counter("fast_path_lexicon_hits_total", "Messages answered from the acknowledgement lexicon")
+_model_hits = metrics.counter("fast_path_model_hits_total", "Messages answered by the local model")
+_fallthroughs = metrics.counter("fast_path_fallthrough_total", "Messages passed on to the LLM")
+
+
+def _normalize(text):
+    return " ".join(text.lower().split()).rstrip("!.")
+
+
+def feature_indices(text, n_features=N_FEATURES):
+    """
+    Hashes word unigrams, word bigrams and character trigrams of text.
+    Returns (unique indices, L2-normalized counts) as NumPy arrays.
+    """
+    import numpy as np
+
+    lowered = text.lower()
+    tokens = _TOKEN.findall(lowered)
+    padded = f" {lowered} "
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    # crc32 rather than hash() so indices match across processes and runs
+    hashed = np.fromiter((zlib.crc32(gram.encode("utf-8")) % n_features for gram in grams), dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(hashed, return_counts=True)
+    values = counts.astype(np.float32)
+    return indices, values / np.sqrt((values * values).sum())
+
+
+class ToneModel:
+    """
+    Multinomial logistic regression for tone and binary logistic regression for urgency.
+    """
+
+    def __init__(self, tone_weights, tone_bias, urgency_weights, urgency_bias):
+        self.tone_weights = tone_weights
+        self.tone_bias = tone_bias
+        self.urgency_weights = urgency_weights
+        self.urgency_bias = urgency_bias
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(data["tone_weights"], data["tone_bias"], data["urgency_weights"], data["urgency_bias"])
+
+    def save(self, path):
+        import numpy as np
+
+        np.savez_compressed(
+            path,
+            tone_weights=self.tone_weights,
+            tone_bias=self.tone_bias,
+            urgency_weights=self.urgency_weights,
+            urgency_bias=self.urgency_bias
+        )
+
+    def predict(self, text):
+        """
+        Returns (tone probabilities, probability that the message is urgent).
+        """
+        import numpy as np
+
+        indices, values = feature_indices(text, self.tone_weights.shape[0])
+        logits = values @ self.tone_weights[indices] + self.tone_bias
+        logits = np.exp(logits - logits.max())
+        urgency_logit = float(values @ self.urgency_weights[indices] + self.urgency_bias)
+        return logits / logits.sum(), 1.0 / (1.0 + np.exp(-urgency_logit))
+
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def _get_model():
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                if os.path.exists(WEIGHTS_PATH):
+                    try:
+                        _model = ToneModel.load(WEIGHTS_PATH)
+                    except (OSError, KeyError, ValueError) as e:
+                        print(f"Error loading fast classifier weights {WEIGHTS_PATH}: {e}")
+                else:
+                    # No weights ship with the app; they are trained from a deployment's own cache
+                    print(f"Fast classifier weights {WEIGHTS_PATH} not found: only the lexicon answers locally, "
+                          "and over-budget messages get no local estimate")
+                _model_loaded = True
+    return _model
+
+
+def _response(text, tone, urgency, confidence, explanation):
+    return ToneDetectionResponse(
+        original_message=text,
+        tone=tone,
+        explanation=explanation,
+        urgency=urgency,
+        confidence=confidence,
+        quick_replies=QUICK_REPLIES[tone]
+    )
+
+
+def lexicon_classify(text, threshold=THRESHOLD):
+    """
+    Classifies acknowledgements and emoji-only messages. Returns None for anything
+    else, and for hits less confident than threshold.
+    """
+    normalized = _normalize(text)
+    tone, confidence = LEXICON.get(normalized), LEXICON_CONFIDENCE
+    if tone is None and normalized and _EMOJI_ONLY.match(normalized):
+        tones = [LEXICON[token] for token in _EMOJI_TOKEN.findall(normalized) if token in LEXICON]
+        tone, confidence = (tones[0], LEXICON_CONFIDENCE) if tones else (AllowedTones.NEUTRAL, UNKNOWN_EMOJI_CONFIDENCE)
+    if tone is None or confidence < threshold:
+        return None
+    return _response(text, tone, AllowedUrgency.NOT_URGENT, int(confidence * 100), "A short acknowledgement or reaction.")
+
+
+def classify(text, threshold=THRESHOLD, model=None):
+    """
+    Returns a ToneDetectionResponse when the message can be classified locally
+    with at least threshold confidence, otherwise None so the caller asks the LLM.
+    """
+    if not ENABLED or not text:
+        return None
+    response = lexicon_classify(text, threshold)
+    if response is not None:
+        _lexicon_hits.inc()
+        return response
+    model = model or _get_model()
+    if model is None or len(text) > MAX_CHARS:
+        _fallthroughs.inc()
+        return None
+    tone, urgency, confidence = _predict(text, model)
+    if confidence < threshold:
+        _fallthroughs.inc()
+        return None
+    _model_hits.inc()
+    return _response(text, tone, urgency, int(confidence * 100), f"Short message classified locally as {tone.value}.")
+
+
+def _predict(text, model):
+    tone_probabilities, urgent_probability = model.predict(text)
+    best = int(tone_probabilities.argmax())
+    urgency_probability = max(urgent_probability, 1.0 - urgent_probability)
+    confidence = min(float(tone_probabilities[best]), urgency_probability)
+    urgency = AllowedUrgency.URGENT if urgent_probability >= 0.5 else AllowedUrgency.NOT_URGENT
+    return AllowedTones(TONES[best]), urgency, confidence
+
+
+def best_guess(text, model=None):
+    """
+    Returns the local model's answer whatever its confidence or the message's
+    length, as a stand-in when the LLM cannot be asked. None without a model.
+    """
+    if not ENABLED or not text:
+        return None
+    model = model or _get_model()
+    if model is None:
+        return None
+    tone, urgency, confidence = _predict(text, model)
+    return _response(text, tone, urgency, int(confidence * 100), f"Estimated locally as {tone.value}; a full analysis was not available.")
@@ -5,21 +5,135 @@ This module provides functions to detect the tone of a message.
 """
 import os
 import json
-from typing import List
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, List
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, create_model, field_validator
 from enum import Enum
-# from openai import OpenAI
+
+from metrics_service import metrics
+from metrics_service.tracing import stage
+from llm_service.context_cache import ContextCache
+from llm_service.output_repair import (
+    as_percentage,
+    closest_label,
+    count_failure,
+    count_repaired,
+    count_reprompt,
+    loads_tolerant,
+    repaired
+)
+from llm_service.providers import HEDGE_ENABLED, GeminiProvider, ProviderRouter, providers_from_env
+from llm_service.response_cache import ResponseCache, content_key, normalize_text
+from llm_service.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from google.genai import types
 
 load_dotenv()
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-# openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# google.genai takes most of the app's import time, so it is imported and the
+# client built on first use. Benchmarks may assign a stand-in to `client`.
+client = None
+_client_lock = threading.Lock()
 
 MODEL = "gemini-2.0-flash-lite"  # Use a stronger model if available
 
+# Longer messages are shortened before tone detection
+TONE_MAX_INPUT_CHARS = int(os.getenv("TONE_MAX_INPUT_CHARS", "2000"))
+# Uploads the tone instruction once as Gemini cached content instead of sending it on every call
+TONE_CONTEXT_CACHE = os.getenv("TONE_CONTEXT_CACHE", "0") == "1"
+TONE_CONTEXT_CACHE_TTL = int(os.getenv("TONE_CONTEXT_CACHE_TTL", "3600"))
+# Prints the token counts of every Gemini call
+LOG_TOKEN_USAGE = os.getenv("LOG_TOKEN_USAGE", "1") == "1"
+
+
+def get_client():
+    """
+    Returns the primary Gemini client, creating it on first use.
+    """
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from google import genai
+                # GEMINI_BASE_URL points the client at a stand-in server, e.g. in load tests
+                base_url = os.getenv("GEMINI_BASE_URL")
+                client = genai.Client(
+                    api_key=os.getenv("GEMINI_API_KEY"),
+                    http_options={"base_url": base_url} if base_url else None
+                )
+    return client
+
+
+_prompt_tokens = metrics.counter("llm_prompt_tokens_total", "Prompt tokens reported by Gemini")
+_output_tokens = metrics.counter("llm_output_tokens_total", "Output tokens reported by Gemini")
+_cached_tokens = metrics.counter("llm_cached_tokens_total", "Prompt tokens Gemini served from cached content")
+_call_tokens = metrics.histogram(
+    "llm_call_tokens", "Total tokens per Gemini call", buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+)
+_truncated_outputs = metrics.counter("llm_truncated_outputs_total", "Gemini answers cut off by max_output_tokens")
+_truncated_inputs = metrics.counter("tone_inputs_truncated_total", "Messages shortened to TONE_MAX_INPUT_CHARS before tone detection")
+
+
+def record_usage(response, span=None, model=MODEL):
+    """
+    Adds the token counts of a Gemini response to the token metrics and to span,
+    and prints them when LOG_TOKEN_USAGE is on.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_token_count or 0
+    cached_tokens = usage.cached_content_token_count or 0
+    output_tokens = usage.candidates_token_count or 0
+    total_tokens = usage.total_token_count or prompt_tokens + output_tokens
+    candidates = getattr(response, "candidates", None)
+    finish_reason = getattr(candidates[0].finish_reason, "name", None) if candidates else None
+    _prompt_tokens.inc(prompt_tokens)
+    _cached_tokens.inc(cached_tokens)
+    _output_tokens.inc(output_tokens)
+    _call_tokens.observe(total_tokens)
+    if finish_reason == "MAX_TOKENS":
+        _truncated_outputs.inc()
+    if span is not None:
+        span.set("prompt_tokens", prompt_tokens)
+        span.set("cached_tokens", cached_tokens)
+        span.set("output_tokens", output_tokens)
+    if LOG_TOKEN_USAGE:
+        print(
+            f"Gemini tokens: model={model} prompt={prompt_tokens} cached={cached_tokens} "
+            f"output={output_tokens} total={total_tokens} finish={finish_reason}"
+        )
+
+
+# Gemini with MODEL first, then any providers configured with LLM_PROVIDERS
+router = ProviderRouter(
+    providers_from_env(GeminiProvider("gemini", MODEL, get_client=get_client)),
+    hedge=HEDGE_ENABLED
+)
+
+
+def usage_recorder(span):
+    """
+    Returns the callback that records the token usage of each provider's response into span.
+    """
+    def record(provider, response):
+        span.set("provider", provider.name)
+        record_usage(response, span, provider.model)
+    return record
+
+
+def generate(contents, config=None, parse=None):
+    """
+    Sends a generate_content request through the provider router, timed as the
+    llm_call stage, and records token usage. Returns parse(response) when parse
+    is given, so a hedged call is won by the first answer that parses.
+    """
+    with stage("llm_call") as span:
+        return router.call(contents, config, parse, usage_recorder(span))
+
 class AllowedTones(str, Enum):
     """
     Enum for allowed tones in tone detection.
@@ -41,11 +155,11 @@ class AllowedUrgency(str, Enum):
     NOT_URGENT = 'not urgent'
 
 
-class ToneDetectionResponse(BaseModel):
+class ToneAnalysis(BaseModel):
     """
-    Represents the response schema for tone detection.
+    Represents the response schema the model fills in for tone detection.
+    The analyzed message is not part of it, so the model does not spend output tokens echoing it.
     """
-    original_message: str
     tone: AllowedTones
     explanation: str
     urgency: AllowedUrgency
@@ -58,6 +172,20 @@ class ToneDetectionResponse(BaseModel):
         if len(v) != 3:
             raise ValueError('my_field must have exactly 3 string elements')
         return v
+
+
+class ToneDetectionResponse(ToneAnalysis):
+    """
+    Represents the result of tone detection: the model's analysis and the analyzed message.
+    """
+    original_message: str
+
+    @classmethod
+    def for_message(cls, text: str, analysis: ToneAnalysis):
+        """
+        Attaches the analyzed message to the model's analysis.
+        """
+        return cls(original_message=text, **dict(analysis))
     
     @classmethod
     def from_json(cls, json_str: str):
@@ -76,16 +204,32 @@ class ToneDetectionResponse(BaseModel):
             f"Quick Replies: {self.quick_replies}"
         )
 
+class _built_on_first_use:
+    """
+    A class attribute whose value is built by the decorated function on first access.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.value = None
+        self.lock = threading.Lock()
+
+    def __get__(self, instance, owner):
+        if self.value is None:
+            with self.lock:
+                if self.value is None:
+                    self.value = self.build(owner)
+        return self.value
+
+
 class ModelConfig:
     """
     Configuration for the model to be used in tone detection.
     This class encapsulates the model name and system instruction.
     """
-    DETECT_TONE_CONFIG = types.GenerateContentConfig(
-        system_instruction = """
+    DETECT_TONE_INSTRUCTION = """
         You are a tone and urgency detection model for neurodivergent users.
         Analyze the following message and return:
-        - include the original message as "original_message" in the JSON output.
         - the tone of the message (choose one: 'positive', 'negative', 'neutral', 'angry', 'sad', 'happy', 'confused', 'excited'),
         - a concise explanation (maximum 2 sentences),
         - whether the message is urgent or not (choose one: 'urgent', 'not urgent')
@@ -114,20 +258,104 @@ class ModelConfig:
           "Thanks for the reminder!"
          ]
          }
-           """,
-        max_output_tokens=200,
-        temperature=0.4,
-        top_p=0.8,
-        top_k=20,
-        response_schema=ToneDetectionResponse,
-        response_mime_type="application/json"
+           """
+    DETECT_TONE_SETTINGS = {
+        "max_output_tokens": 200,
+        "temperature": 0.4,
+        "top_p": 0.8,
+        "top_k": 20,
+    }
+
+    @_built_on_first_use
+    def DETECT_TONE_CONFIG(cls) -> "types.GenerateContentConfig":
+        from google.genai import types
+        return types.GenerateContentConfig(
+            system_instruction=cls.DETECT_TONE_INSTRUCTION,
+            **cls.DETECT_TONE_SETTINGS,
+            response_schema=ToneAnalysis,
+            response_mime_type="application/json"
+        )
+
+
+@lru_cache(maxsize=None)
+def detect_tone_fingerprint() -> str:
+    """
+    Hashes the parts of the tone detection config that change the model's answer.
+    Built from plain constants, so computing a cache key never imports google.genai.
+    """
+    return content_key(
+        ModelConfig.DETECT_TONE_INSTRUCTION,
+        json.dumps(ModelConfig.DETECT_TONE_SETTINGS, sort_keys=True),
+        json.dumps(ToneAnalysis.model_json_schema(), sort_keys=True),
+        str(TONE_MAX_INPUT_CHARS)
     )
 
 
+_tone_context = (
+    ContextCache(get_client, MODEL, ModelConfig.DETECT_TONE_INSTRUCTION, ttl=TONE_CONTEXT_CACHE_TTL)
+    if TONE_CONTEXT_CACHE else None
+)
+
+
+def tone_config() -> "types.GenerateContentConfig":
+    """
+    Returns the config for a single tone detection: DETECT_TONE_CONFIG, referring to
+    the cached instruction instead of sending it once context caching is set up.
+    Cached content lives with the primary provider, so it is not used when a call
+    may be hedged or failed over to another one.
+    """
+    name = _tone_context.name() if _tone_context is not None and len(router.providers) == 1 else None
+    if name is None:
+        return ModelConfig.DETECT_TONE_CONFIG
+    return _cached_tone_config(name)
+
+
+@lru_cache(maxsize=4)
+def _cached_tone_config(name: str) -> "types.GenerateContentConfig":
+    # Gemini rejects a system instruction next to cached content
+    return ModelConfig.DETECT_TONE_CONFIG.model_copy(update={"system_instruction": None, "cached_content": name})
+
+
+def warm_up():
+    """
+    Does the deferred import and set-up work ahead of the first request.
+    Called in the gunicorn master when preloading, so forked workers share the result.
+    """
+    ModelConfig.DETECT_TONE_CONFIG
+    detect_tone_fingerprint()
+
+
+tone_cache = ResponseCache(
+    "tone_cache",
+    ttl=int(os.getenv("TONE_CACHE_TTL", "3600")),
+    max_bytes=int(os.getenv("TONE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    path=os.getenv("TONE_CACHE_PATH") or None
+)
+
+
+def tone_cache_key(text: str) -> str:
+    return content_key(MODEL, detect_tone_fingerprint(), normalize_text(text))
+
+
+# Concurrent analyses of the same message, from any thread or the async bridge, share one call
+tone_flight = SingleFlight("tone_detect")
+summary_flight = SingleFlight("summarize")
+
+
+def fast_tone(text: str):
+    """
+    Returns the local classifier's answer for trivial messages, or None if the LLM is needed.
+    """
+    # Imported here because fast_classifier builds on the models defined in this module
+    from llm_service.fast_classifier import classify
+    return classify(text)
+
 
 def detect_tone(text: str) -> str:
     """
     Detects the tone and urgency of a given message using the Gemini API.
+    Trivial messages are answered by the local fast-path classifier, and results are
+    cached by normalized text, model and prompt, so repeated messages skip the API.
 
     Args:
         text (str): The message to analyze.
@@ -135,54 +363,388 @@ def detect_tone(text: str) -> str:
     Returns:
         ToneDetectionResponse: The structured response containing the original message, detected tone, explanation, urgency, confidence, and quick reply suggestions.
     """
+    fast = fast_tone(text)
+    if fast is not None:
+        return fast
+
+    cache_key = tone_cache_key(text)
+    cached = tone_cache.get(cache_key)
+    if cached is not None:
+        return ToneDetectionResponse.from_json(cached)
 
+    return tone_flight.do(cache_key, _detect_tone_uncached, text, cache_key)
 
-    prompt = f"Message: \"{text}\""
-    response = client.models.generate_content(
-        model=MODEL,
-        config=ModelConfig.DETECT_TONE_CONFIG,
-        contents=prompt
+
+def _detect_tone_uncached(text: str, cache_key: str):
+    # A call for the same message may have finished since the caller checked the cache
+    cached = tone_cache.get(cache_key)
+    if cached is not None:
+        return ToneDetectionResponse.from_json(cached)
+    fields, missing = generate(
+        config=tone_config(),
+        contents=tone_prompt(text),
+        parse=lambda response: parse_tone_fields(response.text)
     )
-    json_str = json.loads(response.text)
-    if not json_str or json_str == "":
-        return {"error": "Empty response from the model", "raw_response": response.text}
-    
-    response_model = ToneDetectionResponse.from_json(response.text)
+    if missing:
+        fields = complete_tone_fields(text, fields, missing)
+    return finish_tone_response(text, cache_key, fields)
+
+
+def prepare_message(text: str) -> str:
+    """
+    Normalizes a message for the prompt and shortens it to TONE_MAX_INPUT_CHARS.
+    A long message keeps its beginning and its end, where requests and sign-offs
+    usually are, so its tone survives the cut.
+    """
+    text = normalize_text(text)
+    if len(text) <= TONE_MAX_INPUT_CHARS:
+        return text
+    _truncated_inputs.inc()
+    head = TONE_MAX_INPUT_CHARS * 2 // 3
+    tail = TONE_MAX_INPUT_CHARS - head
+    return f"{text[:head]} […] {text[-tail:]}"
+
+
+def tone_prompt(text: str) -> str:
+    return f"Message: \"{prepare_message(text)}\""
+
 
+TONE_LABELS = [tone.value for tone in AllowedTones]
+URGENCY_LABELS = [urgency.value for urgency in AllowedUrgency]
+# Labels the model answers with instead of an allowed one
+TONE_ALIASES = {
+    "frustrated": "angry", "annoyed": "angry", "irritated": "angry", "furious": "angry",
+    "upset": "sad", "disappointed": "sad", "unhappy": "sad",
+    "glad": "happy", "joyful": "happy", "cheerful": "happy", "grateful": "positive", "friendly": "positive",
+    "enthusiastic": "excited", "eager": "excited",
+    "unclear": "confused", "uncertain": "confused", "puzzled": "confused",
+    "informative": "neutral", "calm": "neutral", "critical": "negative",
+}
+URGENCY_ALIASES = {
+    "high": "urgent", "immediate": "urgent", "yes": "urgent",
+    "low": "not urgent", "normal": "not urgent", "non urgent": "not urgent", "no": "not urgent",
+}
+TONE_FIELDS = list(ToneAnalysis.model_fields)
+
+
+def repair_tone_fields(data):
+    """
+    Brings a tone analysis the model answered with back within ToneAnalysis:
+    near-miss tone and urgency labels are mapped to allowed ones, confidence is
+    read as a 0-100 percentage, and quick_replies is trimmed to 3 or padded with
+    the fast path's replies for the tone.
+
+    Returns:
+        tuple: (the usable fields, the names of the fields still missing)
+    """
+    if not isinstance(data, dict):
+        return {}, list(TONE_FIELDS)
+    fields, repairs = {}, []
+
+    def label(name, labels, aliases):
+        value = closest_label(data.get(name), labels, aliases)
+        if value is not None:
+            fields[name] = value
+            if value != data[name]:
+                repairs.append(f"{name}_mapped")
+
+    label("tone", TONE_LABELS, TONE_ALIASES)
+    label("urgency", URGENCY_LABELS, URGENCY_ALIASES)
+    explanation = data.get("explanation")
+    if isinstance(explanation, str) and explanation.strip():
+        fields["explanation"] = explanation.strip()
+    confidence = as_percentage(data.get("confidence"))
+    if confidence is not None:
+        fields["confidence"] = confidence
+        if confidence != data["confidence"]:
+            repairs.append("confidence_clamped")
+    replies = data.get("quick_replies")
+    replies = [reply.strip() for reply in replies if isinstance(reply, str) and reply.strip()] if isinstance(replies, list) else []
+    if len(replies) > 3:
+        replies = replies[:3]
+        repairs.append("replies_trimmed")
+    elif replies and len(replies) < 3 and "tone" in fields:
+        # Imported here because fast_classifier builds on the models defined in this module
+        from llm_service.fast_classifier import QUICK_REPLIES
+        replies += [reply for reply in QUICK_REPLIES[AllowedTones(fields["tone"])] if reply not in replies][:3 - len(replies)]
+        repairs.append("replies_padded")
+    if len(replies) == 3:
+        fields["quick_replies"] = replies
+
+    for kind in repairs:
+        repaired(kind)
+    if repairs:
+        count_repaired()
+    return fields, [name for name in TONE_FIELDS if name not in fields]
+
+
+def parse_tone_fields(raw_text: str):
+    """
+    Parses and repairs a tone analysis answer. Raises ValueError when nothing of
+    it is usable, so a hedged or failed-over call can answer instead.
+
+    Returns:
+        tuple: (the usable fields, the names of the fields still missing)
+    """
+    data, _ = loads_tolerant(raw_text)
+    fields, missing = repair_tone_fields(data)
+    if not fields:
+        count_failure()
+        raise ValueError("No usable field in the tone analysis")
+    return fields, missing
+
+
+@lru_cache(maxsize=32)
+def missing_fields_config(missing: tuple) -> "types.GenerateContentConfig":
+    """
+    Returns the tone detection config with a response schema of only the missing fields.
+    """
+    schema = create_model(
+        "MissingToneFields", **{name: (ToneAnalysis.model_fields[name].annotation, ...) for name in missing}
+    )
+    return ModelConfig.DETECT_TONE_CONFIG.model_copy(update={"response_schema": schema})
+
+
+def missing_fields_prompt(text: str, fields: dict, missing) -> str:
+    return (
+        f"{tone_prompt(text)}\nPart of the analysis is already known: {json.dumps(fields, ensure_ascii=False)}. "
+        f"Return ONLY these fields: {', '.join(missing)}."
+    )
+
+
+def merge_missing_fields(fields: dict, missing, raw_text: str) -> dict:
+    """
+    Adds the fields of a follow-up answer to those already known.
+    Raises ValueError when a field is still missing.
+    """
+    data, _ = loads_tolerant(raw_text)
+    merged, still_missing = repair_tone_fields({**fields, **{
+        name: value for name, value in (data.items() if isinstance(data, dict) else ()) if name in missing
+    }})
+    if still_missing:
+        count_failure()
+        raise ValueError(f"The follow-up answer lacks {', '.join(still_missing)}")
+    return merged
+
+
+def complete_tone_fields(text: str, fields: dict, missing) -> dict:
+    """
+    Asks the model for only the fields missing from its first answer, instead of the whole analysis.
+    """
+    count_reprompt()
+    return generate(
+        config=missing_fields_config(tuple(missing)),
+        contents=missing_fields_prompt(text, fields, missing),
+        parse=lambda response: merge_missing_fields(fields, missing, response.text)
+    )
+
+
+def finish_tone_response(text: str, cache_key: str, fields: dict):
+    """
+    Validates the repaired fields, attaches the analyzed message and caches it under cache_key.
+    """
+    response_model = ToneDetectionResponse.for_message(text, ToneAnalysis.model_validate(fields))
+    tone_cache.set(cache_key, response_model.model_dump_json())
     return response_model
 
 
+BATCH_INSTRUCTION = """
+        You will receive several numbered messages instead of one.
+        Analyze each message independently and return a JSON array with exactly one result per message,
+        in the same order as the messages.
+        """
+
+_batch_size = metrics.histogram("tone_batch_size", "Messages sent per batched Gemini call", buckets=(1, 2, 4, 8, 16, 32, 64))
+_batch_fallbacks = metrics.counter("tone_batch_fallbacks_total", "Batched messages re-analyzed one by one after validation failed")
+
+
+def _batch_config(size: int) -> "types.GenerateContentConfig":
+    base = ModelConfig.DETECT_TONE_CONFIG
+    return base.model_copy(update={
+        "system_instruction": str(base.system_instruction) + BATCH_INSTRUCTION,
+        "max_output_tokens": base.max_output_tokens * size,
+        "response_schema": list[ToneAnalysis],
+    })
+
+
+def _parse_batch(raw: str, size: int) -> List:
+    """
+    Parses a batched answer once. Returns per message the (fields, missing) of its
+    repaired analysis, or None. When the answer was cut off, the messages it
+    covers keep their analyses, a partial last one included; an answer that is
+    complete but has the wrong number of items is not trusted for any message.
+    """
+    try:
+        items, truncated = loads_tolerant(raw)
+    except ValueError:
+        return [None] * size
+    if not isinstance(items, list) or (len(items) != size and not truncated):
+        count_failure()
+        return [None] * size
+    results = []
+    for item in items[:size]:
+        fields, missing = repair_tone_fields(item)
+        results.append((fields, missing) if fields else None)
+    return results + [None] * (size - len(results))
+
+
+def detect_tones(texts: List[str]) -> List:
+    """
+    Detects the tone of several messages with a single Gemini call.
+    Cached messages are answered from the cache. A message whose part of the
+    batched answer lacks some fields is asked for only those, and one whose part
+    is unusable is re-analyzed on its own. A message that still fails does not
+    fail the others: its place in the result holds the exception instead.
+
+    Args:
+        texts (List[str]): The messages to analyze.
+
+    Returns:
+        List: One ToneDetectionResponse, or Exception, per message, in the same order.
+    """
+    results = [None] * len(texts)
+    pending = {}
+    for i, text in enumerate(texts):
+        fast = fast_tone(text)
+        if fast is not None:
+            results[i] = fast
+            continue
+        cache_key = tone_cache_key(text)
+        cached = tone_cache.get(cache_key)
+        if cached is not None:
+            results[i] = ToneDetectionResponse.from_json(cached)
+        else:
+            # Identical messages in one batch are sent once
+            pending.setdefault(cache_key, []).append(i)
+
+    if len(pending) == 1:
+        indexes = next(iter(pending.values()))
+        try:
+            response_model = detect_tone(texts[indexes[0]])
+        except Exception as e:
+            print(f"Error detecting tone in a batch: {e}")
+            response_model = e
+        for i in indexes:
+            results[i] = response_model
+    elif pending:
+        # Messages another caller is already analyzing are waited for, not sent again
+        groups, joined = [], []
+        for cache_key, indexes in pending.items():
+            future, leader = tone_flight.claim(cache_key)
+            (groups if leader else joined).append((cache_key, indexes, future))
+        unresolved = list(groups)
+        try:
+            parsed = _detect_batch([texts[indexes[0]] for _, indexes, _ in groups]) if len(groups) > 1 else [None] * len(groups)
+            for (cache_key, indexes, future), item in zip(groups, parsed):
+                try:
+                    response_model = _finish_batch_item(texts[indexes[0]], cache_key, item, len(groups) > 1)
+                except Exception as e:
+                    # Only this message's callers, here and in the single flight, see the error
+                    print(f"Error detecting tone in a batch: {e}")
+                    tone_flight.resolve(cache_key, future, error=e)
+                    response_model = e
+                else:
+                    tone_flight.resolve(cache_key, future, response_model)
+                unresolved.remove((cache_key, indexes, future))
+                for i in indexes:
+                    results[i] = response_model
+        except BaseException as e:
+            for cache_key, _, future in unresolved:
+                tone_flight.resolve(cache_key, future, error=e)
+            raise
+        for _, indexes, future in joined:
+            try:
+                response_model = future.result()
+            except Exception as e:
+                response_model = e
+            for i in indexes:
+                results[i] = response_model
+    return results
+
+
+def _finish_batch_item(text: str, cache_key: str, item, batched: bool) -> ToneDetectionResponse:
+    """
+    Completes a message's part of a batched answer, or re-analyzes the message on
+    its own when that part is unusable.
+    """
+    if item is not None:
+        fields, missing = item
+        try:
+            if missing:
+                fields = complete_tone_fields(text, fields, missing)
+            return finish_tone_response(text, cache_key, fields)
+        except ValueError as e:
+            print(f"Error completing a batched tone analysis: {e}")
+    if batched:
+        _batch_fallbacks.inc()
+    # Not detect_tone: this call already leads the single flight for the message
+    return _detect_tone_uncached(text, cache_key)
+
+
+def _parse_valid_batch(raw: str, size: int) -> List:
+    # An answer without a single valid item loses to a hedged call's answer
+    items = _parse_batch(raw, size)
+    if all(item is None for item in items):
+        raise ValueError("No valid item in the batched answer")
+    return items
+
+
+def _detect_batch(batch_texts: List[str]) -> List:
+    """
+    Sends several messages in one numbered prompt. Returns one (fields, missing)
+    or None per message, None for every message if the call itself fails.
+    """
+    _batch_size.observe(len(batch_texts))
+    prompt = "\n".join(f"{n}. {tone_prompt(text)}" for n, text in enumerate(batch_texts, start=1))
+    try:
+        return generate(
+            config=_batch_config(len(batch_texts)),
+            contents=prompt,
+            parse=lambda response: _parse_valid_batch(response.text or "", len(batch_texts))
+        )
+    except Exception as e:
+        print(f"Error in batched tone detection: {e}")
+        return [None] * len(batch_texts)
+
+
 def translate_to_greek_with_tone(text):
     """
     Translates the original message to Greek, preserving tone, emotion, and urgency.
-    Uses Gemini (or OpenAI) for context-aware translation.
+    Uses Gemini (or OpenAI) for context-aware translation. Results are cached.
     """
-    prompt = (
-        "Translate the following message to Greek, preserving the tone, emotion, and urgency. "
-        "Return ONLY the translated Greek sentence, with no explanation, no romanization, and no extra text. "
+    # Imported here because translation builds on this module
+    from llm_service.translation import translate
+    return translate(text, "el")
+
+
+def translation_prompt(text, language="Greek"):
+    return (
+        f"Translate the following message to {language}, preserving the tone, emotion, and urgency. "
+        f"Return ONLY the translated {language} sentence, with no explanation, no romanization, and no extra text. "
         "Message: " + text
     )
-    response = client.models.generate_content(
-        model=MODEL,
-        contents=prompt
-    )
-    return response.text.strip()
 
 
 def summarize_conversation(messages):
     """
     Summarizes a list of Slack messages using the LLM.
     """
+    prompt = summary_prompt(messages)
+    return summary_flight.do(content_key(MODEL, prompt), _summarize, prompt)
+
+
+def _summarize(prompt):
+    response = generate(contents=prompt)
+    return response.text.strip()
+
+
+def summary_prompt(messages):
     # Format messages for the prompt
     conversation = "\n".join(
         [f"{m.get('user', 'Someone')}: {m.get('text', '')}" for m in messages]
     )
-    prompt = (
+    return (
         "Summarize the following Slack thread. "
         "List key takeaways and any action items or decisions. Be concise.\n"
         f"Thread:\n{conversation}"
-    )
-    response = client.models.generate_content(
-        model=MODEL,
-        contents=prompt
     )
\ No newline at end of file
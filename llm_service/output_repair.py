@@ -0,0 +1,130 @@
+"""
+output_repair.py
+Tolerant parsing of structured model output.
+This module parses a model's JSON answer once, recovering the complete part of
+an answer cut off by max_output_tokens, and provides the helpers that bring
+near-miss values back within a schema, counting each repair, so a fixable
+answer does not cost another LLM call.
+"""
+import difflib
+import json
+import re
+
+from metrics_service import metrics
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+# Shorter candidates are tried when a cut-off answer does not close cleanly
+MAX_ATTEMPTS = 8
+
+_parsed = metrics.counter("llm_outputs_parsed_total", "Structured model answers parsed")
+_repaired = metrics.counter("llm_outputs_repaired_total", "Structured model answers that needed at least one repair")
+_reprompts = metrics.counter("llm_output_reprompts_total", "Follow-up calls asking only for fields missing from an answer")
+_failures = metrics.counter("llm_output_failures_total", "Structured model answers that could not be parsed or repaired")
+_repairs = {}
+
+
+def loads_tolerant(raw):
+    """
+    Parses JSON text from a model. Code fences are ignored, and an answer cut off
+    mid-way keeps every value completed before the cut.
+    Returns (value, truncated). Raises ValueError when no JSON value can be recovered.
+    """
+    _parsed.inc()
+    text = _FENCE.sub("", raw or "")
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        _failures.inc()
+        raise ValueError("No JSON in the model's answer")
+    stack, in_string, escaped, cuts = [], False, False, []
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack.pop() != ch:
+                break
+            cuts.append((i + 1, "".join(reversed(stack))))
+            if not stack:
+                break
+        elif ch == ",":
+            # Everything before a comma is a complete value
+            cuts.append((i, "".join(reversed(stack))))
+    for end, closers in reversed(cuts[-MAX_ATTEMPTS:]):
+        try:
+            value = json.loads(text[start:end] + closers)
+        except ValueError:
+            continue
+        repaired("truncated")
+        return value, True
+    _failures.inc()
+    raise ValueError("The model's answer is not valid JSON")
+
+
+def repaired(kind):
+    """
+    Counts one repair of the given kind, e.g. "truncated" or "confidence_clamped".
+    """
+    counter = _repairs.get(kind)
+    if counter is None:
+        counter = _repairs.setdefault(kind, metrics.counter(f"llm_output_repairs_{kind}_total", f"Model answers repaired: {kind}"))
+    counter.inc()
+
+
+def count_repaired():
+    """
+    Counts an answer that needed at least one repair.
+    """
+    _repaired.inc()
+
+
+def count_reprompt():
+    _reprompts.inc()
+
+
+def count_failure():
+    _failures.inc()
+
+
+def closest_label(value, labels, aliases=None, cutoff=0.75):
+    """
+    Returns the label that value names, matching case and spacing loosely, then
+    through aliases, then by spelling. None when nothing is close enough.
+    """
+    if not isinstance(value, str):
+        return None
+    key = " ".join(value.strip().lower().replace("_", " ").replace("-", " ").split())
+    if key in labels:
+        return key
+    if aliases and key in aliases:
+        return aliases[key]
+    matches = difflib.get_close_matches(key, labels, n=1, cutoff=cutoff)
+    return matches[0] if matches else None
+
+
+def as_percentage(value):
+    """
+    Reads 85, 85.0, "85%" or 0.85 as a whole percentage clamped to 0-100. None otherwise.
+    """
+    if isinstance(value, str):
+        try:
+            value = float(value.strip().rstrip("%"))
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return None
+    if 0 < value < 1 and not float(value).is_integer():
+        value *= 100
+    return int(round(min(100, max(0, value))))
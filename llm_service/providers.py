@@ -0,0 +1,410 @@
+"""
+providers.py
+LLM backends behind one call.
+This module keeps the providers that can answer a generate_content request and
+tracks each one's latency and health. A call goes to the fastest healthy provider.
+When that provider is slower than its usual p95, the call is hedged by sending it
+to the next provider too, and the first valid answer wins. A provider that errors
+is failed over to the next one.
+"""
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics_service import metrics
+
+# Extra providers after the primary Gemini one, configured by LLM_PROVIDER_<NAME>_* variables
+PROVIDER_NAMES = [name.strip() for name in os.getenv("LLM_PROVIDERS", "").split(",") if name.strip()]
+HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+# Used until a provider has MIN_SAMPLES latencies for its own p95
+HEDGE_DELAY = int(os.getenv("LLM_HEDGE_DELAY_MS", "1000")) / 1000
+MIN_HEDGE_DELAY = int(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "50")) / 1000
+FAILURE_THRESHOLD = int(os.getenv("LLM_PROVIDER_FAILURE_THRESHOLD", "3"))
+COOLDOWN_SECONDS = float(os.getenv("LLM_PROVIDER_COOLDOWN_SECONDS", "30"))
+MIN_SAMPLES = 20
+
+
+class ProviderStats:
+    """
+    Latencies of a provider's recent successful calls and its run of failures.
+    After FAILURE_THRESHOLD failures in a row the provider is skipped for
+    COOLDOWN_SECONDS; it is tried again after that, and one more failure skips it again.
+    """
+
+    def __init__(self, name, window=200):
+        self._latencies = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+        metric = re.sub(r"[^a-z0-9]+", "_", name.lower())
+        self._seconds = metrics.histogram(f"llm_provider_{metric}_seconds", f"Latency of successful calls to {name}")
+        self._failures = metrics.counter(f"llm_provider_{metric}_failures_total", f"Calls to {name} that failed or gave an invalid answer")
+        self._wins = metrics.counter(f"llm_provider_{metric}_wins_total", f"Calls answered by {name}")
+        self._healthy = metrics.gauge(f"llm_provider_{metric}_healthy", f"1 while {name} is used, 0 while it is skipped after failures")
+        self._healthy.set(1)
+
+    def record_success(self, seconds=None):
+        # Streamed answers pass no seconds: their length says nothing about a call's usual latency
+        if seconds is not None:
+            self._seconds.observe(seconds)
+        with self._lock:
+            if seconds is not None:
+                self._latencies.append(seconds)
+            self._consecutive_failures = 0
+        self._healthy.set(1)
+
+    def record_failure(self):
+        self._failures.inc()
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= FAILURE_THRESHOLD:
+                self._down_until = time.monotonic() + COOLDOWN_SECONDS
+                self._healthy.set(0)
+
+    def record_win(self):
+        self._wins.inc()
+
+    def healthy(self, now=None):
+        return (now or time.monotonic()) >= self._down_until
+
+    def quantile(self, q):
+        """
+        Returns the q quantile of recent latencies, or None before MIN_SAMPLES calls.
+        """
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        return {
+            "healthy": self.healthy(),
+            "samples": len(self._latencies),
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p95_ms": _ms(self.quantile(0.95)),
+            "consecutive_failures": self._consecutive_failures,
+            "wins": self._wins.value,
+            "failures": self._failures.value,
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _close_stream(started):
+    # Stops a stream that is no longer read, so its connection is released
+    close = getattr(started[2], "close", None)
+    if close is not None:
+        close()
+
+
+class Provider:
+    """
+    A backend that answers generate_content requests with one model.
+    Subclasses implement generate, generate_async and generate_stream, returning
+    responses with .text and, when the backend reports them, usage_metadata and candidates.
+    """
+    kind = None
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.stats = ProviderStats(name)
+
+    def generate(self, contents, config=None):
+        raise NotImplementedError
+
+    async def generate_async(self, contents, config=None):
+        raise NotImplementedError
+
+    def generate_stream(self, contents, config=None):
+        """
+        Returns an iterator of partial responses; the last one carries the usage.
+        """
+        raise NotImplementedError
+
+
+class GeminiProvider(Provider):
+    """
+    Gemini through google-genai. base_url points it at another endpoint, e.g. a
+    stand-in server; get_client supplies a client built elsewhere instead.
+    """
+    kind = "gemini"
+
+    def __init__(self, name, model, api_key=None, base_url=None, get_client=None):
+        super().__init__(name, model)
+        self.api_key = api_key
+        self.base_url = base_url
+        self._get_client = get_client
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._get_client is not None:
+            return self._get_client()
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(
+                        api_key=self.api_key,
+                        http_options={"base_url": self.base_url} if self.base_url else None
+                    )
+        return self._client
+
+    def generate(self, contents, config=None):
+        return self.client().models.generate_content(model=self.model, contents=contents, config=config)
+
+    async def generate_async(self, contents, config=None):
+        return await self.client().aio.models.generate_content(model=self.model, contents=contents, config=config)
+
+    def generate_stream(self, contents, config=None):
+        return self.client().models.generate_content_stream(model=self.model, contents=contents, config=config)
+
+
+# Provider classes by the LLM_PROVIDER_<NAME>_KIND that selects them
+PROVIDER_KINDS = {GeminiProvider.kind: GeminiProvider}
+
+
+def providers_from_env(primary):
+    """
+    Returns primary followed by the providers named in LLM_PROVIDERS. For a provider
+    named backup, LLM_PROVIDER_BACKUP_KIND (default gemini), _MODEL (default the
+    primary's), _API_KEY (default GEMINI_API_KEY) and _BASE_URL configure it.
+    """
+    providers = [primary]
+    for name in PROVIDER_NAMES:
+        prefix = "LLM_PROVIDER_" + re.sub(r"[^A-Z0-9]+", "_", name.upper()) + "_"
+        kind = os.getenv(prefix + "KIND", GeminiProvider.kind)
+        providers.append(PROVIDER_KINDS[kind](
+            name,
+            os.getenv(prefix + "MODEL", primary.model),
+            api_key=os.getenv(prefix + "API_KEY", os.getenv("GEMINI_API_KEY")),
+            base_url=os.getenv(prefix + "BASE_URL") or None
+        ))
+    return providers
+
+
+class ProviderRouter:
+    """
+    Sends each call to the healthy provider with the lowest p50, hedging it with
+    the next one after the first provider's p95, and failing over on errors.
+    At most two providers work on a call at once. With one provider, calls go
+    straight to it on the calling thread.
+    """
+
+    def __init__(self, providers, hedge=True, max_workers=32):
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self._hedged = metrics.counter("llm_hedged_calls_total", "Calls also sent to a second provider after the first was slow")
+        self._failovers = metrics.counter("llm_failovers_total", "Calls sent to another provider after one failed")
+
+    def _ensure_started(self):
+        # The pool is created on first use, and again after a fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-provider")
+                self._pid = os.getpid()
+
+    def ranked(self):
+        """
+        Returns healthy providers by p50 (those without enough samples last, in
+        configured order), then the providers being skipped.
+        """
+        now = time.monotonic()
+        healthy = [provider for provider in self.providers if provider.stats.healthy(now)]
+        healthy.sort(key=lambda provider: provider.stats.quantile(0.5) or math.inf)
+        return healthy + [provider for provider in self.providers if not provider.stats.healthy(now)]
+
+    def hedge_delay(self, provider):
+        p95 = provider.stats.quantile(0.95)
+        return max(MIN_HEDGE_DELAY, HEDGE_DELAY if p95 is None else p95)
+
+    def _attempt(self, provider, contents, config, parse, on_response):
+        start = time.perf_counter()
+        try:
+            response = provider.generate(contents, config)
+            if on_response is not None:
+                on_response(provider, response)
+            result = parse(response) if parse is not None else response
+        except Exception as e:
+            provider.stats.record_failure()
+            print(f"Error from LLM provider {provider.name}: {e}")
+            raise
+        provider.stats.record_success(time.perf_counter() - start)
+        return result
+
+    def call(self, contents, config=None, parse=None, on_response=None):
+        """
+        Returns parse(response), or the response itself, from the first provider
+        whose answer parses. parse raises for an invalid answer, which counts as
+        that provider failing. on_response(provider, response) sees every response,
+        including those of hedges that lost. Raises the last error when every provider failed.
+        """
+        return self._race(self._attempt, contents, config, parse, on_response)
+
+    def _first_chunk(self, provider, contents, config):
+        try:
+            chunks = iter(provider.generate_stream(contents, config))
+            first = next(chunks, None)
+            if first is None:
+                raise ValueError("Empty streamed answer")
+        except Exception as e:
+            provider.stats.record_failure()
+            print(f"Error from LLM provider {provider.name}: {e}")
+            raise
+        return provider, first, chunks
+
+    def stream(self, contents, config=None, on_response=None):
+        """
+        Yields the partial responses of a streamed answer from the first provider
+        that starts answering. The stream is hedged on its first chunk and failed
+        over while no chunk has arrived; an error after that is raised, since part
+        of the answer has been used. on_response(provider, response) sees the last chunk.
+        """
+        provider, chunk, chunks = self._race(self._first_chunk, contents, config, discard=_close_stream)
+        try:
+            yield chunk
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            provider.stats.record_failure()
+            raise
+        finally:
+            _close_stream((provider, chunk, chunks))
+        provider.stats.record_success()
+        if on_response is not None:
+            on_response(provider, chunk)
+
+    def _race(self, attempt, *args, discard=None):
+        """
+        Runs attempt(provider, *args) on the best provider, hedging and failing
+        over as described on the class. discard is called with the results of
+        hedges that finish after the winner.
+        """
+        ranked = self.ranked()
+        if len(ranked) == 1:
+            result = attempt(ranked[0], *args)
+            ranked[0].stats.record_win()
+            return result
+        self._ensure_started()
+        remaining, pending, last_error = list(ranked), {}, None
+
+        def launch():
+            provider = remaining.pop(0)
+            future = self._executor.submit(attempt, provider, *args)
+            pending[future] = (time.monotonic(), provider)
+
+        launch()
+        while pending:
+            timeout = None
+            if self.hedge and remaining and len(pending) == 1:
+                (started, provider), = pending.values()
+                timeout = max(0.0, started + self.hedge_delay(provider) - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self._hedged.inc()
+                launch()
+                continue
+            for future in done:
+                _, provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                # A slower hedge still finishes in the background and adds its latency to the stats
+                provider.stats.record_win()
+                if discard is not None:
+                    for loser in list(pending) + [other for other in done if other is not future]:
+                        loser.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+                return result
+            if not pending and remaining:
+                self._failovers.inc()
+                launch()
+        raise last_error
+
+    async def _attempt_async(self, provider, contents, config, parse, on_response):
+        start = time.perf_counter()
+        try:
+            response = await provider.generate_async(contents, config)
+            if on_response is not None:
+                on_response(provider, response)
+            result = parse(response) if parse is not None else response
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            provider.stats.record_failure()
+            print(f"Error from LLM provider {provider.name}: {e}")
+            raise
+        provider.stats.record_success(time.perf_counter() - start)
+        return result
+
+    async def call_async(self, contents, config=None, parse=None, on_response=None):
+        """
+        Async counterpart of call. The hedge that loses is cancelled.
+        """
+        ranked = self.ranked()
+        if len(ranked) == 1:
+            result = await self._attempt_async(ranked[0], contents, config, parse, on_response)
+            ranked[0].stats.record_win()
+            return result
+        remaining, pending, last_error = list(ranked), {}, None
+
+        def launch():
+            provider = remaining.pop(0)
+            task = asyncio.ensure_future(self._attempt_async(provider, contents, config, parse, on_response))
+            pending[task] = (time.monotonic(), provider)
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and remaining and len(pending) == 1:
+                    (started, provider), = pending.values()
+                    timeout = max(0.0, started + self.hedge_delay(provider) - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._hedged.inc()
+                    launch()
+                    continue
+                for task in done:
+                    _, provider = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    provider.stats.record_win()
+                    return result
+                if not pending and remaining:
+                    self._failovers.inc()
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self):
+        """
+        Describes each provider's latency and health, in the order calls would try them.
+        """
+        return [
+            {"name": provider.name, "kind": provider.kind, "model": provider.model, **provider.stats.snapshot()}
+            for provider in self.ranked()
+        ]
@@ -0,0 +1,155 @@
+"""
+response_cache.py
+Content-addressed cache for LLM responses.
+This module provides a two-level cache: an in-process LRU/TTL layer capped by
+size, and an optional SQLite file that all gunicorn workers can share.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from cachetools import TTLCache
+
+from metrics_service import metrics
+
+
+def normalize_text(text):
+    """
+    Normalizes a message so that trivially different copies share a cache entry.
+    Unicode is NFC-normalized and runs of whitespace are collapsed; case is kept
+    because capitals change tone.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def content_key(*parts):
+    """
+    Builds a stable cache key from the given string parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SqliteResponseStore:
+    """
+    A shared on-disk store of cached responses, safe to use from many threads and processes.
+    """
+
+    def __init__(self, path, table):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        self._connection().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl)
+        )
+
+    def prune(self):
+        self._connection().execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+
+
+def _encoded_size(value):
+    # Responses are mostly ASCII but emoji and other languages take several bytes a character
+    return len(value.encode("utf-8"))
+
+
+class ResponseCache:
+    """
+    Caches serialized responses by key, in memory and optionally in SQLite.
+    The memory layer evicts least recently used entries once max_bytes is reached
+    and drops entries older than ttl seconds.
+    """
+
+    def __init__(self, name, ttl=3600, max_bytes=16 * 1024 * 1024, path=None):
+        self.name = name
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=_encoded_size)
+        self._lock = threading.Lock()
+        self._store = SqliteResponseStore(path, name) if path else None
+        self._writes = 0
+
+        self._hits = metrics.counter(f"{name}_hits_total", "Lookups answered from memory")
+        self._shared_hits = metrics.counter(f"{name}_shared_hits_total", "Lookups answered from the shared store")
+        self._misses = metrics.counter(f"{name}_misses_total", "Lookups that found nothing")
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None.
+        """
+        with self._lock:
+            value = self._memory.get(key)
+        if value is not None:
+            self._hits.inc()
+            return value
+        if self._store is not None:
+            try:
+                value = self._store.get(key)
+            except sqlite3.Error as e:
+                print(f"Error reading {self.name} store: {e}")
+            if value is not None:
+                self._shared_hits.inc()
+                self._remember(key, value)
+                return value
+        self._misses.inc()
+        return None
+
+    def set(self, key, value):
+        """
+        Stores value under key in memory and, when configured, in the shared store.
+        """
+        self._remember(key, value)
+        if self._store is not None:
+            try:
+                self._store.set(key, value, self.ttl)
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    self._store.prune()
+            except sqlite3.Error as e:
+                print(f"Error writing {self.name} store: {e}")
+
+    def _remember(self, key, value):
+        with self._lock:
+            try:
+                self._memory[key] = value
+            except ValueError:
+                # Larger than the whole memory budget; keep it only in the shared store
+                pass
+
+    def stats(self):
+        with self._lock:
+            entries, size = len(self._memory), self._memory.currsize
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self._hits.value,
+            "shared_hits": self._shared_hits.value,
+            "misses": self._misses.value,
+        }
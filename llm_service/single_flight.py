@@ -0,0 +1,87 @@
+"""
+single_flight.py
+Coalescing of concurrent identical LLM calls.
+This module lets the first caller for a key make the call while every caller
+that arrives with the same key before it finishes waits for that result,
+whether it runs on another thread or on the async bridge's event loop.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from metrics_service import metrics
+
+
+class SingleFlight:
+    """
+    Tracks one in-flight Future per key. The caller that claims a key is its
+    leader and must resolve it; the others wait on the same Future.
+    """
+
+    def __init__(self, name):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self._calls = metrics.counter(f"{name}_calls_total", "Calls made by the first caller for a key")
+        self._coalesced = metrics.counter(f"{name}_coalesced_total", "Calls that waited on an identical call in flight")
+
+    def claim(self, key):
+        """
+        Returns (Future, True) if the caller leads the call for key, or the
+        leader's (Future, False) if one is already in flight.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._coalesced.inc()
+                return future, False
+            future = self._inflight[key] = Future()
+        self._calls.inc()
+        return future, True
+
+    def resolve(self, key, future, result=None, error=None):
+        """
+        Publishes the leader's result, or error, to every waiter and frees the key.
+        A Future that is already settled, e.g. cancelled by a caller, is left as it is.
+        """
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Calls fn unless an identical call is in flight, and returns its result.
+        """
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """
+        Awaits coro_fn unless an identical call is in flight, and returns its result.
+        Waiting does not block the event loop, and a waiter that is cancelled,
+        e.g. by its timeout, leaves the shared Future to the others.
+        """
+        future, leader = self.claim(key)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result
@@ -0,0 +1,250 @@
+"""
+thread_summarizer.py
+Map-reduce summarization of long Slack threads.
+This module splits a thread into chunks that fit a token budget, summarizes the
+chunks in parallel while the rest of the thread is still being fetched, and
+reduces the partial summaries into one, reporting progress as it goes.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_service.llm_functions import MODEL, generate, router, summary_prompt, usage_recorder
+from llm_service.response_cache import ResponseCache, content_key
+from metrics_service.tracing import stage
+
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "6000"))
+PARALLELISM = int(os.getenv("SUMMARY_PARALLELISM", "4"))
+# chat.update is Tier 3, so progress is shown at most about once a second
+UPDATE_INTERVAL = float(os.getenv("SUMMARY_UPDATE_SECONDS", "1.0"))
+
+# Rolling summary per thread and the ts of the last message it covers
+summary_cache = ResponseCache(
+    "summary_cache",
+    ttl=int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+    path=os.getenv("SUMMARY_CACHE_PATH") or None
+)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count for budgeting: Gemini averages about four characters per token.
+    """
+    return len(text) // 4 + 1
+
+
+def format_message(message):
+    return f"{message.get('user', 'Someone')}: {message.get('text', '')}"
+
+
+def from_people(messages):
+    """
+    Leaves out messages posted by bots, including ToneBot's own placeholders and
+    earlier summaries, so they are never summarized.
+    """
+    for message in messages:
+        if 'bot_id' not in message and message.get('subtype') != 'bot_message':
+            yield message
+
+
+def chunk_messages(messages, budget=CHUNK_TOKENS):
+    """
+    Groups messages into lists whose formatted text fits within budget tokens.
+    Consumes messages lazily, so chunks are produced while later pages are fetched.
+    """
+    chunk, used = [], 0
+    for message in messages:
+        tokens = estimate_tokens(format_message(message))
+        if chunk and used + tokens > budget:
+            yield chunk
+            chunk, used = [], 0
+        chunk.append(message)
+        used += tokens
+    if chunk:
+        yield chunk
+
+
+def partial_summary_prompt(messages, part):
+    return (
+        f"The following is part {part} of a longer Slack thread. "
+        "Summarize it in a few bullet points, keeping names, decisions and action items.\n"
+        "Thread part:\n" + "\n".join(format_message(m) for m in messages)
+    )
+
+
+def reduce_prompt(summaries):
+    return (
+        "The following are summaries of consecutive parts of one Slack thread. "
+        "Combine them into one summary of the whole thread. "
+        "List key takeaways and any action items or decisions. Be concise.\n\n"
+        + "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, start=1))
+    )
+
+
+def update_prompt(previous_summary, messages):
+    return (
+        "Here is a summary of a Slack thread so far, followed by the messages posted since. "
+        "Update the summary so it covers the whole thread. "
+        "List key takeaways and any action items or decisions. Be concise.\n\n"
+        f"Summary so far:\n{previous_summary}\n\n"
+        "New messages:\n" + "\n".join(format_message(m) for m in messages)
+    )
+
+
+def _generate(prompt):
+    response = generate(contents=prompt)
+    return response.text.strip()
+
+
+def _generate_streaming(prompt, on_text):
+    """
+    Streams the model's answer through the provider router, calling on_text with
+    the text received so far.
+    """
+    text = ""
+    with stage("llm_stream") as span:
+        # The last chunk carries the usage of the whole answer
+        for chunk in router.stream(prompt, on_response=usage_recorder(span)):
+            if chunk.text:
+                text += chunk.text
+                on_text(text)
+    return text.strip()
+
+
+class _ThrottledUpdates:
+    """
+    Forwards progress text to on_update no more than once per interval.
+    """
+
+    def __init__(self, on_update, interval):
+        self.on_update = on_update
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, text, force=False):
+        now = time.monotonic()
+        if force or now - self._last >= self.interval:
+            self._last = now
+            self.on_update(text)
+
+
+def _reduce(summaries, progress):
+    # Partial summaries that are still too long together are reduced in groups first
+    while len(summaries) > 1 and estimate_tokens(reduce_prompt(summaries)) > CHUNK_TOKENS:
+        groups, group, used = [], [], 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if group and used + tokens > CHUNK_TOKENS // 2:
+                groups.append(group)
+                group, used = [], 0
+            group.append(summary)
+            used += tokens
+        groups.append(group)
+        summaries = [_generate(reduce_prompt(group)) if len(group) > 1 else group[0] for group in groups]
+    return _generate_streaming(reduce_prompt(summaries), lambda text: progress(f"{text} …"))
+
+
+def summarize_thread(messages, on_update, parallelism=PARALLELISM, update_interval=UPDATE_INTERVAL):
+    """
+    Summarizes a thread, possibly hundreds of messages long.
+
+    Args:
+        messages: An iterable of Slack message dicts, e.g. a paginated generator. Bot messages are skipped.
+        on_update: Called with progress text, at most once per update_interval, and with the final summary.
+
+    Returns:
+        str: The summary of the whole thread.
+    """
+    progress = _ThrottledUpdates(on_update, update_interval)
+    chunks = chunk_messages(from_people(messages))
+    first = next(chunks, None)
+    if first is None:
+        summary = "_There are no messages to summarize._"
+        progress(summary, force=True)
+        return summary
+    second = next(chunks, None)
+    if second is None:
+        # Short thread: one call, streamed as it is generated
+        summary = _generate_streaming(summary_prompt(first), lambda text: progress(f"{text} …"))
+        progress(summary, force=True)
+        return summary
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="summary") as pool:
+        futures = [pool.submit(_generate, partial_summary_prompt(first, 1)), pool.submit(_generate, partial_summary_prompt(second, 2))]
+        for part, chunk in enumerate(chunks, start=3):
+            futures.append(pool.submit(_generate, partial_summary_prompt(chunk, part)))
+        summaries = []
+        for part, future in enumerate(futures, start=1):
+            summaries.append(future.result())
+            progress(
+                f"_Summarizing… {part}/{len(futures)} parts done_\n\n" + "\n\n".join(summaries),
+                force=part == 1
+            )
+
+    summary = _reduce(summaries, progress)
+    progress(summary, force=True)
+    return summary
+
+
+class _LastTs:
+    """
+    Passes messages through, remembering the newest ts seen. Given only people's
+    messages, so the ts stays that of the last message actually summarized.
+    """
+
+    def __init__(self, messages, last_ts=None):
+        self.messages = messages
+        self.last_ts = last_ts
+
+    def __iter__(self):
+        for message in self.messages:
+            ts = message.get('ts')
+            if self.last_ts is not None and ts is not None and float(ts) <= float(self.last_ts):
+                # conversations.replies always returns the parent, even with oldest set
+                continue
+            if ts is not None:
+                self.last_ts = ts
+            yield message
+
+
+def summarize_thread_incremental(channel_id, thread_ts, fetch_messages, on_update,
+                                 parallelism=PARALLELISM, update_interval=UPDATE_INTERVAL):
+    """
+    Summarizes a thread, reusing the summary from the previous request for it.
+    Only messages newer than the cached summary are sent, together with that summary,
+    so cost follows the new activity rather than the thread length.
+
+    Args:
+        fetch_messages: Called with the ts of the last summarized message (None the first
+            time) and returns an iterable of the thread's messages after it.
+        on_update: Called with progress text and with the final summary.
+
+    Returns:
+        str: The summary of the whole thread.
+    """
+    key = content_key(MODEL, channel_id, thread_ts)
+    cached = summary_cache.get(key)
+    previous = json.loads(cached) if cached else None
+
+    # Bot messages are dropped first, so the last summarized ts is never ToneBot's own placeholder or summary
+    messages = _LastTs(from_people(fetch_messages(previous["last_ts"] if previous else None)), previous and previous["last_ts"])
+    if previous is None:
+        summary = summarize_thread(messages, on_update, parallelism, update_interval)
+    else:
+        progress = _ThrottledUpdates(on_update, update_interval)
+        chunks = list(chunk_messages(messages))
+        if not chunks:
+            summary = previous["summary"]
+        elif len(chunks) == 1:
+            summary = _generate_streaming(update_prompt(previous["summary"], chunks[0]), lambda text: progress(f"{text} …"))
+        else:
+            # More new activity than fits one prompt: summarize it, then merge with the old summary
+            new_summary = summarize_thread(iter(sum(chunks, [])), lambda text: progress(f"_Summarizing new messages…_\n\n{text}"), parallelism, update_interval)
+            summary = _reduce([previous["summary"], new_summary], progress)
+        progress(summary, force=True)
+
+    if messages.last_ts is not None:
+        summary_cache.set(key, json.dumps({"summary": summary, "last_ts": messages.last_ts}))
+    return summary
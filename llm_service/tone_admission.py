@@ -0,0 +1,100 @@
+"""
+tone_admission.py
+Admission control in front of tone detection.
+This module answers messages that need no Gemini call, charges the estimated
+tokens of the others to their author's, channel's and team's budgets, and falls
+back to a local estimate when a budget is used up or the batch backlog is full.
+"""
+import os
+from concurrent.futures import Future
+
+from llm_service.llm_functions import TONE_MAX_INPUT_CHARS, ToneDetectionResponse, fast_tone, tone_cache, tone_cache_key
+from llm_service.tone_batcher import tone_batcher
+from metrics_service import metrics
+from worker_service.admission import OverBudgetError, admission
+
+# Instruction and answer of one tone call, measured with benchmarks.bench_prompt_tokens
+TONE_CALL_TOKENS = 500
+# Messages waiting for a batch before new ones get a local estimate instead of queueing
+MAX_BACKLOG = int(os.getenv("ADMISSION_MAX_BACKLOG", "200"))
+
+_degraded = metrics.counter("tone_admission_degraded_total", "Messages given a local estimate instead of an LLM analysis")
+_shed = metrics.counter("tone_admission_shed_total", "Messages left unanalyzed, over budget with no local estimate")
+_overloaded = metrics.counter("tone_admission_overload_total", "Messages turned away from a full batch backlog")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the Gemini tokens of analyzing text on its own, at about 4 characters per token.
+    """
+    return TONE_CALL_TOKENS + min(len(text), TONE_MAX_INPUT_CHARS) // 4
+
+
+def _free_answer(text):
+    # The fast path and the cache cost no budget
+    fast = fast_tone(text)
+    if fast is not None:
+        return fast
+    cached = tone_cache.get(tone_cache_key(text))
+    return ToneDetectionResponse.from_json(cached) if cached is not None else None
+
+
+def _local_estimate(text):
+    # Imported here because fast_classifier builds on llm_functions
+    from llm_service.fast_classifier import best_guess
+    response = best_guess(text)
+    if response is None:
+        _shed.inc()
+        raise OverBudgetError("Tone analysis budget used up")
+    _degraded.inc()
+    return response
+
+
+def admit_tone(text: str, team_id=None, channel_id=None, user_id=None):
+    """
+    Decides whether analyzing text may call Gemini.
+
+    Returns:
+        None when the call is admitted and its estimated tokens are charged, or a
+        ToneDetectionResponse when no call is needed or a local estimate stands in
+        for one because a budget is used up.
+
+    Raises:
+        OverBudgetError: Over budget, and there is no local model for an estimate.
+    """
+    answer = _free_answer(text)
+    if answer is not None:
+        return answer
+    if admission.admit(estimate_tokens(text), user=user_id, channel=channel_id, team=team_id):
+        return None
+    return _local_estimate(text)
+
+
+def submit_tone(text: str, team_id=None, channel_id=None, user_id=None) -> Future:
+    """
+    Admits text and queues it on the tone batcher under its channel's fair share.
+    Returns a Future of its ToneDetectionResponse, holding an OverBudgetError
+    when the message was turned away.
+    """
+    try:
+        if tone_batcher.pending() >= MAX_BACKLOG:
+            answer = _free_answer(text)
+            if answer is None:
+                _overloaded.inc()
+                answer = _local_estimate(text)
+        else:
+            answer = admit_tone(text, team_id, channel_id, user_id)
+    except OverBudgetError as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+    if answer is not None:
+        future = Future()
+        future.set_result(answer)
+        return future
+    return tone_batcher.submit(
+        text,
+        tenant=channel_id or team_id,
+        cost=estimate_tokens(text),
+        weight=admission.weight(channel_id, team_id)
+    )
@@ -0,0 +1,131 @@
+"""
+tone_batcher.py
+Micro-batching of tone detection requests.
+This module gathers messages submitted within a short window and analyzes them
+with one Gemini call, handing each caller its own result through a Future.
+Waiting messages are taken in weighted fair order between tenants, so a busy
+channel's backlog does not hold up everyone else's.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from llm_service.llm_functions import detect_tones
+from worker_service.admission import FairQueue
+
+
+class ToneBatcher:
+    """
+    Collects submitted texts and flushes them as one batch when max_batch_size is
+    reached or window seconds have passed since the first pending text arrived.
+    At most max_concurrent_batches are in flight; texts arriving meanwhile wait
+    in a FairQueue rather than in the executor's queue.
+    """
+
+    def __init__(self, detect_many, window=0.05, max_batch_size=10, max_concurrent_batches=4):
+        self.detect_many = detect_many
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self._pending = FairQueue()
+        self._in_flight = 0
+        self._first_pending_at = None
+        self._condition = threading.Condition()
+        self._executor = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Called with the condition held. Restarts the flusher after a fork.
+        if self._pid == os.getpid():
+            return
+        self._pending = FairQueue()
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches, thread_name_prefix="tone-batch")
+        threading.Thread(target=self._flusher, name="tone-batcher", daemon=True).start()
+        self._pid = os.getpid()
+
+    def submit(self, text, tenant=None, cost=1.0, weight=1.0):
+        """
+        Queues text for the next batch and returns a Future of its ToneDetectionResponse.
+        tenant, cost and weight set its place in the fair queue.
+        """
+        future = Future()
+        with self._condition:
+            self._ensure_started()
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.push(tenant, (text, future), cost, weight)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+        return future
+
+    def detect(self, text, timeout=None):
+        """
+        Submits text and waits for its result.
+        """
+        return self.submit(text).result(timeout=timeout)
+
+    def pending(self):
+        """
+        Returns the number of texts waiting for a batch.
+        """
+        return len(self._pending)
+
+    def backlog(self):
+        """
+        Returns the number of texts waiting for a batch per tenant.
+        """
+        with self._condition:
+            return self._pending.backlog()
+
+    def _flusher(self):
+        while True:
+            with self._condition:
+                while not self._pending or self._in_flight >= self.max_concurrent_batches:
+                    self._condition.wait()
+                deadline = self._first_pending_at + self.window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = [self._pending.pop() for _ in range(min(len(self._pending), self.max_batch_size))]
+                self._in_flight += 1
+                if self._pending:
+                    self._first_pending_at = time.monotonic()
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            self._detect_batch(batch)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify()
+
+    def _detect_batch(self, batch):
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.detect_many([text for text, _ in batch])
+        except Exception as e:
+            print(f"Error in tone batch of {len(batch)}: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # A message whose analysis failed carries its own error; the rest of the batch is unaffected
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+tone_batcher = ToneBatcher(
+    detect_tones,
+    window=int(os.getenv("TONE_BATCH_WINDOW_MS", "50")) / 1000,
+    max_batch_size=int(os.getenv("TONE_BATCH_MAX_SIZE", "10")),
+    max_concurrent_batches=int(os.getenv("TONE_BATCH_CONCURRENCY", "4")),
+)
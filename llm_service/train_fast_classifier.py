@@ -0,0 +1,143 @@
+"""
+train_fast_classifier.py
+Trains the fast-path tone classifier on tone labels the LLM has already produced.
+Labels are read from the shared tone cache (TONE_CACHE_PATH) and/or a JSONL file
+of {"text", "tone", "urgency"} rows. A holdout split is used to report how many
+messages the fast path would answer and how often it agrees with the LLM.
+
+Usage:
+    python -m llm_service.train_fast_classifier --cache tone_cache.db --out fast_classifier.npz
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+
+import numpy as np
+
+from llm_service.fast_classifier import N_FEATURES, THRESHOLD, TONES, ToneModel, classify, feature_indices, lexicon_classify
+
+
+def load_cached_labels(path, table="tone_cache"):
+    """
+    Returns [(text, tone, urgent)] from a tone cache database, expired entries included.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(f"SELECT value FROM {table}").fetchall()
+    finally:
+        conn.close()
+    samples = []
+    for (value,) in rows:
+        try:
+            answer = json.loads(value)
+            samples.append((answer["original_message"], answer["tone"], answer["urgency"] == "urgent"))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return samples
+
+
+def load_jsonl_labels(path):
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                samples.append((row["text"], row["tone"], row["urgency"] == "urgent"))
+    return samples
+
+
+def train(samples, epochs=10, learning_rate=0.5, l2=1e-6, n_features=N_FEATURES, seed=0):
+    """
+    Fits the tone and urgency models with per-sample stochastic gradient descent.
+    """
+    rng = random.Random(seed)
+    features = [feature_indices(text, n_features) for text, _, _ in samples]
+    tone_labels = [TONES.index(tone) for _, tone, _ in samples]
+    urgent_labels = [float(urgent) for _, _, urgent in samples]
+
+    tone_weights = np.zeros((n_features, len(TONES)), dtype=np.float32)
+    tone_bias = np.zeros(len(TONES), dtype=np.float32)
+    urgency_weights = np.zeros(n_features, dtype=np.float32)
+    urgency_bias = np.zeros(1, dtype=np.float32)
+
+    order = list(range(len(samples)))
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        rate = learning_rate / (1 + epoch)
+        for i in order:
+            indices, values = features[i]
+            logits = values @ tone_weights[indices] + tone_bias
+            probabilities = np.exp(logits - logits.max())
+            probabilities /= probabilities.sum()
+            probabilities[tone_labels[i]] -= 1.0
+            # Indices are unique per sample, so fancy-indexed updates do not collide
+            tone_weights[indices] -= rate * (np.outer(values, probabilities) + l2 * tone_weights[indices])
+            tone_bias -= rate * probabilities
+
+            urgent = 1.0 / (1.0 + np.exp(-(values @ urgency_weights[indices] + urgency_bias[0])))
+            error = urgent - urgent_labels[i]
+            urgency_weights[indices] -= rate * (error * values + l2 * urgency_weights[indices])
+            urgency_bias -= rate * error
+    return ToneModel(tone_weights, tone_bias, urgency_weights, urgency_bias)
+
+
+def evaluate(model, samples, threshold):
+    """
+    Returns (fast-path hit rate, accuracy on hits, lexicon hits, model accuracy on all samples).
+    Accuracy counts a message as correct when both tone and urgency match the LLM.
+    """
+    hits = correct = lexicon = overall = 0
+    for text, tone, urgent in samples:
+        tone_probabilities, urgent_probability = model.predict(text)
+        if TONES[int(tone_probabilities.argmax())] == tone and (urgent_probability >= 0.5) == urgent:
+            overall += 1
+        if lexicon_classify(text) is not None:
+            lexicon += 1
+        response = classify(text, threshold=threshold, model=model)
+        if response is None:
+            continue
+        hits += 1
+        if response.tone.value == tone and (response.urgency.value == "urgent") == urgent:
+            correct += 1
+    total = len(samples) or 1
+    return hits / total, correct / (hits or 1), lexicon, overall / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--cache", default=os.getenv("TONE_CACHE_PATH"), help="Tone cache SQLite file")
+    parser.add_argument("--labels", help="JSONL file of extra labelled messages")
+    parser.add_argument("--out", default=os.getenv("FAST_CLASSIFIER_WEIGHTS", "fast_classifier.npz"))
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    samples = []
+    if args.cache:
+        samples += load_cached_labels(args.cache)
+    if args.labels:
+        samples += load_jsonl_labels(args.labels)
+    samples = [sample for sample in samples if sample[1] in TONES]
+    if not samples:
+        parser.error("no labelled messages found, pass --cache and/or --labels")
+
+    random.Random(0).shuffle(samples)
+    split = int(len(samples) * (1 - args.holdout))
+    training, holdout = samples[:split], samples[split:] or samples
+    print(f"training on {len(training)} messages, evaluating on {len(holdout)}")
+
+    model = train(training, epochs=args.epochs)
+    hit_rate, accuracy, lexicon, overall = evaluate(model, holdout, args.threshold)
+    print(f"fast-path hit rate:       {hit_rate:.1%} (threshold {args.threshold}, {lexicon} lexicon hits)")
+    print(f"fast-path accuracy:       {accuracy:.1%} of hits agree with the LLM")
+    print(f"model accuracy, all msgs: {overall:.1%}")
+
+    model.save(args.out)
+    print(f"saved weights to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
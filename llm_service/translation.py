@@ -0,0 +1,191 @@
+"""
+translation.py
+Tone-preserving translation into any supported language.
+This module caches translations by message, target language, model and prompt,
+and can fold a translation into a tone detection call so a later click is served from cache.
+"""
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from pydantic import ValidationError
+
+from llm_service.llm_functions import (
+    MODEL,
+    ModelConfig,
+    ToneAnalysis,
+    ToneDetectionResponse,
+    _detect_tone_uncached,
+    detect_tone,
+    fast_tone,
+    finish_tone_response,
+    generate,
+    repair_tone_fields,
+    tone_cache,
+    tone_cache_key,
+    tone_flight,
+    tone_prompt,
+    translation_prompt
+)
+from llm_service.output_repair import count_failure, loads_tolerant
+from llm_service.response_cache import ResponseCache, content_key, normalize_text
+from llm_service.single_flight import SingleFlight
+from metrics_service import metrics
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+# Language code -> (name used in prompts, flag shown on buttons)
+LANGUAGES = {
+    "el": ("Greek", "🇬🇷"),
+    "en": ("English", "🇬🇧"),
+    "es": ("Spanish", "🇪🇸"),
+    "fr": ("French", "🇫🇷"),
+    "de": ("German", "🇩🇪"),
+    "it": ("Italian", "🇮🇹"),
+    "pt": ("Portuguese", "🇵🇹"),
+    "nl": ("Dutch", "🇳🇱"),
+    "ja": ("Japanese", "🇯🇵"),
+    "zh": ("Chinese", "🇨🇳"),
+}
+DEFAULT_LANGUAGE = "el"
+
+translation_cache = ResponseCache(
+    "translation_cache",
+    ttl=int(os.getenv("TRANSLATION_CACHE_TTL", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    path=os.getenv("TRANSLATION_CACHE_PATH") or None
+)
+
+translation_flight = SingleFlight("translate")
+
+_pretranslated = metrics.counter("translations_pretranslated_total", "Translations produced together with a tone detection")
+
+
+class ToneWithTranslation(ToneAnalysis):
+    translation: str
+
+
+def language_code(language):
+    """
+    Returns the code of a supported language given its code or name, or None.
+    """
+    language = (language or "").strip().lower()
+    if language in LANGUAGES:
+        return language
+    return next((code for code, (name, _) in LANGUAGES.items() if name.lower() == language), None)
+
+
+def language_name(code):
+    return LANGUAGES[code][0]
+
+
+def language_flag(code):
+    return LANGUAGES[code][1]
+
+
+def translation_key(text, language):
+    # The prompt template is part of the key, so prompt changes start a fresh cache
+    return content_key(MODEL, translation_prompt("", language_name(language)), normalize_text(text))
+
+
+def translate(text, language=DEFAULT_LANGUAGE):
+    """
+    Translates text into the given language, preserving tone, emotion, and urgency.
+
+    Args:
+        text (str): The message to translate.
+        language (str): A code from LANGUAGES.
+
+    Returns:
+        str: The translated message.
+    """
+    key = translation_key(text, language)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+    return translation_flight.do(key, _translate_uncached, text, language, key)
+
+
+def _translate_uncached(text, language, key):
+    response = generate(contents=translation_prompt(text, language_name(language)))
+    translated = response.text.strip()
+    translation_cache.set(key, translated)
+    return translated
+
+
+@lru_cache(maxsize=None)
+def tone_translation_config(language) -> "types.GenerateContentConfig":
+    base = ModelConfig.DETECT_TONE_CONFIG
+    return base.model_copy(update={
+        "system_instruction": str(base.system_instruction) + (
+            f"\nAlso translate the message to {language_name(language)}, preserving the tone, "
+            "emotion, and urgency, and put ONLY the translated text in the translation field."
+        ),
+        "max_output_tokens": base.max_output_tokens * 2,
+        "response_schema": ToneWithTranslation,
+    })
+
+
+def split_tone_translation(text, language, raw_text):
+    """
+    Parses and repairs a combined answer and caches its tone and translation separately.
+    Returns the ToneDetectionResponse and the translation. Raises ValueError when
+    the translation or a tone field is missing, e.g. from an answer cut off early.
+    """
+    combined, _ = loads_tolerant(raw_text)
+    translated = combined.get("translation") if isinstance(combined, dict) else None
+    fields, missing = repair_tone_fields(combined)
+    if not isinstance(translated, str) or not translated.strip() or missing:
+        count_failure()
+        raise ValueError("The combined answer lacks " + ", ".join(missing or ["translation"]))
+    translated = translated.strip()
+    tone_response = finish_tone_response(text, tone_cache_key(text), fields)
+    translation_cache.set(translation_key(text, language), translated)
+    _pretranslated.inc()
+    return tone_response, translated
+
+
+def detect_tone_and_translate(text, language):
+    """
+    Detects the tone of a message and translates it in the same Gemini call.
+    When the tone is already known or comes from the fast path, no call is made
+    for the translation; it is then produced when the user asks for it.
+    The call runs as the message's tone detection, so concurrent analyses of the
+    same message, with or without a translation, share it.
+
+    Returns:
+        tuple: (ToneDetectionResponse, translation or None)
+    """
+    key = translation_key(text, language)
+    translated = translation_cache.get(key)
+    tone_response = fast_tone(text)
+    if tone_response is None:
+        cached = tone_cache.get(tone_cache_key(text))
+        tone_response = ToneDetectionResponse.from_json(cached) if cached is not None else None
+    if tone_response is not None:
+        return tone_response, translated
+    if translated is not None:
+        return detect_tone(text), translated
+    cache_key = tone_cache_key(text)
+    tone_response = tone_flight.do(cache_key, _detect_tone_and_translate_uncached, text, language, cache_key)
+    # The leader cached its translation before sharing the tone; callers that joined
+    # a plain tone detection, or asked for another language, get theirs on request
+    return tone_response, translation_cache.get(key)
+
+
+def _detect_tone_and_translate_uncached(text, language, cache_key):
+    cached = tone_cache.get(cache_key)
+    if cached is not None:
+        return ToneDetectionResponse.from_json(cached)
+    try:
+        tone_response, _ = generate(
+            config=tone_translation_config(language),
+            contents=tone_prompt(text),
+            parse=lambda response: split_tone_translation(text, language, response.text)
+        )
+        return tone_response
+    except (ValidationError, ValueError) as e:
+        print(f"Error in combined tone and translation: {e}")
+        # This call holds the message's tone flight, so detect_tone would wait on itself
+        return _detect_tone_uncached(text, cache_key)
@@ -0,0 +1,179 @@
+"""
+metrics.py
+In-process metrics for the bot.
+This module provides thread-safe counters, gauges and histograms that the
+services use to report queue depths, latencies and hit rates.
+"""
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Counter:
+    """
+    A monotonically increasing value.
+    """
+    kind = "counter"
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge:
+    """
+    A value that can go up and down, such as a queue depth.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Histogram:
+    """
+    Records observations (in seconds unless stated otherwise) into fixed buckets.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, description="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self):
+        """
+        Returns a context manager that observes the elapsed time of its block.
+        """
+        return _Timer(self)
+
+    def snapshot(self):
+        """
+        Returns (cumulative bucket counts, sum, count) taken under the lock.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self._histogram = histogram
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+def _get_or_create(cls, name, description, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = cls(name, description, **kwargs)
+            _registry[name] = metric
+        return metric
+
+
+def counter(name, description=""):
+    return _get_or_create(Counter, name, description)
+
+
+def gauge(name, description=""):
+    return _get_or_create(Gauge, name, description)
+
+
+def histogram(name, description="", buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, description, buckets=buckets)
+
+
+def all_metrics():
+    """
+    Returns a list of every registered metric, sorted by name.
+    """
+    with _registry_lock:
+        return [_registry[name] for name in sorted(_registry)]
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition():
+    """
+    Renders every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in all_metrics():
+        description = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {metric.name} {description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if metric.kind == "histogram":
+            cumulative, total, count = metric.snapshot()
+            for bound, value in zip(metric.buckets + (float("inf"),), cumulative):
+                lines.append(f'{metric.name}_bucket{{le="{_format_value(bound)}"}} {value}')
+            lines.append(f"{metric.name}_sum {_format_value(total)}")
+            lines.append(f"{metric.name}_count {count}")
+        else:
+            lines.append(f"{metric.name} {_format_value(metric.value)}")
+    return "\n".join(lines) + "\n"
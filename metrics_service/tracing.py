@@ -0,0 +1,113 @@
+"""
+tracing.py
+Stage timings and optional per-request traces.
+This module times named stages of the request path into histograms and, when
+TRACE_REQUESTS=1, also collects them as spans of the current request or job and
+prints each finished trace as one JSON line.
+"""
+import contextvars
+import itertools
+import json
+import os
+import time
+
+from metrics_service import metrics
+
+TRACING = os.getenv("TRACE_REQUESTS", "0") == "1"
+
+_current = contextvars.ContextVar("trace", default=None)
+_ids = itertools.count(1)
+_stage_histograms = {}
+
+
+class Trace:
+    """
+    The spans recorded for one request or background job.
+    """
+    __slots__ = ("name", "trace_id", "parent_id", "start", "spans")
+
+    def __init__(self, name, parent_id=None):
+        self.name = name
+        self.trace_id = f"{os.getpid()}-{next(_ids)}"
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def to_json(self):
+        return json.dumps({
+            "trace": self.trace_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "spans": self.spans,
+        })
+
+
+def start_trace(name, parent_id=None):
+    """
+    Starts a trace for the current context. Returns (trace, token) for end_trace,
+    or None when tracing is off.
+    """
+    if not TRACING:
+        return None
+    trace = Trace(name, parent_id)
+    return trace, _current.set(trace)
+
+
+def end_trace(started):
+    if started is None:
+        return
+    trace, token = started
+    _current.reset(token)
+    print(trace.to_json())
+
+
+def current_trace_id():
+    trace = _current.get()
+    return trace.trace_id if trace is not None else None
+
+
+class stage:
+    """
+    Times a block as the stage `name`: observed into the stage_<name>_seconds
+    histogram and, when tracing, added as a span. Attributes set with
+    set(key, value) inside the block are added to the span.
+    """
+    __slots__ = ("name", "histogram", "start", "attrs")
+
+    def __init__(self, name):
+        self.name = name
+        histogram = _stage_histograms.get(name)
+        if histogram is None:
+            histogram = _stage_histograms.setdefault(
+                name, metrics.histogram(f"stage_{name}_seconds", f"Time spent in the {name} stage")
+            )
+        self.histogram = histogram
+        self.attrs = None
+
+    def set(self, key, value):
+        if TRACING:
+            if self.attrs is None:
+                self.attrs = {}
+            self.attrs[key] = value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.histogram.observe(end - self.start)
+        trace = _current.get() if TRACING else None
+        if trace is not None:
+            span = {
+                "stage": self.name,
+                "start_ms": round((self.start - trace.start) * 1000, 3),
+                "duration_ms": round((end - self.start) * 1000, 3),
+            }
+            if exc_type is not None:
+                span["error"] = exc_type.__name__
+            if self.attrs:
+                span.update(self.attrs)
+            trace.spans.append(span)
+        return False
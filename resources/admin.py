@@ -0,0 +1,60 @@
+"""
+Module exposing operational state to administrators.
+"""
+import hmac
+import os
+
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from llm_service.llm_functions import router
+from llm_service.tone_admission import MAX_BACKLOG
+from llm_service.tone_batcher import tone_batcher
+from worker_service.admission import admission
+
+blp = Blueprint("Admin", "admin", description="Administration")
+
+# Bearer token required by the admin endpoints; they are disabled when it is unset
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+
+def _require_admin():
+    if not ADMIN_API_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {ADMIN_API_TOKEN}"):
+        abort(401, message="Invalid admin token")
+
+
+@blp.route("/admin/budgets")
+class Budgets(MethodView):
+    """
+    Endpoint showing how much of their LLM budgets users, channels and teams have used.
+    """
+    @blp.response(200)
+    def get(self):
+        """
+        Returns budget usage of this worker process: per level the budget and the
+        keys that have used the most of it (?limit=, default 20), and the tone batch backlog.
+        """
+        _require_admin()
+        snapshot = admission.snapshot(limit=request.args.get("limit", 20, type=int))
+        backlog = tone_batcher.backlog()
+        snapshot["backlog"] = {"pending": sum(backlog.values()), "max": MAX_BACKLOG, "per_tenant": backlog}
+        snapshot["pid"] = os.getpid()
+        return snapshot
+
+
+@blp.route("/admin/providers")
+class Providers(MethodView):
+    """
+    Endpoint showing the LLM providers' latency and health.
+    """
+    @blp.response(200)
+    def get(self):
+        """
+        Returns each provider of this worker process in routing order, with its
+        recent p50 and p95 latency, health, wins and failures.
+        """
+        _require_admin()
+        return {"providers": router.snapshot(), "hedging": router.hedge, "pid": os.getpid()}
@@ -0,0 +1,21 @@
+"""
+Module exposing the bot's metrics for Prometheus.
+"""
+from flask import Response
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+from metrics_service import metrics
+
+blp = Blueprint("Metrics", "metrics", description="Operational metrics")
+
+@blp.route("/metrics")
+class Metrics(MethodView):
+    """
+    Endpoint scraped by Prometheus.
+    """
+    def get(self):
+        """
+        Returns every counter, gauge and histogram in the Prometheus text format.
+        """
+        return Response(metrics.exposition(), mimetype=metrics.CONTENT_TYPE)
@@ -1,26 +1,70 @@
 """
 Module for handling tone detection requests from Slack.
 """
-from threading import Timer
+import os
 from flask import request, Response
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
-from llm_service.llm_functions import detect_tone, translate_to_greek_with_tone
+from llm_service.llm_functions import AllowedUrgency, detect_tone
+from llm_service.tone_admission import admit_tone, submit_tone
+from llm_service.thread_summarizer import summarize_thread_incremental
+from llm_service.async_bridge import bridge
+from llm_service.async_llm_functions import detect_tone_and_translate_async, detect_tone_async
+from llm_service.translation import DEFAULT_LANGUAGE, LANGUAGES, detect_tone_and_translate, language_code, language_flag, language_name, translate
 from slack_service.slack_functions import (
+    REMINDER_DELAY_SECONDS,
     is_user_opted_in,
+    iter_thread_replies,
+    post_thread_message,
     post_analyze_button,
     send_ephemeral_tone_message,
     get_latest_message_block,
-    send_reminder_if_no_reply,
+    get_message_text,
+    get_user_language,
     send_simple_ephemeral_message,
     send_simple_message,
-    set_user_opt_in
+    send_response_url_message,
+    send_response_url_tone_message,
+    set_user_language,
+    set_user_opt_in,
+    update_message,
+    user_directory
 )
 from slack_service.payload import InteractionPayload, SlashPayload, EventPayload
+from slack_service.event_dedup import event_dedup
+from slack_service.message_history import message_history
+from worker_service.admission import OverBudgetError
+from worker_service.dispatcher import dispatcher, QueueFullError
+from worker_service.reminder_scheduler import reminders
+from worker_service.result_store import analyses
 
 blp = Blueprint("Tone", "tone", description="Slash commands")
 
+LLM_ASYNC = os.getenv("LLM_ASYNC", "0") == "1"
+OVER_BUDGET_MESSAGE = "You have reached ToneBot's analysis limit for now, please try again in a few minutes."
+BUSY_MESSAGE = "ToneBot is busy right now, please try again in a moment."
+
+
+def _send_later(send, *args):
+    """
+    Runs work that calls the Slack Web API on a dispatcher worker, so a request
+    thread never waits for the rate limiter and acknowledges within Slack's deadline.
+    Returns False when the dispatch queue is full and the work was dropped.
+    """
+    try:
+        dispatcher.submit(send, *args)
+    except QueueFullError:
+        print(f"Dropped {send.__name__}: dispatch queue is full")
+        return False
+    return True
+
+
+def _reply_busy(response_url):
+    # response_url is not rate-limited, unlike the Web API methods
+    if response_url:
+        send_response_url_message(response_url, BUSY_MESSAGE)
+
 @blp.route("/detect-tone")
 class ToneDetection(MethodView):
     """
@@ -33,13 +77,11 @@ class ToneDetection(MethodView):
         Detects the tone of a message sent via Slack.
         """
         payload = SlashPayload(request)
-        text = payload.text
-        if text is None or text == "":
-            text = get_latest_message_block(payload.channel_id, payload.user_id)
-        print("Text to analyze:", text)
-        tone_response = detect_tone(text)
-        print(tone_response)
-        send_ephemeral_tone_message(payload.channel_id, payload.user_id, tone_response)
+        try:
+            dispatcher.submit(_detect_and_deliver_tone, payload.team_id, payload.channel_id, payload.user_id, payload.text, payload.response_url)
+        except QueueFullError:
+            # Answer inline so the user is told right away instead of waiting for a result that never comes
+            return {"response_type": "ephemeral", "text": BUSY_MESSAGE}, 200
         return Response(), 200
 
     @blp.response(200)
@@ -50,6 +92,67 @@ class ToneDetection(MethodView):
         return "hello there"
     
 
+def _detect_and_deliver_tone(team_id, channel_id, user_id, text, response_url):
+    """
+    Runs on a dispatcher worker: resolves the text, detects its tone and delivers the result.
+    Prefers the slash command's response_url and falls back to chat_postEphemeral.
+    For users with a language preference the message is translated in the same
+    Gemini call, so the translate button is answered from cache.
+    Gemini is only called within the user's, channel's and team's budgets.
+    """
+    if text is None or text == "":
+        text = get_latest_message_block(channel_id, user_id)
+    if not text:
+        if not (response_url and send_response_url_message(response_url, "No recent message to analyze.")):
+            send_simple_ephemeral_message(channel_id, user_id, "No recent message to analyze.")
+        return
+    print("Text to analyze:", text)
+    language = get_user_language(user_id)
+    try:
+        answer = admit_tone(text, team_id, channel_id, user_id)
+    except OverBudgetError:
+        if not (response_url and send_response_url_message(response_url, OVER_BUDGET_MESSAGE)):
+            send_simple_ephemeral_message(channel_id, user_id, OVER_BUDGET_MESSAGE)
+        return
+    if answer is not None:
+        # Answered locally, from cache, or estimated locally because a budget is used up
+        _deliver_tone(channel_id, user_id, answer, response_url, language)
+        return
+    if LLM_ASYNC:
+        # The worker is released while Gemini answers; delivery is queued again once it does
+        if language:
+            future = bridge.submit(detect_tone_and_translate_async(text, language))
+        else:
+            future = bridge.submit(detect_tone_async(text))
+        future.add_done_callback(lambda f: _queue_tone_delivery(f, channel_id, user_id, response_url, language))
+        return
+    if language:
+        tone_response, _ = detect_tone_and_translate(text, language)
+    else:
+        tone_response = detect_tone(text)
+    _deliver_tone(channel_id, user_id, tone_response, response_url, language)
+
+
+def _queue_tone_delivery(future, channel_id, user_id, response_url, language=None):
+    if future.cancelled() or future.exception() is not None:
+        print(f"Error detecting tone: {'cancelled' if future.cancelled() else future.exception()}")
+        return
+    result = future.result()
+    tone_response = result[0] if language else result
+    try:
+        dispatcher.submit(_deliver_tone, channel_id, user_id, tone_response, response_url, language)
+    except QueueFullError:
+        print(f"Dropped tone result for {user_id}: dispatch queue is full")
+
+
+def _deliver_tone(channel_id, user_id, tone_response, response_url, language=None):
+    print(tone_response)
+    language = language or DEFAULT_LANGUAGE
+    if response_url and send_response_url_tone_message(response_url, tone_response, language):
+        return
+    send_ephemeral_tone_message(channel_id, user_id, tone_response, language)
+
+
 @blp.route("/slack/events")
 class SlackEvents(MethodView):
     """
@@ -66,38 +169,58 @@ class SlackEvents(MethodView):
             return {"challenge": payload.challenge}, 200
         
         event = payload.event
+        # Slack retries and duplicate deliveries stop here, before any LLM or Slack API work
+        if not event_dedup.first_seen(
+            f"event:{payload.event_id}" if payload.event_id else None,
+            f"message:{event.get('channel')}:{event['ts']}" if event.get('ts') else None
+        ):
+            return '', 200
+
+        if event['type'] == 'message':
+            # Keeps /detect-tone from having to ask conversations.history for the latest message
+            message_history.record_event(event)
+
+        if event['type'] in ('user_change', 'team_join'):
+            user_directory.apply_event(event)
+            return '', 200
+
         if event['type'] == 'message' and 'subtype' not in event:
             if 'bot_id' in event:
                 return '', 200
         
+        # Cancel the reminder if a reply is posted in the thread, whoever replied. The reply is
+        # remembered, since the message's analysis may still be running and schedule it afterwards
+        if event.get('type') == 'message' and event.get('thread_ts') not in (None, event.get('ts')):
+            reminders.cancel(event['channel'], event['thread_ts'])
+
         user_id = event['user']
         if not is_user_opted_in(user_id):
             return '', 200
         
-        # Check if button already posted for this message
-        if event['ts'] in posted_buttons:
-            return '', 200
-        
-        post_analyze_button(event['channel_id'], user_id, event['ts'])
-        # Mark as posted
-        posted_buttons.add(event['ts'])
-
-        # Detect urgent messages and schedule reminder
-        detected_tone = detect_tone(event['text'])
-        if detected_tone.get('urgency') == 'urgent':
-            timer = Timer(10, send_reminder_if_no_reply, args=(event['channel_id'], event['ts'], user_id))
-            timer.start()
-            pending_reminders[event['ts']] = timer
-
-        # Step 2: Cancel reminder if a reply is posted in the thread
-        if event.get('type') == 'message' and 'thread_ts' in event:
-            thread_ts = event.get('thread_ts')
-            if thread_ts in pending_reminders:
-                timer = pending_reminders.pop(thread_ts)
-                timer.cancel()
+        _send_later(post_analyze_button, event['channel'], user_id, event['ts'])
+
+        # Analyzed in the background: the result schedules a reminder if the message is
+        # urgent, and an "Analyze this message" click only has to render it
+        # Charged to the author's, channel's and team's budgets, and queued fairly between channels
+        team_id, channel_id, message_ts = payload.team_id, event['channel'], event['ts']
+        analysis = analyses.get_or_start(
+            (channel_id, message_ts),
+            lambda: submit_tone(event['text'], team_id, channel_id, user_id)
+        )
+        analysis.add_done_callback(lambda f: _schedule_if_urgent(f, channel_id, message_ts, user_id))
 
         return Response(), 200
 
+
+def _schedule_if_urgent(future, channel_id, message_ts, user_id):
+    if not future.cancelled() and isinstance(future.exception(), OverBudgetError):
+        return
+    if future.cancelled() or future.exception() is not None:
+        print(f"Error detecting tone: {'cancelled' if future.cancelled() else future.exception()}")
+        return
+    if future.result().urgency == AllowedUrgency.URGENT:
+        reminders.schedule(channel_id, message_ts, user_id, REMINDER_DELAY_SECONDS)
+
 @blp.route("/slack/interactions")
 class SlackInteractions(MethodView):
     """
@@ -107,36 +230,96 @@ class SlackInteractions(MethodView):
     def post(self):
         payload = InteractionPayload(request)
 
+        if payload.type == "message_action":
+            if payload.callback_id == "summarize_thread":
+                thread_ts = payload.message.get('thread_ts') or payload.message['ts']
+                if not _send_later(_summarize_thread, payload.channel['id'], thread_ts):
+                    _reply_busy(payload.response_url)
+            return Response(), 200
+
         button_action = payload.actions[0] # Only one actions for button clicks
 
         if button_action['action_id'].startswith("quick_reply_"):
-            send_simple_message(payload.channel['id'], button_action['value'])
-        elif button_action['action_id'] == "translate_to_greek":
-            translated_text = translate_to_greek_with_tone(button_action['value'])
-            # Send the translated message as an ephemeral message
-            send_simple_ephemeral_message(payload.channel['id'], payload.user['id'], f"🇬🇷 *Translation (tone preserved):*\n{translated_text}")
+            if not _send_later(send_simple_message, payload.channel['id'], button_action['value']):
+                _reply_busy(payload.response_url)
+        elif button_action['action_id'].startswith("translate_to_"):
+            # Buttons posted before other languages existed say translate_to_greek
+            language = language_code(button_action['action_id'][len("translate_to_"):]) or DEFAULT_LANGUAGE
+            if not _send_later(_deliver_translation, payload.channel['id'], payload.user['id'], button_action['value'], language):
+                _reply_busy(payload.response_url)
         elif button_action['action_id'] == "analyze_message":
-            pass
-            # # User clicked "Analyze this message"
-            # message_ts = value  # This is the ts of the message to analyze
+            # User clicked "Analyze this message"; the value is the ts of the message to analyze
+            channel_id, user_id, message_ts = payload.channel['id'], payload.user['id'], button_action['value']
+            team_id = (payload.team or {}).get('id')
+            try:
+                # Usually finished already, since the analysis started when the message arrived.
+                # Otherwise concurrent clicks share one computation.
+                analysis = analyses.get_or_start(
+                    (channel_id, message_ts),
+                    lambda: dispatcher.submit(_analyze_message, team_id, channel_id, user_id, message_ts)
+                )
+            except QueueFullError:
+                _reply_busy(payload.response_url)
+                return Response(), 200
+            analysis.add_done_callback(lambda f: _queue_analysis_delivery(f, channel_id, user_id))
 
-            # # Fetch the original message text
-            # history = client.conversations_history(
-            #     channel=channel_id, latest=message_ts, limit=1, inclusive=True
-            # )
-            # original_message = history["messages"][0]["text"]
+        return Response(), 200
 
-            # # Run your LLM analysis
-            # detected_tone = detect_tone(original_message)
 
-            # # Send ephemeral message with quick replies to the user who clicked
-            # send_ephemeral_tone_message(channel_id, user_id, detected_tone)
+def _deliver_translation(channel_id, user_id, text, language):
+    # Usually a cache hit, since the translation is made together with the tone
+    translated_text = translate(text, language)
+    send_simple_ephemeral_message(channel_id, user_id, f"{language_flag(language)} *Translation (tone preserved):*\n{translated_text}")
 
-        return Response(), 200
+
+def _analyze_message(team_id, channel_id, user_id, message_ts):
+    """
+    Runs on a dispatcher worker when a clicked message was not analyzed in advance,
+    e.g. after a restart or when its author was over budget. Charged to the user who clicked.
+    """
+    text = get_message_text(channel_id, message_ts)
+    if not text:
+        raise LookupError(f"Message {message_ts} not found in {channel_id}")
+    return submit_tone(text, team_id, channel_id, user_id).result()
 
 
-posted_buttons = set()
-pending_reminders = {}
+def _queue_analysis_delivery(future, channel_id, user_id):
+    # Runs on the request thread when the analysis had already finished, so every send is queued
+    if not future.cancelled() and isinstance(future.exception(), OverBudgetError):
+        _send_later(send_simple_ephemeral_message, channel_id, user_id, OVER_BUDGET_MESSAGE)
+        return
+    if future.cancelled() or future.exception() is not None:
+        print(f"Error analyzing message: {'cancelled' if future.cancelled() else future.exception()}")
+        _send_later(send_simple_ephemeral_message, channel_id, user_id, "Sorry, this message could not be analyzed.")
+        return
+    language = get_user_language(user_id) or DEFAULT_LANGUAGE
+    _send_later(send_ephemeral_tone_message, channel_id, user_id, future.result(), language)
+
+
+def _summarize_thread(channel_id, thread_ts):
+    """
+    Runs on a dispatcher worker: posts a placeholder in the thread and keeps
+    updating it while the summary is produced.
+    """
+    summary_ts = post_thread_message(channel_id, thread_ts, "_Summarizing this thread…_")
+    if summary_ts is None:
+        return
+    try:
+        summarize_thread_incremental(
+            channel_id,
+            thread_ts,
+            lambda oldest: iter_thread_replies(channel_id, thread_ts, oldest=oldest),
+            lambda text: update_message(channel_id, summary_ts, f"*Thread summary*\n{text}")
+        )
+    except Exception as e:
+        # Otherwise the placeholder would say "Summarizing…" forever
+        print(f"Error summarizing thread {thread_ts} in {channel_id}: {e}")
+        update_message(channel_id, summary_ts, "_Sorry, this thread could not be summarized. Please try again later._")
+
+
+def _ephemeral(text):
+    # Slash command replies go in the response body instead of a rate-limited chat.postEphemeral call
+    return {"response_type": "ephemeral", "text": text}, 200
 
 
 @blp.route("/optin")
@@ -145,8 +328,7 @@ class OptIn(MethodView):
     def post(self):
         payload = SlashPayload(request)
         set_user_opt_in(payload.user_id, True)
-        send_simple_ephemeral_message(payload.channel_id, payload.user_id, "You are now opted in the bot's features. Use /optout to disable them.")
-        return Response(), 200
+        return _ephemeral("You are now opted in the bot's features. Use /optout to disable them.")
 
 @blp.route("/optout")
 class OptOut(MethodView):
@@ -154,5 +336,22 @@ class OptOut(MethodView):
     def post(self):
         payload = SlashPayload(request)
         set_user_opt_in(payload.user_id, False)
-        send_simple_ephemeral_message(payload.channel_id, payload.user_id, "You are now opted out of the bot's features. Use /optin to enable them.")
-        return Response(), 200
+        return _ephemeral("You are now opted out of the bot's features. Use /optin to enable them.")
+
+@blp.route("/language")
+class Language(MethodView):
+    @blp.response(200)
+    def post(self):
+        payload = SlashPayload(request)
+        choice = (payload.text or "").strip()
+        supported = ", ".join(f"{code} ({name})" for code, (name, _) in LANGUAGES.items())
+        if choice.lower() == "off":
+            set_user_language(payload.user_id, None)
+            return _ephemeral("Translations are no longer prepared in advance. The translate button will offer Greek.")
+        code = language_code(choice)
+        if code is None:
+            current = get_user_language(payload.user_id)
+            status = f"Your language is {language_name(current)}." if current else "You have not set a language."
+            return _ephemeral(f"{status} Use /language <language> with one of: {supported}, or /language off.")
+        set_user_language(payload.user_id, code)
+        return _ephemeral(f"{language_flag(code)} Tone analyses will now include a translation to {language_name(code)}.")
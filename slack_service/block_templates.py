@@ -0,0 +1,130 @@
+"""
+block_templates.py
+Block Kit layouts precompiled into JSON text with slots.
+This module serializes each layout once, with placeholders where per-message
+values go, and compiles it into a render function that escapes those values
+and joins them with the fixed JSON text, instead of building and serializing
+nested dicts for every message.
+"""
+import json
+import re
+
+try:
+    from json.encoder import c_encode_basestring as _encode_string
+except ImportError:
+    from json.encoder import py_encode_basestring as _encode_string
+
+# \x1a and \x1b never occur in static Block Kit text; json.dumps writes them as \u001a and \u001b
+_SLOT = re.compile('"\x1a(\\w+)\x1a"|\x1a(\\w+)\x1a|"\x1b(\\w+)\x1b"')
+
+
+def slot(name):
+    """
+    Marks where text goes in a layout: as a whole string value, or inside one.
+    The text is escaped when rendered.
+    """
+    return f"\x1a{name}\x1a"
+
+
+def fragment(name):
+    """
+    Marks a value in a layout that is rendered JSON text, e.g. another
+    template's output, and is inserted as is.
+    """
+    return f"\x1b{name}\x1b"
+
+
+class BlockTemplate:
+    """
+    A layout serialized once. render(**values) fills its slots and returns JSON text.
+    """
+    __slots__ = ("render", "slots")
+
+    def __init__(self, layout):
+        compiled = json.dumps(layout, ensure_ascii=False, separators=(",", ":"))
+        compiled = compiled.replace("\\u001a", "\x1a").replace("\\u001b", "\x1b")
+        namespace = {"_encode_string": _encode_string}
+        pieces, slots, position = [], [], 0
+        for match in _SLOT.finditer(compiled):
+            namespace[f"_part{len(namespace)}"] = compiled[position:match.start()]
+            pieces.append(f"{{_part{len(namespace) - 1}}}")
+            whole, inner, raw = match.groups()
+            if whole:
+                pieces.append(f"{{_encode_string({whole})}}")
+            elif inner:
+                pieces.append(f"{{_encode_string(str({inner}))[1:-1]}}")
+            else:
+                pieces.append(f"{{{raw}}}")
+            slots.append(whole or inner or raw)
+            position = match.end()
+        namespace[f"_part{len(namespace)}"] = compiled[position:]
+        pieces.append(f"{{_part{len(namespace) - 1}}}")
+        self.slots = tuple(dict.fromkeys(slots))
+        # One f-string per layout, so rendering is a single string build
+        source = f"def render({', '.join(('*',) + self.slots)}):\n    return f\"{''.join(pieces)}\"\n"
+        exec(source, namespace)
+        self.render = namespace["render"]
+
+
+def join(fragments):
+    """
+    Renders a JSON array of already rendered fragments.
+    """
+    return "[" + ",".join(fragments) + "]"
+
+
+QUICK_REPLY_BUTTON = BlockTemplate({
+    "type": "button",
+    "text": {"type": "plain_text", "text": slot("reply")},
+    "value": slot("reply"),
+    "action_id": f"quick_reply_{slot('index')}"
+})
+
+TONE_BLOCKS = BlockTemplate([
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": (
+                f"{slot('emoji')} *Detected Tone:* {slot('tone')}\n"
+                f"*Original Message:* {slot('message')}\n"
+                f"*Why:* {slot('explanation')}\n"
+                f"*Urgency:* {slot('urgency')}\n"
+                f"*Confidence:* {slot('confidence')}%"
+            )
+        }
+    },
+    {"type": "divider"},
+    {"type": "section", "text": {"type": "mrkdwn", "text": slot("replies_heading")}},
+    {"type": "actions", "elements": fragment("buttons")}
+])
+
+ANALYZE_BUTTON_BLOCKS = BlockTemplate([
+    {
+        "type": "actions",
+        "elements": [
+            {
+                "type": "button",
+                "text": {"type": "plain_text", "text": "Analyze this message"},
+                "value": slot("message_ts"),
+                "action_id": "analyze_message"
+            }
+        ]
+    }
+])
+
+# Bodies of response_url messages
+MESSAGE_BODY = BlockTemplate({"text": slot("text"), "blocks": fragment("blocks"), "response_type": slot("response_type")})
+TEXT_MESSAGE_BODY = BlockTemplate({"text": slot("text"), "response_type": slot("response_type")})
+
+
+def translate_button_template(label, action_id):
+    """
+    The translate button of one language; only the message text changes between messages.
+    """
+    return BlockTemplate({
+        "type": "button",
+        "text": {"type": "plain_text", "text": label},
+        "value": slot("text"),
+        "action_id": action_id
+    })
@@ -0,0 +1,98 @@
+"""
+event_dedup.py
+Deduplication of Slack events.
+This module remembers recently seen event ids and message timestamps for a
+fixed window, so Slack retries and duplicate deliveries are dropped before any
+LLM or Slack API work is done.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics_service import metrics
+
+
+class EventDeduplicator:
+    """
+    Records keys for ttl seconds. Memory holds at most max_entries keys; the
+    optional SQLite file makes the check shared by all gunicorn workers.
+    """
+
+    def __init__(self, ttl=600, max_entries=50000, path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+
+        self._duplicates = metrics.counter("slack_events_duplicate_total", "Slack events dropped as duplicates or retries")
+
+    def _connection(self):
+        # Called with self._lock held
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS seen_events (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _evict(self, now):
+        # Keys are inserted in time order with the same ttl, so the oldest are always first
+        while self._seen:
+            key, expires_at = next(iter(self._seen.items()))
+            if expires_at > now and len(self._seen) <= self.max_entries:
+                break
+            self._seen.popitem(last=False)
+
+    def _claim_shared(self, key, now):
+        # Inserts the key, or revives it if it has expired; a live duplicate changes no row
+        claimed = self._connection().execute(
+            "INSERT INTO seen_events (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE seen_events.expires_at <= ?",
+            (key, now + self.ttl, now)
+        ).rowcount
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._connection().execute("DELETE FROM seen_events WHERE expires_at <= ?", (now,))
+        return bool(claimed)
+
+    def first_seen(self, *keys):
+        """
+        Records every key and returns True only if none of them was seen within the window.
+        None keys are ignored.
+        """
+        keys = [key for key in keys if key]
+        now = time.time()
+        new = True
+        with self._lock:
+            for key in keys:
+                expires_at = self._seen.get(key)
+                if expires_at is not None and expires_at > now:
+                    new = False
+                    continue
+                self._seen.pop(key, None)
+                self._seen[key] = now + self.ttl
+                if self.path:
+                    try:
+                        if not self._claim_shared(key, now):
+                            new = False
+                    except sqlite3.Error as e:
+                        print(f"Error checking shared event store: {e}")
+            self._evict(now)
+        if not new:
+            self._duplicates.inc()
+        return new
+
+
+event_dedup = EventDeduplicator(
+    ttl=int(os.getenv("EVENT_DEDUP_TTL", "600")),
+    max_entries=int(os.getenv("EVENT_DEDUP_MAX_ENTRIES", "50000")),
+    path=os.getenv("EVENT_DEDUP_DB") or None
+)
@@ -0,0 +1,192 @@
+"""
+message_history.py
+Recent channel messages kept in memory.
+This module keeps a small ring buffer of the latest messages per channel, filled
+from the Events API stream, so the latest message can be found without calling
+conversations.history. A channel's buffer is trusted only while its events have no gap.
+The buffers live in one process, so they are only used when a single worker
+receives every event; with more workers each one would see only some events.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metrics_service import metrics
+
+
+class MessageRecord:
+    """
+    The fields of a Slack message that tone analysis needs.
+    """
+    __slots__ = ("ts", "user", "text", "subtype", "epoch")
+
+    def __init__(self, ts, user, text, subtype, epoch):
+        self.ts = ts
+        self.user = user
+        self.text = text
+        self.subtype = subtype
+        self.epoch = epoch
+
+
+class _ChannelBuffer:
+    __slots__ = ("records", "epoch", "synced_epoch", "last_seen")
+
+    def __init__(self, capacity):
+        # Oldest first, so the newest messages are at the right end
+        self.records = deque(maxlen=capacity)
+        self.epoch = 0
+        self.synced_epoch = None
+        self.last_seen = None
+
+
+class MessageHistory:
+    """
+    Holds the last capacity messages of up to max_channels channels.
+
+    Messages arrive from events and from conversations.history pages. Every
+    silence in a channel longer than gap_seconds, since its last event or fetch,
+    starts a new epoch of that channel: messages recorded or fetched before it
+    are not trusted to be the latest, because events may have been lost in between.
+    Other channels are not affected. When enabled is False nothing is recorded
+    and every lookup goes to the API.
+    """
+
+    def __init__(self, capacity=20, max_channels=1000, gap_seconds=600, enabled=True):
+        self.capacity = capacity
+        self.max_channels = max_channels
+        self.gap_seconds = gap_seconds
+        self.enabled = enabled
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = metrics.counter("message_history_hits_total", "Latest-message lookups answered from memory")
+        self._misses = metrics.counter("message_history_misses_total", "Latest-message lookups that needed conversations.history")
+
+    def _buffer(self, channel):
+        # Called with self._lock held
+        buffer = self._channels.get(channel)
+        if buffer is None:
+            buffer = self._channels[channel] = _ChannelBuffer(self.capacity)
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(channel)
+        return buffer
+
+    def _check_gap(self, buffer, now):
+        # Called with self._lock held
+        if buffer.last_seen is not None and now - buffer.last_seen > self.gap_seconds:
+            buffer.epoch += 1
+            buffer.last_seen = None
+
+    def _insert(self, buffer, record):
+        # Called with self._lock held. Events usually arrive in order; retries may not.
+        records = buffer.records
+        if not records or records[-1].ts < record.ts:
+            records.append(record)
+            return
+        ordered = list(records)
+        i = bisect.bisect_left([r.ts for r in ordered], record.ts)
+        if i < len(ordered) and ordered[i].ts == record.ts:
+            ordered[i] = record
+        else:
+            ordered.insert(i, record)
+        buffer.records = deque(ordered[-self.capacity:], maxlen=self.capacity)
+
+    def record_event(self, event):
+        """
+        Applies a message event: new messages are added, edits and deletions are applied.
+        Thread replies are ignored, like conversations.history does.
+        """
+        now = time.monotonic()
+        channel = event.get('channel')
+        subtype = event.get('subtype')
+        if not self.enabled or not channel:
+            return
+        with self._lock:
+            buffer = self._buffer(channel)
+            self._check_gap(buffer, now)
+            buffer.last_seen = now
+            if subtype == 'message_changed':
+                message = event.get('message', {})
+                for record in buffer.records:
+                    if record.ts == message.get('ts'):
+                        record.text = message.get('text', '')
+                return
+            if subtype == 'message_deleted':
+                deleted = [r for r in buffer.records if r.ts != event.get('deleted_ts')]
+                buffer.records = deque(deleted, maxlen=self.capacity)
+                return
+            if event.get('thread_ts', event.get('ts')) != event.get('ts') and subtype != 'thread_broadcast':
+                return
+            if event.get('ts'):
+                self._insert(buffer, MessageRecord(event['ts'], event.get('user'), event.get('text', ''), subtype, buffer.epoch))
+
+    def fill(self, channel, messages):
+        """
+        Merges a conversations.history page, newest messages included, and marks the channel synced.
+        """
+        now = time.monotonic()
+        if not self.enabled:
+            return
+        with self._lock:
+            buffer = self._buffer(channel)
+            self._check_gap(buffer, now)
+            buffer.last_seen = now
+            for message in messages:
+                if message.get('ts'):
+                    self._insert(buffer, MessageRecord(
+                        message['ts'], message.get('user'), message.get('text', ''), message.get('subtype'), buffer.epoch
+                    ))
+            buffer.synced_epoch = buffer.epoch
+
+    def text_of(self, channel, ts):
+        """
+        Returns the text of the message at ts if it is held, otherwise None.
+        """
+        with self._lock:
+            buffer = self._channels.get(channel)
+            if buffer is not None:
+                for record in buffer.records:
+                    if record.ts == ts:
+                        return record.text
+        return None
+
+    def latest_from_other(self, channel, user_id):
+        """
+        Looks up the latest message in channel from a user other than user_id.
+
+        Returns:
+            tuple: (True, text or None) when memory can answer, (False, None) when
+            conversations.history has to be asked.
+        """
+        with self._lock:
+            buffer = self._channels.get(channel)
+            if buffer is not None:
+                self._check_gap(buffer, time.monotonic())
+                synced = buffer.synced_epoch == buffer.epoch
+                for record in reversed(buffer.records):
+                    if record.user and record.user != user_id and record.subtype is None:
+                        # Anything newer than a message seen in this epoch would have arrived as an event
+                        if synced or record.epoch == buffer.epoch:
+                            self._hits.inc()
+                            return True, record.text
+                        break
+                else:
+                    if synced:
+                        self._hits.inc()
+                        return True, None
+        self._misses.inc()
+        return False, None
+
+
+# Each gunicorn worker receives only some of the events, so with more than one
+# worker (WEB_CONCURRENCY, as gunicorn reads it) no worker can trust its buffers
+message_history = MessageHistory(
+    capacity=int(os.getenv("MESSAGE_HISTORY_SIZE", "20")),
+    max_channels=int(os.getenv("MESSAGE_HISTORY_MAX_CHANNELS", "1000")),
+    gap_seconds=int(os.getenv("MESSAGE_HISTORY_GAP_SECONDS", "600")),
+    enabled=os.getenv("MESSAGE_HISTORY_ENABLED", "1" if int(os.getenv("WEB_CONCURRENCY", "1")) <= 1 else "0") == "1"
+)
@@ -1,70 +1,196 @@
 """
 This module defines classes to represent payloads from Slack events and slash commands.
+Each payload checks the request's Slack signature before anything in the body is
+decoded, and decodes the body only when an attribute is first read.
 """
 
+import hmac
 import json
+import os
+import time
+from urllib.parse import parse_qsl
 
+from dotenv import load_dotenv
+from flask_smorest import abort
 
-class SlashPayload:
+from metrics_service import metrics
+from metrics_service.tracing import stage
+
+load_dotenv()
+
+# Every request must carry a valid signature made with the app's signing secret
+SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
+_secret = SIGNING_SECRET.encode() if SIGNING_SECRET else None
+# For local development only: accepts unsigned requests while no signing secret is set
+ALLOW_UNSIGNED = os.getenv("SLACK_ALLOW_UNSIGNED", "0") == "1"
+# Slack's replay window: older timestamps are rejected
+MAX_REQUEST_AGE = int(os.getenv("SLACK_REQUEST_MAX_AGE", "300"))
+# json, orjson or msgspec; by default the fastest one installed
+JSON_DECODER = os.getenv("SLACK_JSON_DECODER")
+
+_rejected = metrics.counter("slack_signature_rejections_total", "Requests rejected for a missing, stale or wrong Slack signature")
+
+
+def _json_decoder(name):
+    """
+    Returns the loads function of the named decoder, or of the fastest installed
+    one, and the exception it raises for malformed input.
+    """
+    if name in (None, "orjson"):
+        try:
+            import orjson
+            return orjson.loads, orjson.JSONDecodeError
+        except ImportError:
+            if name:
+                raise
+    if name in (None, "msgspec"):
+        try:
+            import msgspec
+            return msgspec.json.decode, msgspec.DecodeError
+        except ImportError:
+            if name:
+                raise
+    return json.loads, ValueError
+
+
+loads, DecodeError = _json_decoder(JSON_DECODER)
+
+if _secret is None:
+    if ALLOW_UNSIGNED:
+        print("Warning: SLACK_SIGNING_SECRET is not set and SLACK_ALLOW_UNSIGNED=1; Slack requests are not verified")
+    else:
+        print("Warning: SLACK_SIGNING_SECRET is not set; every Slack request will be rejected. "
+              "Set SLACK_ALLOW_UNSIGNED=1 to accept unsigned requests in local development")
+
+
+def verify_signature(secret, body, timestamp, signature, now=None):
+    """
+    Checks a Slack request signature over the raw body bytes, see
+    https://api.slack.com/authentication/verifying-requests-from-slack.
+    A missing or stale timestamp is rejected before anything is hashed.
+    """
+    if not timestamp or not signature or not timestamp.isdigit():
+        return False
+    if abs((now or time.time()) - int(timestamp)) > MAX_REQUEST_AGE:
+        return False
+    expected = "v0=" + hmac.digest(secret, b"v0:" + timestamp.encode() + b":" + body, "sha256").hex()
+    return hmac.compare_digest(expected, signature)
+
+
+class _Payload:
+    """
+    Holds a verified request's raw body and decodes it on first attribute access.
+    Subclasses list the body keys they expose in _FIELDS and implement _decode.
+    """
+    __slots__ = ("_request", "_body", "_data")
+    _FIELDS = ()
+    _STAGE = None
+
+    def __init__(self, request):
+        self._request = request
+        self._body = request.get_data(cache=True)
+        self._data = None
+        if _secret is None:
+            if not ALLOW_UNSIGNED:
+                _rejected.inc()
+                abort(401, message="Slack signing secret is not configured")
+        else:
+            with stage("signature_check"):
+                headers = request.headers
+                valid = verify_signature(
+                    _secret,
+                    self._body,
+                    headers.get("X-Slack-Request-Timestamp"),
+                    headers.get("X-Slack-Signature")
+                )
+            if not valid:
+                _rejected.inc()
+                abort(401, message="Invalid Slack signature")
+
+    def _fields(self):
+        data = self._data
+        if data is None:
+            with stage(self._STAGE):
+                try:
+                    data = self._decode(self._body)
+                except (ValueError, KeyError, UnicodeDecodeError, DecodeError):
+                    abort(400, message="Malformed Slack payload")
+                # A body that decodes to a JSON array, string or null has no fields
+                if not isinstance(data, dict):
+                    abort(400, message="Malformed Slack payload")
+                self._data = data
+        return data
+
+    def _decode(self, body):
+        raise NotImplementedError
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for field in cls._FIELDS:
+            setattr(cls, field, property(lambda self, key=field: self._fields().get(key)))
+
+
+def _form(body):
+    return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
+
+class SlashPayload(_Payload):
     """
     Represents a Slack event payload.
     This class is used to encapsulate the data received from Slack events.
     """
+    __slots__ = ()
+    _STAGE = "slash_payload_parse"
+    _FIELDS = (
+        "token", "team_id", "team_domain", "channel_id", "channel_name", "user_id",
+        "user_name", "command", "text", "response_url", "trigger_id"
+    )
 
-    def __init__(self, request):
-        form = request.form
-        self.token = form.get('token')
-        self.team_id = form.get('team_id')
-        self.team_domain = form.get('team_domain')
-        self.channel_id = form.get('channel_id')
-        self.channel_name = form.get('channel_name')
-        self.user_id = form.get('user_id')
-        self.user_name = form.get('user_name')
-        self.command = form.get('command')
-        self.text = form.get('text')
-        self.response_url = form.get('response_url')
-        self.trigger_id = form.get('trigger_id')
-
-class EventPayload:
+    def _decode(self, body):
+        return _form(body)
+
+
+class EventPayload(_Payload):
     """
     Represents a Slack event payload.
     This class is used to encapsulate the data received from Slack events.
     """
+    __slots__ = ()
+    _STAGE = "event_payload_parse"
+    _FIELDS = (
+        "token", "team_id", "context_team_id", "context_enterprise_id", "api_app_id", "event", "type",
+        "event_id", "event_time", "authorizations", "is_ext_shared_channel", "event_context", "challenge"
+    )
 
-    def __init__(self, request):
-        json_data = request.get_json()
-        self.token = json_data.get('token')
-        self.team_id = json_data.get('team_id')
-        self.context_team_id = json_data.get('context_team_id')
-        self.context_enterprise_id = json_data.get('context_enterprise_id')
-        self.api_app_id = json_data.get('api_app_id')
-        self.event = json_data.get('event')
-        self.type = json_data.get('type')
-        self.event_id = json_data.get('event_id')
-        self.event_time = json_data.get('event_time')
-        self.authorizations = json_data.get('authorizations')
-        self.is_ext_shared_channel = json_data.get('is_ext_shared_channel')
-        self.event_context = json_data.get('event_context')
-        self.challenge = json_data.get('challenge')
-
-
-class InteractionPayload:
+    def _decode(self, body):
+        return loads(body)
+
+    # Set by Slack when it re-delivers an event it considers unacknowledged
+    @property
+    def retry_num(self):
+        return self._request.headers.get('X-Slack-Retry-Num')
+
+    @property
+    def retry_reason(self):
+        return self._request.headers.get('X-Slack-Retry-Reason')
+
+
+class InteractionPayload(_Payload):
     """
     Represents a Slack interaction payload.
     This class is used to encapsulate the data received from Slack interactions.
     """
+    __slots__ = ()
+    _STAGE = "interaction_payload_parse"
+    # callback_id and message are set for message shortcuts (type "message_action")
+    _FIELDS = (
+        "type", "token", "action_ts", "response_url", "user", "team", "container",
+        "trigger_id", "channel", "callback_id", "message"
+    )
 
-    def __init__(self, request):
-        json_data = json.loads(request.form['payload'])
-        self.type = json_data.get('type')
-        self.token = json_data.get('token')
-        self.action_ts = json_data.get('action_ts')
-        self.response_url = json_data.get('response_url')
-        self.user = json_data.get('user')
-        self.team = json_data.get('team')
-        self.container = json_data.get('container')
-        self.trigger_id = json_data.get('trigger_id')
-        self.actions = json_data.get('actions', [])
-        self.channel = json_data.get('channel')
-
+    def _decode(self, body):
+        return loads(_form(body)["payload"])
 
+    @property
+    def actions(self):
+        return self._fields().get('actions', [])
@@ -2,19 +2,43 @@
     Functions related to Slack interactions.
     This module provides functions to extract text from Slack events and send ephemeral messages.
 """
+import json
 import os
-from flask import json
-from slack_sdk import WebClient
+from functools import lru_cache
 from slack_sdk.errors import SlackApiError
 
 from dotenv import load_dotenv
 
 from llm_service.llm_functions import ToneDetectionResponse
+from llm_service.translation import DEFAULT_LANGUAGE, language_flag, language_name
+from metrics_service.tracing import stage
+from slack_service.block_templates import (
+    ANALYZE_BUTTON_BLOCKS,
+    MESSAGE_BODY,
+    QUICK_REPLY_BUTTON,
+    TEXT_MESSAGE_BODY,
+    TONE_BLOCKS,
+    join,
+    translate_button_template
+)
+from slack_service.message_history import message_history
+from slack_service.slack_transport import PooledWebClient
+from slack_service.user_directory import UserDirectory
+from slack_service.user_prefs import UserPrefsStore
 
 load_dotenv()
 
 slack_token = os.getenv("SLACK_BOT_TOKEN")
-client = WebClient(token=slack_token)
+client = PooledWebClient(
+    token=slack_token,
+    # SLACK_API_URL points the client at a stand-in server, e.g. in load tests
+    base_url=os.getenv("SLACK_API_URL", "https://slack.com/api/"),
+    pool_size=int(os.getenv("SLACK_POOL_SIZE", "16")),
+    max_retries=int(os.getenv("SLACK_MAX_RETRIES", "3"))
+)
+
+# Delay before an unanswered urgent message gets a reminder
+REMINDER_DELAY_SECONDS = float(os.getenv("REMINDER_DELAY_SECONDS", "10"))
 
 TONE_EMOJIS = {
             "positive": "😊",
@@ -27,30 +51,27 @@ TONE_EMOJIS = {
             "excited": "🤩"
         }
 
-def _get_slack_users():
-    """
-    Fetches the list of users in the Slack workspace.
-    Returns a list of user IDs and names.
-    """
-    try:
-        response = client.users_list()
-        users = response['members']
-        return [(user['id'], user['name']) for user in users if not user['is_bot']]
-    except SlackApiError as e:
-        print(f"Error fetching users: {e.response['error']}")
-        return []
-
-SLACK_USERS = _get_slack_users()
+# Loaded on first lookup instead of at import, so worker start-up makes no API call
+user_directory = UserDirectory(
+    client,
+    snapshot_path=os.getenv("SLACK_USERS_SNAPSHOT", "slack_users.json"),
+    max_age=int(os.getenv("SLACK_USERS_SNAPSHOT_MAX_AGE", str(24 * 3600)))
+)
 
 def get_latest_message_block(channel_id, user_id):
     """
     Extracts the latest message sent from another user in the specified channel.
     Returns the message text and its ts, or None if not found.
+    Answered from the event-fed message history when possible.
     """
+    found, text = message_history.latest_from_other(channel_id, user_id)
+    if found:
+        return text
     try:
         # Fetch the latest messages from the channel
-        response = client.conversations_history(channel=channel_id, limit=20)
+        response = client.conversations_history(channel=channel_id, limit=message_history.capacity)
         messages = response.get('messages', [])
+        message_history.fill(channel_id, messages)
         messages.sort(key=lambda x: x['ts'], reverse=True)
 
         # Find the latest message not sent by the bot/user
@@ -62,84 +83,111 @@ def get_latest_message_block(channel_id, user_id):
         print(f"Error fetching messages: {e.response['error']}")
         return None
 
+def get_message_text(channel_id, message_ts):
+    """
+    Returns the text of the channel message at message_ts, or None if not found.
+    """
+    text = message_history.text_of(channel_id, message_ts)
+    if text is not None:
+        return text
+    try:
+        response = client.conversations_history(channel=channel_id, latest=message_ts, limit=1, inclusive=True)
+        messages = response.get('messages', [])
+        if messages and messages[0].get('ts') == message_ts:
+            return messages[0].get('text', '')
+        return None
+    except SlackApiError as e:
+        print(f"Error fetching message: {e.response['error']}")
+        return None
+
+def iter_thread_replies(channel_id, thread_ts, oldest=None, page_size=200):
+    """
+    Yields the messages of a thread, parent first, fetching one page at a time.
+    With oldest set, only replies after that ts are fetched; Slack still includes the parent.
+    """
+    kwargs = {"oldest": oldest} if oldest else {}
+    try:
+        # Iterating a SlackResponse follows response_metadata.next_cursor page by page
+        for page in client.conversations_replies(channel=channel_id, ts=thread_ts, limit=page_size, **kwargs):
+            yield from page.get('messages', [])
+    except SlackApiError as e:
+        print(f"Error fetching thread replies: {e.response['error']}")
+
+def post_thread_message(channel_id, thread_ts, text):
+    """
+    Posts a message in a thread. Returns the new message's ts, or None on failure.
+    """
+    try:
+        response = client.chat_postMessage(channel=channel_id, thread_ts=thread_ts, text=text)
+        return response['ts']
+    except SlackApiError as e:
+        print(f"Error posting thread message: {e.response['error']}")
+        return None
+
+def update_message(channel_id, ts, text):
+    """
+    Replaces the text of a message the bot posted earlier.
+    """
+    try:
+        return client.chat_update(channel=channel_id, ts=ts, text=text)
+    except SlackApiError as e:
+        print(f"Error updating message: {e.response['error']}")
+        return None
+
 def quick_replies_button(quick_replies):
     """
-    Generates a list of button elements for quick replies.
+    Renders the button elements for quick replies.
     Each reply should be a string and not exceed 75 characters.
     """
-    reply_buttons = []
-    for i, reply in enumerate(quick_replies):
-        if isinstance(reply, str) and reply.strip() and len(reply) <= 75:
-            reply_buttons.append({
-                "type": "button",
-                "text": {"type": "plain_text", "text": reply},
-                "value": reply,
-                "action_id": f"quick_reply_{i}"
-            })
-    return reply_buttons
-
-def translate_button(text):
-    return [{
-        "type": "button",
-        "text": {
-            "type": "plain_text", 
-            "text": "🇬🇷 Translate to Greek"
-        },
-        "value": text,
-        "action_id": "translate_to_greek"
-    }]
-
-def send_ephemeral_tone_message(channel_id, user_id, tone_response: ToneDetectionResponse):
+    return [
+        QUICK_REPLY_BUTTON.render(reply=reply, index=i)
+        for i, reply in enumerate(quick_replies)
+        if isinstance(reply, str) and reply.strip() and len(reply) <= 75
+    ]
+
+def translate_button(text, language=DEFAULT_LANGUAGE):
+    return [_translate_button_template(language).render(text=text)]
+
+@lru_cache(maxsize=None)
+def _translate_button_template(language):
+    return translate_button_template(f"{language_flag(language)} Translate to {language_name(language)}", f"translate_to_{language}")
+
+def build_tone_blocks(tone_response: ToneDetectionResponse, language=DEFAULT_LANGUAGE):
+    """
+    Renders the Block Kit blocks that present a detected tone and its quick replies,
+    as JSON text. A response_url body takes the text as is; Web API calls send it
+    as the value of their blocks field, which the SDK escapes as one JSON string
+    instead of serializing nested dicts.
+    """
+    with stage("build_blocks"):
+        return _build_tone_blocks(tone_response, language)
+
+def _build_tone_blocks(tone_response, language):
+    tone = tone_response.tone.value.lower()
+    button_elements = quick_replies_button(tone_response.quick_replies)
+    button_elements += translate_button(tone_response.original_message, language)
+    return TONE_BLOCKS.render(
+        emoji=TONE_EMOJIS.get(tone, "😖"),
+        tone=tone.capitalize(),
+        message=tone_response.original_message,
+        explanation=tone_response.explanation,
+        urgency=tone_response.urgency.value.capitalize(),
+        confidence=tone_response.confidence,
+        replies_heading="*Quick Replies:*" if button_elements else "_No quick replies available._",
+        buttons=join(button_elements)
+    )
+
+
+def send_ephemeral_tone_message(channel_id, user_id, tone_response: ToneDetectionResponse, language=DEFAULT_LANGUAGE):
     """
     Sends an ephemeral message to a user in a Slack channel with the detected tone.
     """
     try:
-        tone = tone_response.tone.value.lower()
-        emoji = TONE_EMOJIS.get(tone, "😖")
-
-        # Tone section
-        tone_block = {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": (
-                        f"{emoji} *Detected Tone:* {tone.capitalize()}\n"
-                        f"*Original Message:* {tone_response.original_message}\n"
-                        f"*Why:* {tone_response.explanation}\n"
-                        f"*Urgency:* {tone_response.urgency.value.capitalize()}\n"
-                        f"*Confidence:* {tone_response.confidence}%"
-                    )
-                }
-            }
-        
-        # Prepare quick reply buttons
-        button_elements = []
-        button_elements += quick_replies_button(tone_response.quick_replies)
-        button_elements += translate_button(tone_response.original_message)
-
-        reply_section = {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": "*Quick Replies:*" if button_elements else "_No quick replies available._"
-                }
-            }
-        button_section ={
-                "type": "actions",
-                "elements": button_elements
-            }         
-
-        blocks = [
-            tone_block,
-            {"type": "divider"},
-            reply_section,
-            button_section
-        ]
-
+        # Slack accepts blocks given as a JSON-encoded string, so the rendered text is sent as one
         response = client.chat_postEphemeral(
             channel=channel_id,
             user=user_id,
-            blocks=blocks,
+            blocks=build_tone_blocks(tone_response, language),
             text="Detected tone and quick replies"
         )
         return response
@@ -148,50 +196,73 @@ def send_ephemeral_tone_message(channel_id, user_id, tone_response: ToneDetectio
         return None
 
 
+def send_response_url_tone_message(response_url, tone_response: ToneDetectionResponse, language=DEFAULT_LANGUAGE):
+    """
+    Delivers the detected tone through a slash command's response_url as an ephemeral reply.
+    Returns True when Slack accepted the message.
+    """
+    return send_response_url_message(
+        response_url,
+        text="Detected tone and quick replies",
+        blocks=build_tone_blocks(tone_response, language)
+    )
+
+
+def send_response_url_message(response_url, text, blocks=None):
+    """
+    Sends an ephemeral reply through a slash command's response_url.
+    Returns True when Slack accepted the message.
+    """
+    if blocks is None:
+        body = TEXT_MESSAGE_BODY.render(text=text, response_type="ephemeral")
+    else:
+        # Rendered blocks are spliced into the body without being parsed again
+        body = MESSAGE_BODY.render(
+            text=text, blocks=blocks if isinstance(blocks, str) else json.dumps(blocks), response_type="ephemeral"
+        )
+    try:
+        with stage("slack_call") as span:
+            span.set("method", "response_url")
+            response = client.post_json(response_url, body)
+    except Exception as e:
+        print(f"Error sending response_url message: {e}")
+        return False
+    if response.status_code != 200:
+        print(f"Error sending response_url message: {response.status_code} {response.text}")
+        return False
+    return True
+
+
 def post_analyze_button(channel_id, user_id, message_ts):
-    blocks = [
-        {
-            "type": "actions",
-            "elements": [
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": "Analyze this message"},
-                    "value": message_ts,
-                    "action_id": "analyze_message"
-                }
-            ]
-        }
-    ]
     client.chat_postMessage(
         channel=channel_id,
         user=user_id,
         thread_ts=message_ts,  # So it appears as a reply
-        blocks=blocks,
+        blocks=ANALYZE_BUTTON_BLOCKS.render(message_ts=message_ts),
         text="Analyze this message"
     )
 
     
 
-PREFS_FILE = "user_prefs.json"
-
-def load_user_prefs():
-    if os.path.exists(PREFS_FILE):
-        with open(PREFS_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_user_prefs(prefs):
-    with open(PREFS_FILE, "w") as f:
-        json.dump(prefs, f)
+user_prefs = UserPrefsStore(
+    os.getenv("USER_PREFS_DB", "user_prefs.db"),
+    legacy_json_path="user_prefs.json",
+    refresh_interval=float(os.getenv("USER_PREFS_REFRESH_SECONDS", "2"))
+)
 
 def is_user_opted_in(user_id):
-    prefs = load_user_prefs()
-    return prefs.get(user_id, False)
+    with stage("prefs_lookup"):
+        return user_prefs.is_opted_in(user_id)
 
 def set_user_opt_in(user_id, opt_in: bool):
-    prefs = load_user_prefs()
-    prefs[user_id] = opt_in
-    save_user_prefs(prefs)
+    user_prefs.set_opt_in(user_id, opt_in)
+
+def get_user_language(user_id):
+    with stage("prefs_lookup"):
+        return user_prefs.language(user_id)
+
+def set_user_language(user_id, language):
+    user_prefs.set_language(user_id, language)
 
 def send_simple_ephemeral_message(channel_id, user_id, text):
     """
@@ -222,9 +293,22 @@ def send_simple_message(channel_id, text):
         print(f"Error sending message: {e.response['error']}")
         return None
     
+def describe_duration(seconds):
+    """
+    Describes a delay in words, e.g. "10 seconds", "1 minute" or "2 hours".
+    """
+    for unit, size in (("hour", 3600), ("minute", 60)):
+        if seconds >= size and seconds % size == 0:
+            count = int(seconds // size)
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    count = int(seconds) if float(seconds).is_integer() else seconds
+    return f"{count} second{'s' if count != 1 else ''}"
+
+
 def send_reminder_if_no_reply(channel_id, message_ts, user_id):
     # Optionally, check again for replies here if using a DB
     client.chat_postEphemeral(
         channel=channel_id,
         user=user_id,
-        text=f"<@{user_id}>, this urgent message has not been replied to in the last 10 seconds. Please follow up!"    )
+        text=f"<@{user_id}>, this urgent message has not been replied to in the last {describe_duration(REMINDER_DELAY_SECONDS)}. Please follow up!"
+    )
@@ -0,0 +1,281 @@
+"""
+slack_transport.py
+HTTP transport for Slack Web API calls.
+This module provides a WebClient that reuses keep-alive connections, spaces
+calls to stay inside Slack's per-method rate-limit tiers and per-channel
+posting limit, retries with jittered backoff, and records per-method metrics.
+"""
+import http.client
+import inspect
+import io
+import os
+import ssl
+import threading
+import time
+from urllib.error import HTTPError
+
+import requests
+from requests.adapters import HTTPAdapter
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackRequestError
+from slack_sdk.http_retry.builtin_handlers import (
+    ConnectionErrorRetryHandler,
+    RateLimitErrorRetryHandler,
+    ServerErrorRetryHandler
+)
+from slack_sdk.http_retry.builtin_interval_calculators import BackoffRetryIntervalCalculator
+from slack_sdk.http_retry.jitter import RandomJitter
+from slack_sdk.version import __version__ as slack_sdk_version
+
+from metrics_service import metrics
+from metrics_service.tracing import stage
+from worker_service.token_bucket import TokenBucket
+
+# Requests per minute for each rate-limit tier, see https://api.slack.com/apis/rate-limits
+TIER_1, TIER_2, TIER_3, TIER_4 = 1, 20, 50, 100
+
+METHOD_TIERS = {
+    # Special tier: limited per channel below, and to several hundred a minute per workspace
+    "chat.postMessage": 300,
+    "chat.postEphemeral": TIER_4,
+    "chat.update": TIER_3,
+    "conversations.history": TIER_3,
+    "conversations.replies": TIER_3,
+    "users.list": TIER_2,
+}
+# chat.postMessage has a special limit of about one message per second per channel
+PER_CHANNEL_METHODS = {"chat.postMessage": 1.0}
+# Used for methods missing from METHOD_TIERS
+DEFAULT_TIER = TIER_3
+
+MAX_RATE_LIMIT_WAIT = float(os.getenv("SLACK_RATE_LIMIT_MAX_WAIT", "10"))
+# Buckets live in each process, so every gunicorn worker gets an equal share of
+# Slack's limits; gunicorn reads its worker count from WEB_CONCURRENCY too
+RATE_LIMIT_WORKERS = max(1, int(os.getenv("SLACK_RATE_LIMIT_WORKERS", os.getenv("WEB_CONCURRENCY", "1"))))
+
+# PooledWebClient replaces this private SDK method, see requirements.txt for the tested slack_sdk version
+SDK_TRANSPORT_METHOD = "_perform_urllib_http_request_internal"
+
+
+def check_sdk_transport():
+    """
+    Raises ImportError when the installed slack_sdk no longer sends each attempt
+    through the method PooledWebClient overrides, instead of silently bypassing
+    the pool, the rate limiter and the metrics.
+    """
+    method = getattr(WebClient, SDK_TRANSPORT_METHOD, None)
+    if method is None or list(inspect.signature(method).parameters) != ["self", "url", "req"]:
+        raise ImportError(
+            f"slack_sdk {slack_sdk_version} has no {SDK_TRANSPORT_METHOD}(url, req); "
+            "PooledWebClient needs the slack_sdk version pinned in requirements.txt"
+        )
+
+
+check_sdk_transport()
+
+
+def _metric_name(method):
+    return "slack_" + method.replace(".", "_")
+
+
+class _MethodStats:
+    def __init__(self, method):
+        prefix = _metric_name(method)
+        self.latency = metrics.histogram(f"{prefix}_latency_seconds", f"Latency of {method} attempts")
+        self.throttle_wait = metrics.histogram(f"{prefix}_throttle_wait_seconds", f"Time {method} calls waited for the rate limiter")
+        self.rate_limited = metrics.counter(f"{prefix}_rate_limited_total", f"429 responses from {method}")
+        self.errors = metrics.counter(f"{prefix}_errors_total", f"Failed {method} attempts")
+
+
+class _PausingRateLimitRetryHandler(RateLimitErrorRetryHandler):
+    """
+    Retries after Retry-After like the SDK's handler, and first pauses the method's
+    bucket so other threads stop calling it for the same period.
+    """
+
+    def __init__(self, transport, max_retry_count):
+        super().__init__(max_retry_count=max_retry_count)
+        self.transport = transport
+
+    def prepare_for_next_attempt(self, *, state, request, response=None, error=None):
+        if response is not None:
+            method = request.url.rsplit("/", 1)[-1]
+            retry_after = 1.0
+            for name, values in response.headers.items():
+                if name.lower() == "retry-after":
+                    retry_after = float(values[0] if isinstance(values, list) else values)
+            self.transport.method_bucket(method).pause(retry_after)
+            self.transport.stats(method).rate_limited.inc()
+        super().prepare_for_next_attempt(state=state, request=request, response=response, error=error)
+
+
+class _SSLContextAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter that opens HTTPS connections, direct or through a proxy, with the given SSLContext.
+    """
+
+    def __init__(self, ssl_context, **kwargs):
+        # Set first, because HTTPAdapter.__init__ creates the pool manager
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs["ssl_context"] = self.ssl_context
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+class PooledWebClient(WebClient):
+    """
+    A WebClient that sends requests through a pooled requests.Session and is rate-limited per method and channel.
+    The client's proxy and ssl settings apply to the pooled session as they do to the SDK's urllib calls.
+    """
+
+    def __init__(self, token=None, pool_size=16, max_retries=3, timeout=30, **kwargs):
+        backoff = BackoffRetryIntervalCalculator(backoff_factor=0.5, jitter=RandomJitter())
+        retry_handlers = [
+            _PausingRateLimitRetryHandler(self, max_retry_count=max_retries),
+            ConnectionErrorRetryHandler(
+                max_retry_count=max_retries,
+                interval_calculator=backoff,
+                error_types=[requests.ConnectionError, requests.Timeout, ConnectionResetError]
+            ),
+            ServerErrorRetryHandler(max_retry_count=max_retries, interval_calculator=backoff),
+        ]
+        super().__init__(token=token, timeout=timeout, retry_handlers=retry_handlers, **kwargs)
+        self.pool_size = pool_size
+        self._http = None
+        self._proxies = None
+        self._session_pid = None
+        self._buckets = {}
+        self._channel_buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _session(self):
+        # One session per process, so every thread draws from the same keep-alive pool
+        if self._session_pid != os.getpid():
+            with self._lock:
+                if self._session_pid != os.getpid():
+                    if self.proxy is not None and not isinstance(self.proxy, str):
+                        raise SlackRequestError(f"Invalid proxy detected: {self.proxy} must be a str value")
+                    session = requests.Session()
+                    if self.ssl is not None:
+                        adapter = _SSLContextAdapter(self.ssl, pool_connections=4, pool_maxsize=self.pool_size)
+                        session.verify = self.ssl.verify_mode != ssl.CERT_NONE
+                    else:
+                        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    # Passed with each request, since requests lets proxy environment variables override session.proxies.
+                    # The SDK already falls back to HTTPS_PROXY and HTTP_PROXY when no proxy is given
+                    self._proxies = {"http": self.proxy, "https": self.proxy} if self.proxy else None
+                    self._http = session
+                    self._session_pid = os.getpid()
+        return self._http
+
+    def stats(self, method):
+        stats = self._stats.get(method)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(method, _MethodStats(method))
+        return stats
+
+    def method_bucket(self, method):
+        bucket = self._buckets.get(method)
+        if bucket is None:
+            per_minute = METHOD_TIERS.get(method, DEFAULT_TIER) / RATE_LIMIT_WORKERS
+            with self._lock:
+                # Allows a burst of a few seconds' worth of calls
+                bucket = self._buckets.setdefault(method, TokenBucket(per_minute / 60, max(1, per_minute / 10)))
+        return bucket
+
+    def channel_bucket(self, method, channel):
+        key = (method, channel)
+        bucket = self._channel_buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._channel_buckets.setdefault(
+                    key, TokenBucket(PER_CHANNEL_METHODS[method] / RATE_LIMIT_WORKERS, max(1, 3 / RATE_LIMIT_WORKERS))
+                )
+        return bucket
+
+    def api_call(self, api_method, *, http_verb="POST", files=None, data=None, params=None, json=None, headers=None, auth=None):
+        # Includes rate-limit waits and retries, unlike the per-attempt latency metric
+        with stage("slack_call") as span:
+            span.set("method", api_method)
+            if api_method in PER_CHANNEL_METHODS:
+                channel = next((args["channel"] for args in (json, data, params) if args and "channel" in args), None)
+                if channel:
+                    # Each channel waits in its own line, so one busy channel does not hold up the others.
+                    # Only dispatcher workers call Slack, so the wait never delays a request's acknowledgement
+                    waited = self.channel_bucket(api_method, channel).acquire(timeout=MAX_RATE_LIMIT_WAIT)
+                    if waited:
+                        self.stats(api_method).throttle_wait.observe(waited)
+            return super().api_call(
+                api_method, http_verb=http_verb, files=files, data=data, params=params, json=json, headers=headers, auth=auth
+            )
+
+    def post_json(self, url, body):
+        """
+        POSTs JSON text that is already serialized, e.g. to a response_url, through
+        the pooled session. Retries once after a connection error, like WebhookClient.
+        Returns the requests.Response.
+        """
+        stats = self.stats("response_url")
+        data = body.encode("utf-8")
+        for attempt in range(2):
+            start = time.perf_counter()
+            try:
+                resp = self._session().post(
+                    url,
+                    data=data,
+                    headers={"Content-Type": "application/json;charset=utf-8"},
+                    timeout=self.timeout,
+                    proxies=self._proxies
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                stats.errors.inc()
+                if attempt:
+                    raise
+                continue
+            finally:
+                stats.latency.observe(time.perf_counter() - start)
+            if resp.status_code >= 300:
+                stats.errors.inc()
+            return resp
+
+    def _perform_urllib_http_request_internal(self, url, req):
+        # Overrides the SDK's per-attempt urllib call; retries, pagination and
+        # response parsing in the SDK stay unchanged
+        method = url.rsplit("/", 1)[-1]
+        stats = self.stats(method)
+        # After MAX_RATE_LIMIT_WAIT the call goes out anyway and Slack's 429 handling takes over
+        waited = self.method_bucket(method).acquire(timeout=MAX_RATE_LIMIT_WAIT)
+        if waited:
+            stats.throttle_wait.observe(waited)
+
+        start = time.perf_counter()
+        try:
+            headers = {name: str(value) for name, value in req.header_items()}
+            resp = self._session().post(url, data=req.data, headers=headers, timeout=self.timeout, proxies=self._proxies)
+        except requests.RequestException:
+            stats.errors.inc()
+            raise
+        finally:
+            stats.latency.observe(time.perf_counter() - start)
+
+        if resp.status_code >= 300:
+            stats.errors.inc()
+            # The SDK's retry handlers and error handling expect urllib's HTTPError
+            headers = http.client.HTTPMessage()
+            for name, value in resp.headers.items():
+                headers[name] = value
+            raise HTTPError(url, resp.status_code, resp.reason, headers, io.BytesIO(resp.content))
+        if resp.headers.get("Content-Type", "").startswith("application/gzip"):
+            return {"status": resp.status_code, "headers": dict(resp.headers), "body": resp.content}
+        resp.encoding = resp.encoding or "utf-8"
+        return {"status": resp.status_code, "headers": dict(resp.headers), "body": resp.text}
@@ -0,0 +1,156 @@
+"""
+user_directory.py
+Lazily loaded directory of the workspace's Slack users.
+This module pages through users.list on first use, keeps an id to name index in
+memory, follows user_change and team_join events, and saves a snapshot file so
+warm starts do not call the API at all. Only complete fetches are saved, and
+event updates are saved in the background a few seconds later.
+"""
+import json
+import os
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+
+class UserDirectory:
+    """
+    An id to name index of human (non-bot) users.
+    A snapshot younger than max_age seconds is used as is; an older one is served
+    while a background refresh pages through users.list again.
+    """
+
+    def __init__(self, client, snapshot_path=None, max_age=24 * 3600, page_size=200, save_delay=30.0):
+        self.client = client
+        self.snapshot_path = snapshot_path
+        self.max_age = max_age
+        self.page_size = page_size
+        self.save_delay = save_delay
+        self._users = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._refreshing = False
+        self._save_pending = False
+
+    def _index(self):
+        users = self._users
+        if users is not None:
+            return users
+        with self._lock:
+            if self._users is None:
+                snapshot, saved_at = self._read_snapshot()
+                if snapshot is None:
+                    self._users, complete = self._fetch_all()
+                    # A partial directory is served but not saved, so the next start fetches again
+                    if complete:
+                        self._write_snapshot(self._users)
+                else:
+                    self._users = snapshot
+                    if time.time() - saved_at > self.max_age:
+                        self._refresh_in_background()
+            return self._users
+
+    def _fetch_all(self):
+        """
+        Pages through users.list. Returns (users, complete); complete is False when
+        a call failed and users holds only the pages fetched before it.
+        """
+        users = {}
+        try:
+            # Iterating a SlackResponse follows response_metadata.next_cursor page by page
+            for page in self.client.users_list(limit=self.page_size):
+                for user in page['members']:
+                    if not user.get('is_bot') and not user.get('deleted') and user['id'] != 'USLACKBOT':
+                        users[user['id']] = user['name']
+        except SlackApiError as e:
+            print(f"Error fetching users: {e.response['error']}")
+            return users, False
+        return users, True
+
+    def _read_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None, 0
+        try:
+            with open(self.snapshot_path, "r") as f:
+                data = json.load(f)
+            return data["users"], data["saved_at"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error reading user snapshot {self.snapshot_path}: {e}")
+            return None, 0
+
+    def _write_snapshot(self, users):
+        if not self.snapshot_path:
+            return
+        # Writers take turns on the temporary file; readers of the index are not held up
+        with self._save_lock:
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump({"saved_at": time.time(), "users": users}, f)
+                os.replace(tmp_path, self.snapshot_path)
+            except OSError as e:
+                print(f"Error writing user snapshot {self.snapshot_path}: {e}")
+
+    def _save_later(self):
+        # Called with the lock held. Events arrive often, so their updates are saved together after save_delay
+        if self._save_pending or not self.snapshot_path:
+            return
+        self._save_pending = True
+        timer = threading.Timer(self.save_delay, self._save_now)
+        timer.daemon = True
+        timer.start()
+
+    def _save_now(self):
+        with self._lock:
+            self._save_pending = False
+        # The index is replaced, never changed in place, so this reference stays consistent
+        self._write_snapshot(self._users)
+
+    def _refresh_in_background(self):
+        if self._refreshing:
+            return
+        self._refreshing = True
+        threading.Thread(target=self.refresh, name="user-directory-refresh", daemon=True).start()
+
+    def refresh(self):
+        """
+        Reloads every user from the API and saves a new snapshot.
+        """
+        try:
+            users, complete = self._fetch_all()
+            if complete:
+                with self._lock:
+                    self._users = users
+                self._write_snapshot(users)
+        finally:
+            self._refreshing = False
+
+    def apply_event(self, event):
+        """
+        Updates the index from a user_change or team_join event. Runs on the request
+        thread, so the snapshot is saved later in the background.
+        """
+        user = event.get('user')
+        if not isinstance(user, dict) or 'id' not in user:
+            return
+        with self._lock:
+            if self._users is None:
+                # Not loaded yet; the first lookup will fetch the current state anyway
+                return
+            users = dict(self._users)
+            if user.get('is_bot') or user.get('deleted'):
+                users.pop(user['id'], None)
+            else:
+                users[user['id']] = user.get('name', users.get(user['id']))
+            self._users = users
+            self._save_later()
+
+    def get_name(self, user_id):
+        return self._index().get(user_id)
+
+    def users(self):
+        """
+        Returns a list of (user id, user name) pairs.
+        """
+        return list(self._index().items())
@@ -0,0 +1,140 @@
+"""
+user_prefs.py
+Storage for per-user bot preferences.
+This module keeps an in-memory index of opt-in flags and translation languages
+backed by SQLite in WAL mode, so lookups never touch the disk and writes are atomic across workers.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class UserPrefsStore:
+    """
+    Opt-in and language preferences indexed in memory and persisted to SQLite.
+    Changes committed by other processes are picked up at most refresh_interval
+    seconds later by comparing SQLite's data_version.
+    """
+
+    def __init__(self, path, legacy_json_path=None, refresh_interval=2.0):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self.refresh_interval = refresh_interval
+        self._index = {}
+        self._languages = {}
+        self._conn = None
+        self._pid = None
+        self._data_version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Called with self._lock held. Reopens after a fork so workers never share a handle.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_prefs "
+                "(user_id TEXT PRIMARY KEY, opted_in INTEGER NOT NULL, updated_at REAL NOT NULL, language TEXT)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(user_prefs)")]
+            if "language" not in columns:
+                # Databases created before language preferences existed
+                conn.execute("ALTER TABLE user_prefs ADD COLUMN language TEXT")
+            self._conn = conn
+            self._pid = os.getpid()
+            if self.legacy_json_path:
+                self._migrate_json(self.legacy_json_path)
+            self._reload()
+        return self._conn
+
+    def _reload(self):
+        rows = self._conn.execute("SELECT user_id, opted_in, language FROM user_prefs").fetchall()
+        self._index = {user_id: bool(opted_in) for user_id, opted_in, _ in rows}
+        self._languages = {user_id: language for user_id, _, language in rows if language}
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._checked_at = time.monotonic()
+
+    def _refresh_if_stale(self):
+        now = time.monotonic()
+        if self._pid == os.getpid() and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            conn = self._connection()
+            if now - self._checked_at < self.refresh_interval:
+                return
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._reload()
+            else:
+                self._checked_at = now
+
+    def _migrate_json(self, json_path):
+        """
+        Imports a legacy user_prefs.json once and renames it so it is not imported again.
+        """
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r") as f:
+                prefs = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading legacy preferences {json_path}: {e}")
+            return
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            # Rows already in the database win over the legacy file
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO user_prefs (user_id, opted_in, updated_at) VALUES (?, ?, ?)",
+                [(user_id, int(bool(opted_in)), now) for user_id, opted_in in prefs.items()]
+            )
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError as e:
+            print(f"Error renaming legacy preferences {json_path}: {e}")
+        print(f"Imported {len(prefs)} user preferences from {json_path}")
+
+    def is_opted_in(self, user_id):
+        self._refresh_if_stale()
+        return self._index.get(user_id, False)
+
+    def language(self, user_id):
+        """
+        Returns the user's translation language code, or None if none is set.
+        """
+        self._refresh_if_stale()
+        return self._languages.get(user_id)
+
+    def set_opt_in(self, user_id, opt_in: bool):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO user_prefs (user_id, opted_in, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET opted_in = excluded.opted_in, updated_at = excluded.updated_at",
+                (user_id, int(opt_in), time.time())
+            )
+            # Copy-on-write so readers without the lock always see a complete dict
+            index = dict(self._index)
+            index[user_id] = opt_in
+            self._index = index
+
+    def set_language(self, user_id, language):
+        """
+        Sets the user's translation language code; None clears it.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO user_prefs (user_id, opted_in, updated_at, language) VALUES (?, 0, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET language = excluded.language, updated_at = excluded.updated_at",
+                (user_id, time.time(), language)
+            )
+            languages = dict(self._languages)
+            if language:
+                languages[user_id] = language
+            else:
+                languages.pop(user_id, None)
+            self._languages = languages
@@ -0,0 +1,83 @@
+from worker_service.admission import AdmissionController, FairQueue, _parse_weights
+from worker_service.token_bucket import TokenBucket
+
+
+def test_token_bucket_try_acquire_and_refund():
+    bucket = TokenBucket(rate=0.001, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    bucket.refund()
+    assert bucket.try_acquire()
+
+
+def test_token_bucket_acquire_gives_up_after_timeout_without_taking_tokens():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire() == 0
+    assert bucket.acquire(timeout=0.01) is None
+    assert bucket.available() < 0.1
+
+
+def test_token_bucket_pause_stops_handing_out_tokens():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(60)
+    assert not bucket.try_acquire()
+    assert bucket.acquire(timeout=1) is None
+
+
+def test_admit_charges_every_level():
+    controller = AdmissionController(levels=(("user", 100), ("team", 150)))
+    assert controller.admit(60, user="U1", team="T1")
+    assert controller.admit(60, user="U2", team="T1")
+    # T1 now holds 30 of its 150 tokens
+    assert not controller.admit(60, user="U3", team="T1")
+
+
+def test_rejection_refunds_the_levels_already_charged():
+    controller = AdmissionController(levels=(("user", 100), ("team", 50)))
+    assert not controller.admit(60, user="U1", team="T1")
+    assert controller.admit(40, user="U1", team="T2")
+    assert controller.admit(40, user="U1", team="T3")
+    snapshot = controller.snapshot()
+    assert snapshot["levels"]["team"]["rejected"] >= 1
+    assert snapshot["levels"]["user"]["busiest"][0]["key"] == "U1"
+
+
+def test_missing_keys_and_disabled_controller_are_not_charged():
+    controller = AdmissionController(levels=(("user", 10), ("channel", 10)))
+    assert controller.admit(10, user="U1")
+    assert controller.admit(10, channel="C1")
+    assert AdmissionController(levels=(("user", 10),), enabled=False).admit(1000, user="U1")
+
+
+def test_only_max_tracked_buckets_are_kept():
+    controller = AdmissionController(levels=(("user", 10),), max_tracked=2)
+    for user in ("U1", "U2", "U3"):
+        assert controller.admit(10, user=user)
+    # U1's bucket was dropped, so it starts again with a full budget
+    assert controller.admit(10, user="U1")
+
+
+def test_fair_queue_shares_output_between_tenants():
+    queue = FairQueue()
+    for i in range(4):
+        queue.push("noisy", f"noisy-{i}")
+    queue.push("quiet", "quiet-0")
+    order = [queue.pop() for _ in range(len(queue))]
+    assert order.index("quiet-0") <= 1
+    assert [item for item in order if item.startswith("noisy")] == [f"noisy-{i}" for i in range(4)]
+
+
+def test_fair_queue_respects_weights():
+    queue = FairQueue()
+    for i in range(4):
+        queue.push("light", ("light", i), weight=1)
+        queue.push("heavy", ("heavy", i), weight=3)
+    first = [queue.pop()[0] for _ in range(4)]
+    assert first.count("heavy") == 3
+    assert queue.backlog() == {"light": 3, "heavy": 1}
+
+
+def test_parse_weights():
+    assert _parse_weights("C1=2, T1=0.5,,bad") == {"C1": 2.0, "T1": 0.5}
+    assert _parse_weights(None) == {}
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from worker_service.dispatcher import Dispatcher, QueueFullError
+
+
+def test_jobs_run_on_workers_and_return_their_results():
+    dispatcher = Dispatcher("test_dispatch_results", max_workers=2)
+    assert dispatcher.submit(lambda a, b=0: a + b, 1, b=2).result(timeout=1) == 3
+    assert dispatcher.submit(threading.current_thread).result(timeout=1).name.startswith("test_dispatch_results-")
+
+
+def test_failed_jobs_fail_their_future():
+    dispatcher = Dispatcher("test_dispatch_failures", max_workers=1)
+
+    def broken():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(broken).result(timeout=1)
+    # The worker survives the failure
+    assert dispatcher.submit(lambda: "ok").result(timeout=1) == "ok"
+
+
+def test_submitting_to_a_full_queue_fails_at_once():
+    dispatcher = Dispatcher("test_dispatch_full", max_workers=1, max_queue_depth=1)
+    release = threading.Event()
+    running = threading.Event()
+
+    def block():
+        running.set()
+        release.wait(5)
+
+    first = dispatcher.submit(block)
+    running.wait(1)
+    queued = dispatcher.submit(lambda: "queued")
+    with pytest.raises(QueueFullError):
+        dispatcher.submit(lambda: "dropped")
+    release.set()
+    first.result(timeout=1)
+    assert queued.result(timeout=1) == "queued"
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from llm_service import fast_classifier
+from llm_service.fast_classifier import TONES, ToneModel, best_guess, classify, lexicon_classify
+from llm_service.llm_functions import AllowedTones, AllowedUrgency
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(fast_classifier, "ENABLED", True)
+
+
+def biased_model(tone, strength):
+    # No features matter: every message gets the same, more or less confident, answer
+    tone_bias = np.zeros(len(TONES), dtype=np.float32)
+    tone_bias[TONES.index(tone.value)] = strength
+    return ToneModel(np.zeros((16, len(TONES)), dtype=np.float32), tone_bias, np.zeros(16, dtype=np.float32), -strength)
+
+
+@pytest.mark.parametrize("text, tone", [
+    ("ok", AllowedTones.NEUTRAL),
+    ("Thanks!", AllowedTones.POSITIVE),
+    ("  Sounds   good. ", AllowedTones.POSITIVE),
+    (":tada: :tada:", AllowedTones.EXCITED),
+    ("🎉", AllowedTones.EXCITED),
+])
+def test_lexicon_answers_acknowledgements(text, tone):
+    response = lexicon_classify(text)
+    assert response.tone == tone
+    assert response.urgency == AllowedUrgency.NOT_URGENT
+    assert response.confidence == 95
+    assert response.original_message == text
+    assert len(response.quick_replies) == 3
+
+
+@pytest.mark.parametrize("text", ["no", "nope", "sure", "ok but why?", ""])
+def test_lexicon_leaves_ambiguous_messages_to_the_llm(text):
+    assert lexicon_classify(text) is None
+
+
+def test_lexicon_hits_respect_the_threshold():
+    assert lexicon_classify(":unknown_emoji:", threshold=0.9) is None
+    assert lexicon_classify(":unknown_emoji:", threshold=0.5).tone == AllowedTones.NEUTRAL
+    assert lexicon_classify("ok", threshold=0.99) is None
+
+
+def test_classify_uses_a_confident_model(monkeypatch):
+    monkeypatch.setattr(fast_classifier, "MAX_CHARS", 120)
+    response = classify("the deploy finished", model=biased_model(AllowedTones.POSITIVE, 20))
+    assert response.tone == AllowedTones.POSITIVE
+    assert response.urgency == AllowedUrgency.NOT_URGENT
+
+
+def test_classify_falls_through_when_unsure_or_too_long(monkeypatch):
+    monkeypatch.setattr(fast_classifier, "MAX_CHARS", 10)
+    assert classify("short one", model=biased_model(AllowedTones.POSITIVE, 0.1)) is None
+    assert classify("a much longer message", model=biased_model(AllowedTones.POSITIVE, 20)) is None
+
+
+def test_best_guess_answers_whatever_its_confidence():
+    response = best_guess("a much longer message", model=biased_model(AllowedTones.SAD, 0.1))
+    assert response.tone == AllowedTones.SAD
+    assert response.confidence < 50
+
+
+def test_disabled_fast_path_answers_nothing(monkeypatch):
+    monkeypatch.setattr(fast_classifier, "ENABLED", False)
+    assert classify("ok") is None
+
+
+def test_model_save_and_load(tmp_path):
+    model = biased_model(AllowedTones.ANGRY, 5)
+    path = tmp_path / "model.npz"
+    model.save(path)
+    loaded = ToneModel.load(path)
+    np.testing.assert_allclose(loaded.predict("why")[0], model.predict("why")[0])
@@ -0,0 +1,73 @@
+import time
+
+from slack_service.message_history import MessageHistory
+
+
+def message(ts, user="U2", text=None, **extra):
+    return {"channel": "C1", "ts": ts, "user": user, "text": text or f"message {ts}", **extra}
+
+
+def test_unknown_channels_need_the_api():
+    assert MessageHistory().latest_from_other("C1", "U1") == (False, None)
+
+
+def test_latest_message_from_another_user():
+    history = MessageHistory()
+    history.fill("C1", [message("100.000001"), message("100.000002", user="U1")])
+    assert history.latest_from_other("C1", "U1") == (True, "message 100.000001")
+    history.record_event(message("100.000003", user="U3"))
+    assert history.latest_from_other("C1", "U1") == (True, "message 100.000003")
+
+
+def test_a_synced_channel_without_other_users_answers_none():
+    history = MessageHistory()
+    history.fill("C1", [message("100.000001", user="U1")])
+    assert history.latest_from_other("C1", "U1") == (True, None)
+
+
+def test_edits_deletions_and_thread_replies():
+    history = MessageHistory()
+    history.fill("C1", [message("100.000001"), message("100.000002")])
+    history.record_event({"channel": "C1", "subtype": "message_changed", "message": {"ts": "100.000001", "text": "edited"}})
+    history.record_event({"channel": "C1", "subtype": "message_deleted", "deleted_ts": "100.000002"})
+    history.record_event(message("100.000003", thread_ts="100.000001"))
+    assert history.text_of("C1", "100.000001") == "edited"
+    assert history.text_of("C1", "100.000003") is None
+    assert history.latest_from_other("C1", "U1") == (True, "edited")
+
+
+def test_out_of_order_events_are_kept_in_ts_order():
+    history = MessageHistory(capacity=3)
+    for ts in ("100.000004", "100.000002", "100.000003", "100.000001"):
+        history.record_event(message(ts))
+    assert history.latest_from_other("C1", "U1") == (True, "message 100.000004")
+    assert history.text_of("C1", "100.000001") is None
+
+
+def test_a_gap_in_one_channel_does_not_affect_another():
+    history = MessageHistory(gap_seconds=0.05)
+    history.fill("C1", [message("100.000001")])
+    history.fill("C2", [{**message("100.000001"), "channel": "C2"}])
+    time.sleep(0.1)
+    history.record_event({**message("100.000002", text="fresh"), "channel": "C2"})
+    # C1 heard nothing for longer than gap_seconds, so events may have been lost there
+    assert history.latest_from_other("C1", "U1") == (False, None)
+    assert history.latest_from_other("C2", "U1") == (True, "fresh")
+    history.fill("C1", [message("100.000001")])
+    assert history.latest_from_other("C1", "U1") == (True, "message 100.000001")
+
+
+def test_least_recently_used_channels_are_dropped():
+    history = MessageHistory(max_channels=2)
+    for channel in ("C1", "C2", "C3"):
+        history.fill(channel, [message("100.000001")])
+    assert history.latest_from_other("C1", "U1") == (False, None)
+    assert history.latest_from_other("C3", "U1")[0]
+
+
+def test_disabled_history_always_needs_the_api():
+    history = MessageHistory(enabled=False)
+    history.fill("C1", [message("100.000001")])
+    history.record_event(message("100.000002"))
+    assert history.latest_from_other("C1", "U1") == (False, None)
+    assert history.text_of("C1", "100.000002") is None
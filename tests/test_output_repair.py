@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+from llm_service.llm_functions import _parse_batch, merge_missing_fields, parse_tone_fields, repair_tone_fields
+from llm_service.output_repair import as_percentage, closest_label, loads_tolerant
+
+ANSWER = {
+    "tone": "neutral",
+    "explanation": "The message is a request with urgency.",
+    "urgency": "urgent",
+    "confidence": 92,
+    "quick_replies": ["On it.", "Received, thanks.", "Will do."],
+}
+
+
+def test_loads_tolerant_parses_valid_json():
+    assert loads_tolerant(json.dumps(ANSWER)) == (ANSWER, False)
+
+
+def test_loads_tolerant_ignores_code_fences():
+    assert loads_tolerant("```json\n" + json.dumps(ANSWER) + "\n```") == (ANSWER, False)
+
+
+def test_loads_tolerant_keeps_values_before_the_cut():
+    raw = json.dumps(ANSWER)
+    value, truncated = loads_tolerant(raw[:raw.index('"confidence"') + 8])
+    assert truncated
+    assert value == {"tone": "neutral", "explanation": ANSWER["explanation"], "urgency": "urgent"}
+
+
+def test_loads_tolerant_keeps_complete_items_of_a_cut_list():
+    value, truncated = loads_tolerant('[{"tone": "neutral"}, {"tone": "pos')
+    assert truncated
+    assert value == [{"tone": "neutral"}]
+
+
+@pytest.mark.parametrize("raw", ["", None, "no json here", "{", '{"tone": "neu'])
+def test_loads_tolerant_raises_when_nothing_is_recovered(raw):
+    with pytest.raises(ValueError):
+        loads_tolerant(raw)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Frustrated", "frustrated"),
+    ("netural", "neutral"),
+    ("very_urgent", None),
+    (3, None),
+])
+def test_closest_label(value, expected):
+    assert closest_label(value, ["neutral", "frustrated", "positive"]) == expected
+
+
+def test_closest_label_uses_aliases():
+    assert closest_label("Upset", ["frustrated"], {"upset": "frustrated"}) == "frustrated"
+
+
+@pytest.mark.parametrize("value, expected", [
+    (85, 85), (85.4, 85), ("85%", 85), (0.85, 85), (120, 100), (-3, 0), (1, 1),
+    ("high", None), (True, None), (None, None), (float("nan"), None),
+])
+def test_as_percentage(value, expected):
+    assert as_percentage(value) == expected
+
+
+def test_repair_tone_fields_keeps_a_valid_answer():
+    assert repair_tone_fields(ANSWER) == (ANSWER, [])
+
+
+def test_repair_tone_fields_maps_near_misses():
+    fields, missing = repair_tone_fields({
+        **ANSWER, "tone": "Upset", "urgency": "Not Urgent", "confidence": "0.9",
+    })
+    assert missing == []
+    assert fields["tone"] == "sad"
+    assert fields["urgency"] == "not urgent"
+    assert fields["confidence"] == 90
+
+
+def test_repair_tone_fields_trims_and_pads_quick_replies():
+    fields, _ = repair_tone_fields({**ANSWER, "quick_replies": ANSWER["quick_replies"] + ["Thanks!"]})
+    assert fields["quick_replies"] == ANSWER["quick_replies"]
+    fields, _ = repair_tone_fields({**ANSWER, "quick_replies": ["On it."]})
+    assert len(fields["quick_replies"]) == 3
+    assert fields["quick_replies"][0] == "On it."
+    assert len(set(fields["quick_replies"])) == 3
+
+
+def test_repair_tone_fields_reports_missing_fields():
+    fields, missing = repair_tone_fields({"tone": "neutral", "confidence": "unknown", "quick_replies": ["On it."]})
+    assert fields["tone"] == "neutral"
+    assert "quick_replies" in fields
+    assert sorted(missing) == ["confidence", "explanation", "urgency"]
+
+
+def test_repair_tone_fields_rejects_non_objects():
+    fields, missing = repair_tone_fields(["neutral"])
+    assert fields == {}
+    assert len(missing) == len(ANSWER)
+
+
+def test_parse_tone_fields_repairs_a_cut_off_answer():
+    raw = json.dumps(ANSWER)
+    fields, missing = parse_tone_fields(raw[:raw.index('"quick_replies"') + 5])
+    assert missing == ["quick_replies"]
+    assert fields["confidence"] == 92
+
+
+def test_parse_tone_fields_raises_without_a_usable_field():
+    with pytest.raises(ValueError):
+        parse_tone_fields('{"mood": "fine"}')
+
+
+def test_merge_missing_fields_takes_only_the_missing_fields():
+    known = {name: value for name, value in ANSWER.items() if name != "urgency"}
+    merged = merge_missing_fields(known, ["urgency"], '{"urgency": "urgent", "tone": "positive"}')
+    assert merged == ANSWER
+
+
+def test_merge_missing_fields_raises_when_still_incomplete():
+    known = {name: value for name, value in ANSWER.items() if name != "urgency"}
+    with pytest.raises(ValueError):
+        merge_missing_fields(known, ["urgency"], '{"tone": "positive"}')
+
+
+def test_parse_batch_reads_every_item():
+    results = _parse_batch(json.dumps([ANSWER, {**ANSWER, "tone": "Frustrated"}]), 2)
+    assert [fields["tone"] for fields, _ in results] == ["neutral", "angry"]
+
+
+def test_parse_batch_keeps_the_items_before_a_cut():
+    raw = json.dumps([ANSWER, ANSWER, ANSWER])
+    results = _parse_batch(raw[:len(raw) // 2], 3)
+    assert results[0] == (ANSWER, [])
+    assert results[2] is None
+
+
+def test_parse_batch_does_not_trust_a_complete_answer_of_the_wrong_length():
+    assert _parse_batch(json.dumps([ANSWER]), 2) == [None, None]
+    assert _parse_batch("not json", 2) == [None, None]
@@ -0,0 +1,99 @@
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+from flask import Flask, request
+from werkzeug.exceptions import HTTPException
+
+from slack_service import payload
+from slack_service.payload import EventPayload, InteractionPayload, SlashPayload, verify_signature
+
+SECRET = b"test-secret"
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(payload, "_secret", SECRET)
+    return Flask(__name__)
+
+
+def sign(body, timestamp=None, secret=SECRET):
+    timestamp = str(int(timestamp or time.time()))
+    signature = "v0=" + hmac.new(secret, b"v0:" + timestamp.encode() + b":" + body, hashlib.sha256).hexdigest()
+    return {"X-Slack-Request-Timestamp": timestamp, "X-Slack-Signature": signature}
+
+
+def status_of(build):
+    with pytest.raises(HTTPException) as raised:
+        build()
+    return raised.value.code
+
+
+def test_verify_signature():
+    body = b"token=x"
+    headers = sign(body)
+    timestamp, signature = headers["X-Slack-Request-Timestamp"], headers["X-Slack-Signature"]
+    assert verify_signature(SECRET, body, timestamp, signature)
+    assert not verify_signature(SECRET, body + b"&", timestamp, signature)
+    assert not verify_signature(b"other", body, timestamp, signature)
+    assert not verify_signature(SECRET, body, timestamp, signature, now=int(timestamp) + payload.MAX_REQUEST_AGE + 1)
+    assert not verify_signature(SECRET, body, None, signature)
+    assert not verify_signature(SECRET, body, "12a", signature)
+
+
+def test_slash_payload_decodes_the_form_lazily(app):
+    body = urlencode({"user_id": "U1", "text": "hello there", "channel_id": "C1"}).encode()
+    with app.test_request_context("/", method="POST", data=body, headers=sign(body),
+                                  content_type="application/x-www-form-urlencoded"):
+        slash = SlashPayload(request)
+        assert slash._data is None
+        assert (slash.user_id, slash.text, slash.channel_id) == ("U1", "hello there", "C1")
+        assert slash.trigger_id is None
+
+
+def test_event_and_interaction_payloads(app):
+    body = json.dumps({"type": "event_callback", "event": {"type": "message"}}).encode()
+    with app.test_request_context("/", method="POST", data=body, headers={**sign(body), "X-Slack-Retry-Num": "1"}):
+        event = EventPayload(request)
+        assert event.event == {"type": "message"}
+        assert event.retry_num == "1"
+    body = urlencode({"payload": json.dumps({"type": "block_actions", "actions": [{"value": "v"}]})}).encode()
+    with app.test_request_context("/", method="POST", data=body, headers=sign(body)):
+        interaction = InteractionPayload(request)
+        assert interaction.type == "block_actions"
+        assert interaction.actions == [{"value": "v"}]
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-Slack-Request-Timestamp": "1", "X-Slack-Signature": "v0=00"},
+])
+def test_unsigned_or_stale_requests_are_rejected(app, headers):
+    with app.test_request_context("/", method="POST", data=b"{}", headers=headers):
+        assert status_of(lambda: EventPayload(request)) == 401
+
+
+def test_requests_are_rejected_without_a_secret_unless_allowed(app, monkeypatch):
+    monkeypatch.setattr(payload, "_secret", None)
+    with app.test_request_context("/", method="POST", data=b'{"type": "url_verification"}'):
+        monkeypatch.setattr(payload, "ALLOW_UNSIGNED", False)
+        assert status_of(lambda: EventPayload(request)) == 401
+        monkeypatch.setattr(payload, "ALLOW_UNSIGNED", True)
+        assert EventPayload(request).type == "url_verification"
+
+
+@pytest.mark.parametrize("body", [b"{bad", b"[1, 2]", b"null", b'"text"', b"\xff"])
+def test_malformed_event_bodies_are_rejected(app, body):
+    with app.test_request_context("/", method="POST", data=body, headers=sign(body)):
+        event = EventPayload(request)
+        assert status_of(lambda: event.type) == 400
+
+
+@pytest.mark.parametrize("body", [b"text=hi", b"payload=%7Bbad"])
+def test_malformed_interaction_bodies_are_rejected(app, body):
+    with app.test_request_context("/", method="POST", data=body, headers=sign(body)):
+        interaction = InteractionPayload(request)
+        assert status_of(lambda: interaction.actions) == 400
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_service import providers
+from llm_service.providers import Provider, ProviderRouter
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeProvider(Provider):
+    kind = "fake"
+
+    def __init__(self, name, delay=0.0, error=None, chunks=("a", "b")):
+        super().__init__(name, "fake-model")
+        self.delay = delay
+        self.error = error
+        self.chunks = chunks
+        self.calls = 0
+        self.closed = 0
+
+    def generate(self, contents, config=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return Response(self.name)
+
+    async def generate_async(self, contents, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return Response(self.name)
+
+    def generate_stream(self, contents, config=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return Stream(self, [Response(chunk) for chunk in self.chunks])
+
+
+class Stream:
+    def __init__(self, provider, chunks):
+        self.provider = provider
+        self.chunks = iter(chunks)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        self.provider.closed += 1
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(providers, "HEDGE_DELAY", 0.05)
+
+
+def test_single_provider_is_called_directly():
+    provider = FakeProvider("test-single")
+    router = ProviderRouter([provider])
+    assert router.call("hi").text == "test-single"
+    assert router._executor is None
+
+
+def test_failover_to_the_next_provider():
+    broken, working = FakeProvider("test-broken", error=RuntimeError("down")), FakeProvider("test-working")
+    router = ProviderRouter([broken, working])
+    assert router.call("hi").text == "test-working"
+    assert broken.calls == working.calls == 1
+
+
+def test_invalid_answers_count_as_failures():
+    first, second = FakeProvider("test-invalid"), FakeProvider("test-valid")
+
+    def parse(response):
+        if response.text == "test-invalid":
+            raise ValueError("invalid")
+        return response.text
+
+    assert ProviderRouter([first, second]).call("hi", parse=parse) == "test-valid"
+
+
+def test_every_provider_failing_raises_the_last_error():
+    router = ProviderRouter([FakeProvider("test-fail-1", error=RuntimeError("one")), FakeProvider("test-fail-2", error=RuntimeError("two"))])
+    with pytest.raises(RuntimeError, match="two"):
+        router.call("hi")
+
+
+def test_a_slow_provider_is_hedged():
+    slow, fast = FakeProvider("test-slow", delay=1.0), FakeProvider("test-fast")
+    seen = []
+    start = time.monotonic()
+    result = ProviderRouter([slow, fast]).call("hi", on_response=lambda provider, response: seen.append(provider.name))
+    assert result.text == "test-fast"
+    assert time.monotonic() - start < 0.5
+    assert seen == ["test-fast"]
+
+
+def test_failing_providers_are_skipped(monkeypatch):
+    monkeypatch.setattr(providers, "FAILURE_THRESHOLD", 2)
+    broken, working = FakeProvider("test-flaky", error=RuntimeError("down")), FakeProvider("test-steady")
+    router = ProviderRouter([broken, working], hedge=False)
+    for _ in range(2):
+        router.call("hi")
+    assert router.ranked() == [working, broken]
+    router.call("hi")
+    assert broken.calls == 2
+
+
+def test_call_async_fails_over_and_hedges():
+    slow, broken, fast = FakeProvider("test-async-slow", delay=1.0), FakeProvider("test-async-broken", error=RuntimeError("down")), FakeProvider("test-async-fast")
+    assert asyncio.run(ProviderRouter([broken, fast]).call_async("hi")).text == "test-async-fast"
+    start = time.monotonic()
+    assert asyncio.run(ProviderRouter([slow, fast]).call_async("hi")).text == "test-async-fast"
+    assert time.monotonic() - start < 0.5
+
+
+def test_stream_yields_every_chunk_and_reports_the_last():
+    provider = FakeProvider("test-stream", chunks=("one", "two", "three"))
+    seen = []
+    chunks = ProviderRouter([provider]).stream("hi", on_response=lambda p, response: seen.append(response.text))
+    assert [chunk.text for chunk in chunks] == ["one", "two", "three"]
+    assert seen == ["three"]
+    assert provider.closed == 1
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    empty, working = FakeProvider("test-stream-empty", chunks=()), FakeProvider("test-stream-working")
+    chunks = ProviderRouter([empty, working]).stream("hi")
+    assert [chunk.text for chunk in chunks] == ["a", "b"]
+
+
+def test_stream_closes_the_hedge_that_lost():
+    slow, fast = FakeProvider("test-stream-slow", delay=0.3), FakeProvider("test-stream-fast")
+    chunks = list(ProviderRouter([slow, fast]).stream("hi"))
+    assert [chunk.text for chunk in chunks] == ["a", "b"]
+    deadline = time.monotonic() + 2
+    while not slow.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert slow.closed == 1
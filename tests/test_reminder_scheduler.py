@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from worker_service import reminder_scheduler
+from worker_service.dispatcher import QueueFullError
+from worker_service.reminder_scheduler import ReminderScheduler
+
+
+class Recorder:
+    def __init__(self):
+        self.fired = []
+        self.event = threading.Event()
+
+    def __call__(self, channel_id, message_ts, user_id):
+        self.fired.append((channel_id, message_ts, user_id))
+        self.event.set()
+
+
+def test_reminders_fire_after_their_delay(tmp_path):
+    fire = Recorder()
+    scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), fire)
+    scheduler.schedule("C1", "100.000001", "U1", 0.05)
+    assert fire.event.wait(2)
+    assert fire.fired == [("C1", "100.000001", "U1")]
+    assert scheduler.pending_count() == 0
+
+
+def test_cancelled_reminders_do_not_fire(tmp_path):
+    fire = Recorder()
+    scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), fire)
+    scheduler.schedule("C1", "100.000001", "U1", 0.1)
+    assert scheduler.cancel("C1", "100.000001")
+    assert not scheduler.cancel("C1", "100.000001")
+    assert not fire.event.wait(0.3)
+
+
+def test_saved_reminders_fire_after_a_restart_without_new_activity(tmp_path):
+    path = str(tmp_path / "reminders.db")
+    ReminderScheduler(path, lambda *args: None).schedule("C1", "100.000001", "U1", 3600)
+    # Back-date the saved reminder, as if the process had been down while it came due
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE reminders SET due_at = ?", (time.time() - 1,))
+    fire = Recorder()
+    ReminderScheduler(path, fire).start()
+    assert fire.event.wait(2)
+    assert fire.fired == [("C1", "100.000001", "U1")]
+
+
+def test_a_full_dispatch_queue_retries_later_instead_of_calling_slack(tmp_path, monkeypatch):
+    class FullDispatcher:
+        def submit(self, *args):
+            raise QueueFullError("full")
+
+    scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), lambda *args: None)
+    monkeypatch.setattr(reminder_scheduler, "dispatcher", FullDispatcher())
+    monkeypatch.setattr(reminder_scheduler, "reminders", scheduler)
+    monkeypatch.setattr(reminder_scheduler, "send_reminder_if_no_reply", lambda *args: pytest.fail("Slack called on the scheduler thread"))
+    reminder_scheduler._send_reminder("C1", "100.000001", "U1")
+    assert scheduler.pending_count() == 1
+    assert scheduler.cancel("C1", "100.000001")
+
+
+def test_a_reply_before_the_reminder_is_scheduled_prevents_it(tmp_path):
+    path = str(tmp_path / "reminders.db")
+    fire = Recorder()
+    # The reply is handled by one worker while another is still analyzing the message
+    assert not ReminderScheduler(path, fire).cancel("C1", "100.000001")
+    scheduler = ReminderScheduler(path, fire)
+    scheduler.schedule("C1", "100.000001", "U1", 0.05)
+    scheduler.schedule("C1", "100.000002", "U1", 0.05)
+    assert fire.event.wait(2)
+    time.sleep(0.1)
+    assert fire.fired == [("C1", "100.000002", "U1")]
@@ -0,0 +1,29 @@
+from llm_service.response_cache import ResponseCache, content_key, normalize_text
+
+
+def test_normalize_text_collapses_whitespace_but_keeps_case():
+    assert normalize_text("  Hello\n\tWORLD ") == "Hello WORLD"
+    assert normalize_text("Café") == "Café"
+
+
+def test_content_key_separates_parts():
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key("a", "b") == content_key("a", "b")
+
+
+def test_memory_layer_is_bounded_in_utf8_bytes():
+    cache = ResponseCache("test_cache_bytes", max_bytes=10)
+    cache.set("a", "ééééé")
+    assert cache.get("a") == "ééééé"
+    # Five characters, but ten bytes: the cache is full
+    cache.set("b", "x")
+    assert cache.get("a") is None
+    assert cache.get("b") == "x"
+
+
+def test_shared_store_answers_other_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache("test_cache_shared", path=path).set("key", "value")
+    other = ResponseCache("test_cache_shared", path=path)
+    assert other.get("key") == "value"
+    assert other.get("missing") is None
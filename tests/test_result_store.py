@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from worker_service.result_store import ResultStore
+
+
+def finished(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def test_get_or_start_starts_once_per_key():
+    store = ResultStore("test_store_once")
+    calls = []
+
+    def start():
+        calls.append(1)
+        return finished("analysis")
+
+    first = store.get_or_start("key", start)
+    second = store.get_or_start("key", start)
+    assert first is second
+    assert first.result(timeout=1) == "analysis"
+    assert len(calls) == 1
+
+
+def test_slow_start_does_not_hold_up_other_keys():
+    store = ResultStore("test_store_slow")
+    release = threading.Event()
+    started = Future()
+
+    def slow_start():
+        release.wait(5)
+        return started
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        slow = pool.submit(store.get_or_start, "slow", slow_start)
+        time.sleep(0.05)
+        begin = time.monotonic()
+        assert store.get_or_start("fast", lambda: finished(1)).result(timeout=1) == 1
+        # A request for the slow key joins its placeholder instead of starting again
+        joined = store.get_or_start("slow", lambda: pytest.fail("started twice"))
+        assert time.monotonic() - begin < 1
+        release.set()
+        assert slow.result(timeout=1) is joined
+    started.set_result("done")
+    assert joined.result(timeout=1) == "done"
+
+
+def test_failed_start_is_forgotten():
+    store = ResultStore("test_store_failed")
+
+    def broken():
+        raise RuntimeError("no worker")
+
+    with pytest.raises(RuntimeError):
+        store.get_or_start("key", broken)
+    assert store.get("key") is None
+    failing = Future()
+    future = store.get_or_start("key2", lambda: failing)
+    failing.set_exception(ValueError("bad answer"))
+    with pytest.raises(ValueError):
+        future.result(timeout=1)
+    assert store.get("key2") is None
+    assert store.get_or_start("key2", lambda: finished("retry")).result(timeout=1) == "retry"
+
+
+def test_entries_expire_and_are_bounded():
+    store = ResultStore("test_store_bounded", max_entries=2, ttl=60)
+    for key in ("a", "b", "c"):
+        store.put(key, finished(key))
+    assert store.get("a") is None
+    assert store.get("c").result() == "c"
+    expiring = ResultStore("test_store_ttl", ttl=0)
+    expiring.put("a", finished("a"))
+    assert expiring.get("a") is None
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_service.single_flight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_result():
+    flight = SingleFlight("test_flight_threads")
+    release, started = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    deadline = time.monotonic() + 5
+    while flight._coalesced.value < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["answer"] * 3
+    assert len(calls) == 1
+
+
+def test_the_leader_error_reaches_every_waiter():
+    flight = SingleFlight("test_flight_errors")
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError("bad answer")
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+
+def test_a_cancelled_waiter_leaves_the_call_to_the_others():
+    flight = SingleFlight("test_flight_cancel")
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", slow))
+        await asyncio.sleep(0)
+        impatient = asyncio.ensure_future(asyncio.wait_for(flight.do_async("key", slow), timeout=0.01))
+        patient = asyncio.ensure_future(flight.do_async("key", slow))
+        with pytest.raises(asyncio.TimeoutError):
+            await impatient
+        return await leader, await patient
+
+    assert asyncio.run(main()) == ("answer", "answer")
+    assert len(calls) == 1
+
+
+def test_resolving_a_cancelled_future_is_ignored():
+    flight = SingleFlight("test_flight_resolve")
+    future, leader = flight.claim("key")
+    assert leader
+    future.cancel()
+    flight.resolve("key", future, "late answer")
+    assert flight.claim("key")[1]
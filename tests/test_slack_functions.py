@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from llm_service.llm_functions import ToneDetectionResponse
+from slack_service import slack_functions
+from slack_service.slack_functions import build_tone_blocks, describe_duration
+from slack_service.slack_transport import PooledWebClient
+
+TONE = ToneDetectionResponse(
+    original_message='Can you "fix" this by 5?',
+    tone="neutral",
+    explanation="A request with a deadline.",
+    urgency="urgent",
+    confidence=90,
+    quick_replies=["On it.", "Will do.", "Done by 5."],
+)
+
+
+class FakeSession:
+    def __init__(self):
+        self.sent = []
+
+    def post(self, url, data=None, headers=None, timeout=None, proxies=None):
+        self.sent.append((url, data, headers))
+
+        class Response:
+            status_code = 200
+            reason = "OK"
+            encoding = "utf-8"
+            headers = {"Content-Type": "application/json"}
+            text = '{"ok": true}'
+            content = text.encode()
+        return Response()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    client = PooledWebClient(token="xoxb-test")
+    fake = FakeSession()
+    monkeypatch.setattr(client, "_session", lambda: fake)
+    monkeypatch.setattr(slack_functions, "client", client)
+    return fake
+
+
+def test_rendered_blocks_are_valid_block_kit_json():
+    blocks = json.loads(build_tone_blocks(TONE, "el"))
+    assert blocks[0]["type"] == "section"
+    assert blocks[-1]["elements"][-1]["value"] == TONE.original_message
+    actions = [element["action_id"] for block in blocks if block["type"] == "actions" for element in block["elements"]]
+    assert actions == ["quick_reply_0", "quick_reply_1", "quick_reply_2", "translate_to_el"]
+
+
+def test_ephemeral_messages_send_the_rendered_blocks_as_one_json_string(session):
+    slack_functions.send_ephemeral_tone_message("C1", "U1", TONE, "el")
+    (url, data, headers), = session.sent
+    assert url.endswith("/chat.postEphemeral")
+    assert headers["Content-type"] == "application/json;charset=utf-8"
+    assert data == json.dumps({
+        "channel": "C1",
+        "user": "U1",
+        "text": "Detected tone and quick replies",
+        "blocks": build_tone_blocks(TONE, "el"),
+    }).encode("utf-8")
+
+
+def test_response_url_messages_splice_the_rendered_blocks_in(session):
+    assert slack_functions.send_response_url_tone_message("https://hooks.example/1", TONE, "el")
+    (url, data, _), = session.sent
+    assert url == "https://hooks.example/1"
+    blocks = build_tone_blocks(TONE, "el")
+    assert blocks.encode("utf-8") in data
+    assert json.loads(data) == {
+        "text": "Detected tone and quick replies",
+        "blocks": json.loads(blocks),
+        "response_type": "ephemeral",
+    }
+
+
+@pytest.mark.parametrize("seconds, text", [
+    (1, "1 second"), (10, "10 seconds"), (60, "1 minute"), (90, "90 seconds"), (7200, "2 hours"),
+])
+def test_describe_duration(seconds, text):
+    assert describe_duration(seconds) == text
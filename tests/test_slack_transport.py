@@ -0,0 +1,52 @@
+import ssl
+
+import pytest
+import requests
+from slack_sdk.web.base_client import BaseClient
+
+from slack_service import slack_transport
+from slack_service.slack_transport import PooledWebClient
+
+PROXY = "http://proxy.example:3128"
+
+
+def ok_response(request):
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json"
+    response._content = b'{"ok": true}'
+    response.request = request
+    response.url = request.url
+    return response
+
+
+def test_the_pooled_session_uses_the_clients_ssl_context():
+    context = ssl.create_default_context()
+    session = PooledWebClient(token="xoxb-test", ssl=context)._session()
+    adapter = session.get_adapter("https://slack.com/api/")
+    assert adapter.poolmanager.connection_pool_kw["ssl_context"] is context
+    assert adapter.proxy_manager_for(PROXY).connection_pool_kw["ssl_context"] is context
+    assert session.verify
+
+
+def test_calls_go_through_the_clients_proxy(monkeypatch):
+    # An explicit proxy wins over the environment, like the SDK's urllib opener
+    monkeypatch.setenv("HTTPS_PROXY", "http://other.example:8080")
+    client = PooledWebClient(token="xoxb-test", proxy=PROXY)
+    adapter = client._session().get_adapter("https://slack.com/api/")
+    sent = []
+
+    def send(request, **kwargs):
+        sent.append(kwargs["proxies"])
+        return ok_response(request)
+
+    monkeypatch.setattr(adapter, "send", send)
+    assert client.api_call("auth.test")["ok"]
+    assert client.post_json("https://hooks.example/1", "{}").status_code == 200
+    assert [proxies["https"] for proxies in sent] == [PROXY, PROXY]
+
+
+def test_an_sdk_without_the_transport_hook_fails_loudly(monkeypatch):
+    monkeypatch.delattr(BaseClient, slack_transport.SDK_TRANSPORT_METHOD)
+    with pytest.raises(ImportError, match="slack_sdk"):
+        slack_transport.check_sdk_transport()
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import pytest
+
+from llm_service import thread_summarizer
+from llm_service.thread_summarizer import chunk_messages, from_people, summarize_thread
+from resources import tone
+
+
+class FakeModel:
+    """
+    Stands in for the provider router and generate: records each prompt and answers with a fixed text.
+    """
+
+    def __init__(self):
+        self.prompts = []
+        self.streamed = []
+
+    def generate(self, contents, config=None):
+        self.prompts.append(contents)
+        return SimpleNamespace(text=f"partial {len(self.prompts)}")
+
+    def stream(self, contents, config=None, on_response=None):
+        self.streamed.append(contents)
+        yield SimpleNamespace(text="the ")
+        yield SimpleNamespace(text="summary")
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(thread_summarizer, "router", fake)
+    monkeypatch.setattr(thread_summarizer, "generate", fake.generate)
+    return fake
+
+
+def people(*texts, start=1):
+    return [{"user": f"U{i}", "text": text, "ts": f"100.{i:06d}"} for i, text in enumerate(texts, start=start)]
+
+
+BOT_MESSAGES = [
+    {"bot_id": "B1", "text": "*Thread summary*\nold", "ts": "100.900000"},
+    {"subtype": "bot_message", "text": "_Summarizing this thread…_", "ts": "100.900001"},
+]
+
+
+def test_from_people_drops_bot_messages():
+    messages = people("hello") + BOT_MESSAGES
+    assert list(from_people(messages)) == people("hello")
+
+
+def test_chunks_fit_the_budget():
+    chunks = list(chunk_messages(people("a" * 40, "b" * 40, "c" * 40), budget=25))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+
+
+def test_a_short_thread_is_streamed_in_one_call(model):
+    updates = []
+    summary = summarize_thread(people("first", "second") + BOT_MESSAGES, updates.append, update_interval=0)
+    assert summary == "the summary"
+    assert updates[-1] == "the summary"
+    assert model.prompts == []
+    assert len(model.streamed) == 1
+    assert "second" in model.streamed[0] and "Summarizing" not in model.streamed[0]
+
+
+def test_a_long_thread_is_summarized_in_parts(model):
+    messages = people(*("x" * (thread_summarizer.CHUNK_TOKENS * 3) for _ in range(3)))
+    summary = summarize_thread(messages, lambda text: None, update_interval=0)
+    assert summary == "the summary"
+    assert len(model.prompts) == 3
+    assert "partial 3" in model.streamed[0]
+
+
+def test_an_empty_thread_is_not_sent_to_the_model(model):
+    assert summarize_thread(BOT_MESSAGES, lambda text: None) == "_There are no messages to summarize._"
+    assert model.streamed == []
+
+
+def test_a_failed_summary_replaces_the_placeholder(monkeypatch):
+    updates = []
+    monkeypatch.setattr(tone, "post_thread_message", lambda channel_id, thread_ts, text: "200.000001")
+    monkeypatch.setattr(tone, "update_message", lambda channel_id, ts, text: updates.append((ts, text)))
+
+    def failing(*args):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(tone, "summarize_thread_incremental", failing)
+    tone._summarize_thread("C1", "99.000001")
+    assert len(updates) == 1
+    assert updates[0][0] == "200.000001"
+    assert "could not be summarized" in updates[0][1]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(thread_summarizer, "summary_cache", thread_summarizer.ResponseCache("test_summary_cache"))
+
+
+def test_incremental_summaries_send_only_new_messages(model, cache):
+    fetched = []
+
+    def fetch(messages):
+        def fetch_messages(oldest):
+            fetched.append(oldest)
+            return messages
+        return fetch_messages
+
+    first = people("first", "second")
+    thread_summarizer.summarize_thread_incremental("C1", "100.000001", fetch(first + BOT_MESSAGES), lambda text: None)
+    # The parent is returned again, and the bot's placeholder and summary do not count as new activity
+    thread_summarizer.summarize_thread_incremental("C1", "100.000001", fetch(first[-1:] + BOT_MESSAGES), lambda text: None)
+    assert fetched == [None, "100.000002"]
+    assert len(model.streamed) == 1
+
+    summary = thread_summarizer.summarize_thread_incremental(
+        "C1", "100.000001", fetch(people("third", start=3)), lambda text: None
+    )
+    assert summary == "the summary"
+    assert fetched[-1] == "100.000002"
+    assert "Summary so far:\nthe summary" in model.streamed[-1]
+    assert "third" in model.streamed[-1] and "second" not in model.streamed[-1]
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from llm_service import llm_functions
+from llm_service.llm_functions import detect_tones
+from llm_service.tone_batcher import ToneBatcher
+
+FIELDS = {
+    "tone": "neutral",
+    "explanation": "A status update.",
+    "urgency": "not urgent",
+    "confidence": 90,
+    "quick_replies": ["Thanks!", "Noted.", "Got it."],
+}
+
+
+@pytest.fixture
+def texts():
+    # Unique texts, so nothing is answered from the tone cache
+    return [f"Status update {uuid.uuid4()} number {n}" for n in range(3)]
+
+
+@pytest.fixture
+def one_bad_item(monkeypatch, texts):
+    # The second message's part of the batched answer is unusable, and so is its retry
+    monkeypatch.setattr(llm_functions, "fast_tone", lambda text: None)
+    monkeypatch.setattr(llm_functions, "_detect_batch", lambda batch: [(dict(FIELDS), []), None, (dict(FIELDS), [])])
+
+    def retry(text, cache_key):
+        raise ValueError("No usable field in the tone analysis")
+
+    monkeypatch.setattr(llm_functions, "_detect_tone_uncached", retry)
+
+
+def test_one_failed_item_does_not_fail_the_batch(one_bad_item, texts):
+    results = detect_tones(texts)
+    assert [result.original_message for result in (results[0], results[2])] == [texts[0], texts[2]]
+    assert isinstance(results[1], ValueError)
+    # The failed message's single flight is freed, so the next request tries again
+    assert llm_functions.tone_cache_key(texts[1]) not in llm_functions.tone_flight._inflight
+
+
+def test_the_batcher_fails_only_the_bad_item(one_bad_item, texts):
+    batcher = ToneBatcher(detect_tones, window=0.05, max_batch_size=3)
+    futures = [batcher.submit(text) for text in texts]
+    assert futures[0].result(timeout=5).tone == "neutral"
+    assert futures[2].result(timeout=5).tone == "neutral"
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
@@ -0,0 +1,119 @@
+import json
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+import pytest
+
+from app import app
+from llm_service.llm_functions import AllowedUrgency
+from resources import tone
+from slack_service import payload
+from worker_service.dispatcher import QueueFullError
+from worker_service.result_store import ResultStore
+
+
+class FakeDispatcher:
+    def __init__(self, full=False):
+        self.full = full
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        if self.full:
+            raise QueueFullError("full")
+        self.jobs.append((fn.__name__, args))
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+def on_request_thread(name):
+    def fail(*args, **kwargs):
+        pytest.fail(f"{name} called on the request thread")
+    fail.__name__ = name
+    return fail
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(payload, "_secret", None)
+    monkeypatch.setattr(payload, "ALLOW_UNSIGNED", True)
+    monkeypatch.setattr(tone, "analyses", ResultStore("test_routes_store"))
+    # Web API methods wait for the rate limiter, so they must only run on dispatcher workers
+    for name in ("post_analyze_button", "send_simple_message", "send_simple_ephemeral_message",
+                 "send_ephemeral_tone_message", "post_thread_message", "update_message"):
+        monkeypatch.setattr(tone, name, on_request_thread(name))
+    return app.test_client()
+
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    fake = FakeDispatcher()
+    monkeypatch.setattr(tone, "dispatcher", fake)
+    return fake
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    sent = []
+    monkeypatch.setattr(tone, "send_response_url_message", lambda url, text: sent.append((url, text)) or True)
+    return sent
+
+
+def interaction(client, body):
+    return client.post("/slack/interactions", data=urlencode({"payload": json.dumps(body)}),
+                       content_type="application/x-www-form-urlencoded")
+
+
+def test_message_events_queue_the_analyze_button(client, dispatcher, monkeypatch):
+    analysis = Future()
+    analysis.set_result(SimpleNamespace(urgency=AllowedUrgency.NOT_URGENT))
+    monkeypatch.setattr(tone, "is_user_opted_in", lambda user_id: True)
+    monkeypatch.setattr(tone, "submit_tone", lambda *args: analysis)
+    event = {"type": "message", "channel": "C1", "user": "U1", "text": "hi", "ts": f"{time.time():.6f}"}
+    response = client.post("/slack/events", json={"type": "event_callback", "event_id": f"Ev{time.time_ns()}", "event": event})
+    assert response.status_code == 200
+    assert dispatcher.jobs == [("post_analyze_button", ("C1", "U1", event["ts"]))]
+
+
+def test_detect_tone_answers_busy_inline_when_the_queue_is_full(client, monkeypatch):
+    monkeypatch.setattr(tone, "dispatcher", FakeDispatcher(full=True))
+    response = client.post("/detect-tone", data={"user_id": "U1", "channel_id": "C1", "text": "hi"})
+    assert response.status_code == 200
+    assert response.get_json() == {"response_type": "ephemeral", "text": tone.BUSY_MESSAGE}
+
+
+def test_quick_replies_are_queued(client, dispatcher, replies):
+    body = {"type": "block_actions", "channel": {"id": "C1"}, "user": {"id": "U1"}, "response_url": "https://hooks/1",
+            "actions": [{"action_id": "quick_reply_0", "value": "On it."}]}
+    assert interaction(client, body).status_code == 200
+    assert dispatcher.jobs == [("send_simple_message", ("C1", "On it."))]
+    assert replies == []
+
+
+def test_a_full_queue_is_reported_through_the_response_url(client, monkeypatch, replies):
+    monkeypatch.setattr(tone, "dispatcher", FakeDispatcher(full=True))
+    body = {"type": "block_actions", "channel": {"id": "C1"}, "user": {"id": "U1"}, "response_url": "https://hooks/1",
+            "actions": [{"action_id": "translate_to_greek", "value": "hello"}]}
+    assert interaction(client, body).status_code == 200
+    assert replies == [("https://hooks/1", tone.BUSY_MESSAGE)]
+
+
+def test_a_finished_analysis_is_delivered_from_a_worker(client, dispatcher, monkeypatch):
+    analysis = Future()
+    analysis.set_result("analysis")
+    tone.analyses.put(("C1", "100.000001"), analysis)
+    monkeypatch.setattr(tone, "get_user_language", lambda user_id: None)
+    body = {"type": "block_actions", "channel": {"id": "C1"}, "user": {"id": "U1"}, "team": {"id": "T1"},
+            "actions": [{"action_id": "analyze_message", "value": "100.000001"}]}
+    assert interaction(client, body).status_code == 200
+    assert dispatcher.jobs == [("send_ephemeral_tone_message", ("C1", "U1", "analysis", tone.DEFAULT_LANGUAGE))]
+
+
+def test_summaries_are_queued(client, dispatcher):
+    body = {"type": "message_action", "callback_id": "summarize_thread", "channel": {"id": "C1"},
+            "message": {"ts": "100.000001", "thread_ts": "99.000001"}}
+    assert interaction(client, body).status_code == 200
+    assert dispatcher.jobs == [("_summarize_thread", ("C1", "99.000001"))]
+
@@ -0,0 +1,76 @@
+import json
+import threading
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from llm_service import llm_functions, translation
+
+FIELDS = {
+    "tone": "neutral",
+    "explanation": "A status update.",
+    "urgency": "not urgent",
+    "confidence": 90,
+    "quick_replies": ["Thanks!", "Noted.", "Got it."],
+}
+
+
+@pytest.fixture
+def text(monkeypatch):
+    monkeypatch.setattr(llm_functions, "fast_tone", lambda text: None)
+    monkeypatch.setattr(translation, "fast_tone", lambda text: None)
+    # A unique text, so nothing is answered from the caches
+    return f"Status update {uuid.uuid4()}"
+
+
+def test_combined_call_is_shared_with_plain_tone_detection(monkeypatch, text):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def generate(config=None, contents=None, parse=None):
+        calls.append(contents)
+        started.set()
+        release.wait(5)
+        return parse(SimpleNamespace(text=json.dumps(dict(FIELDS, translation="Ενημέρωση"))))
+
+    def separate_call(text, cache_key):
+        pytest.fail("detect_tone should join the combined call")
+
+    monkeypatch.setattr(translation, "generate", generate)
+    monkeypatch.setattr(llm_functions, "_detect_tone_uncached", separate_call)
+
+    results = {}
+    coalesced = llm_functions.tone_flight._coalesced.value
+    combined = threading.Thread(target=lambda: results.update(combined=translation.detect_tone_and_translate(text, "el")))
+    combined.start()
+    assert started.wait(5)
+    plain = threading.Thread(target=lambda: results.update(plain=llm_functions.detect_tone(text)))
+    plain.start()
+    while llm_functions.tone_flight._coalesced.value <= coalesced:
+        threading.Event().wait(0.01)
+    release.set()
+    combined.join(5)
+    plain.join(5)
+
+    tone_response, translated = results["combined"]
+    assert translated == "Ενημέρωση"
+    assert results["plain"].tone == tone_response.tone == "neutral"
+    assert len(calls) == 1
+    assert llm_functions.tone_cache.get(llm_functions.tone_cache_key(text)) is not None
+
+
+def test_failed_combined_answer_falls_back_to_tone_only(monkeypatch, text):
+    def generate(config=None, contents=None, parse=None):
+        # Cut off before the translation
+        return parse(SimpleNamespace(text=json.dumps(FIELDS)))
+
+    def tone_only(text, cache_key):
+        return llm_functions.finish_tone_response(text, cache_key, dict(FIELDS))
+
+    monkeypatch.setattr(translation, "generate", generate)
+    monkeypatch.setattr(translation, "_detect_tone_uncached", tone_only)
+
+    tone_response, translated = translation.detect_tone_and_translate(text, "el")
+    assert tone_response.tone == "neutral"
+    assert translated is None
+    assert llm_functions.tone_cache_key(text) not in llm_functions.tone_flight._inflight
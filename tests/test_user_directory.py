@@ -0,0 +1,85 @@
+import json
+import time
+
+from slack_sdk.errors import SlackApiError
+
+from slack_service.user_directory import UserDirectory
+
+
+class FakeClient:
+    def __init__(self, pages, fail_after=None):
+        self.pages = pages
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def users_list(self, limit):
+        self.calls += 1
+        for i, members in enumerate(self.pages):
+            if i == self.fail_after:
+                raise SlackApiError("ratelimited", {"error": "ratelimited"})
+            yield {"members": members}
+
+
+PAGES = [
+    [{"id": "U1", "name": "alice"}, {"id": "B1", "name": "bot", "is_bot": True}],
+    [{"id": "U2", "name": "bob"}, {"id": "U3", "name": "gone", "deleted": True}, {"id": "USLACKBOT", "name": "slackbot"}],
+]
+
+
+def test_first_lookup_fetches_humans_and_saves_a_snapshot(tmp_path):
+    path = tmp_path / "users.json"
+    client = FakeClient(PAGES)
+    directory = UserDirectory(client, snapshot_path=str(path))
+    assert client.calls == 0
+    assert sorted(directory.users()) == [("U1", "alice"), ("U2", "bob")]
+    assert directory.get_name("U2") == "bob"
+    assert client.calls == 1
+    assert json.loads(path.read_text())["users"] == {"U1": "alice", "U2": "bob"}
+
+
+def test_a_fresh_snapshot_is_used_without_calling_the_api(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps({"saved_at": time.time(), "users": {"U9": "zoe"}}))
+    client = FakeClient(PAGES)
+    assert UserDirectory(client, snapshot_path=str(path)).get_name("U9") == "zoe"
+    assert client.calls == 0
+
+
+def test_a_partial_fetch_is_served_but_not_saved(tmp_path):
+    path = tmp_path / "users.json"
+    directory = UserDirectory(FakeClient(PAGES, fail_after=1), snapshot_path=str(path))
+    assert directory.users() == [("U1", "alice")]
+    assert not path.exists()
+
+
+def test_a_partial_refresh_keeps_the_current_index(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps({"saved_at": time.time(), "users": {"U9": "zoe"}}))
+    directory = UserDirectory(FakeClient(PAGES, fail_after=1), snapshot_path=str(path))
+    directory.get_name("U9")
+    directory.refresh()
+    assert directory.users() == [("U9", "zoe")]
+
+
+def test_events_update_the_index_and_are_saved_later(tmp_path):
+    path = tmp_path / "users.json"
+    directory = UserDirectory(FakeClient(PAGES), snapshot_path=str(path), save_delay=0.05)
+    directory.users()
+    directory.apply_event({"type": "team_join", "user": {"id": "U4", "name": "carol"}})
+    directory.apply_event({"type": "user_change", "user": {"id": "U1", "name": "alice", "deleted": True}})
+    assert sorted(directory.users()) == [("U2", "bob"), ("U4", "carol")]
+    # The snapshot is written by a timer, not by the request thread
+    assert "U4" not in json.loads(path.read_text())["users"]
+    deadline = time.monotonic() + 2
+    while "U4" not in json.loads(path.read_text())["users"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(path.read_text())["users"] == {"U2": "bob", "U4": "carol"}
+
+
+def test_events_before_the_first_lookup_are_ignored():
+    client = FakeClient(PAGES)
+    directory = UserDirectory(client)
+    directory.apply_event({"type": "team_join", "user": {"id": "U4", "name": "carol"}})
+    directory.apply_event({"type": "team_join", "user": "U5"})
+    assert client.calls == 0
+    assert directory.get_name("U4") is None
@@ -0,0 +1,87 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from slack_service.user_prefs import UserPrefsStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "user_prefs.db")
+
+
+@pytest.fixture
+def legacy_json(tmp_path):
+    path = tmp_path / "user_prefs.json"
+    path.write_text(json.dumps({"U1": True, "U2": False, "U3": True}))
+    return str(path)
+
+
+def test_legacy_json_is_imported_once_and_renamed(db_path, legacy_json):
+    store = UserPrefsStore(db_path, legacy_json_path=legacy_json)
+    assert [store.is_opted_in(user_id) for user_id in ("U1", "U2", "U3")] == [True, False, True]
+    with open(legacy_json + ".migrated") as f:
+        assert json.load(f)["U1"] is True
+    with pytest.raises(FileNotFoundError):
+        open(legacy_json)
+
+    # A second worker finds the file gone and reads the rows from the database
+    other = UserPrefsStore(db_path, legacy_json_path=legacy_json)
+    assert other.is_opted_in("U3")
+
+
+def test_rows_already_in_the_database_win_over_the_legacy_file(db_path, legacy_json):
+    UserPrefsStore(db_path).set_opt_in("U1", False)
+    store = UserPrefsStore(db_path, legacy_json_path=legacy_json)
+    assert not store.is_opted_in("U1")
+    assert store.is_opted_in("U3")
+
+
+def test_changes_from_another_store_are_picked_up(db_path):
+    writer = UserPrefsStore(db_path)
+    reader = UserPrefsStore(db_path, refresh_interval=0)
+    assert not reader.is_opted_in("U1")
+    assert reader.language("U1") is None
+
+    writer.set_opt_in("U1", True)
+    writer.set_language("U1", "fr")
+    assert reader.is_opted_in("U1")
+    assert reader.language("U1") == "fr"
+
+    writer.set_language("U1", None)
+    assert reader.language("U1") is None
+
+
+def test_reads_are_served_from_memory_until_the_refresh_interval(db_path):
+    writer = UserPrefsStore(db_path)
+    reader = UserPrefsStore(db_path, refresh_interval=3600)
+    assert not reader.is_opted_in("U1")
+    writer.set_opt_in("U1", True)
+    assert not reader.is_opted_in("U1")
+
+
+def test_reads_during_a_write_see_the_previous_snapshot(db_path):
+    store = UserPrefsStore(db_path, refresh_interval=3600)
+    store.set_opt_in("U1", True)
+    snapshot = store._index
+
+    # Another process holds the write lock, so set_opt_in waits inside the store's lock
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    writer = threading.Thread(target=store.set_opt_in, args=("U2", True))
+    writer.start()
+    while not store._lock.locked():
+        threading.Event().wait(0.01)
+
+    # Readers do not take the lock and see a complete dict
+    assert store.is_opted_in("U1")
+    assert not store.is_opted_in("U2")
+
+    blocker.execute("ROLLBACK")
+    writer.join(5)
+    assert store.is_opted_in("U2")
+    # The write replaced the dict instead of changing the one readers held
+    assert "U2" not in snapshot
+    blocker.close()
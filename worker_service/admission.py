@@ -0,0 +1,186 @@
+"""
+admission.py
+Admission control for LLM work.
+This module charges each request's estimated cost to token buckets of its user,
+channel and team, so one noisy tenant cannot use up the shared Gemini quota, and
+provides the weighted fair queue that shares the LLM between tenants.
+"""
+import heapq
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+from metrics_service import metrics
+from worker_service.token_bucket import TokenBucket
+
+
+class OverBudgetError(Exception):
+    """
+    Raised when a request is over its budget and there is no lightweight answer for it.
+    """
+
+
+class FairQueue:
+    """
+    Self-clocked weighted fair queue. Each tenant's items leave in the order they
+    arrived, and tenants with a backlog share the output in proportion to their
+    weights, measured in cost, so a tenant sending more than its share only delays itself.
+    Not thread-safe: callers hold their own lock.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._last_finish = {}
+        self._pending = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+
+    def push(self, tenant, item, cost=1.0, weight=1.0):
+        finish = max(self._virtual_time, self._last_finish.get(tenant, 0.0)) + cost / weight
+        self._last_finish[tenant] = finish
+        self._pending[tenant] = self._pending.get(tenant, 0) + 1
+        heapq.heappush(self._heap, (finish, next(self._sequence), tenant, item))
+
+    def pop(self):
+        """
+        Removes and returns the item with the earliest finish tag.
+        """
+        finish, _, tenant, item = heapq.heappop(self._heap)
+        self._virtual_time = finish
+        left = self._pending[tenant] - 1
+        if left:
+            self._pending[tenant] = left
+        else:
+            # An idle tenant starts again from the virtual time, so nothing is kept for it
+            del self._pending[tenant]
+            del self._last_finish[tenant]
+        return item
+
+    def backlog(self):
+        """
+        Returns the number of waiting items per tenant.
+        """
+        return dict(self._pending)
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class AdmissionController:
+    """
+    Hierarchical token buckets: a request is admitted only if its user, channel
+    and team buckets all hold its cost, and is then charged to all of them.
+    Each level is (name, tokens per minute); a bucket holds one minute of budget.
+    Buckets of the max_tracked most recently seen keys per level are kept.
+    """
+
+    def __init__(self, levels, max_tracked=10000, weights=None, enabled=True):
+        self.levels = tuple(levels)
+        self.max_tracked = max_tracked
+        self.weights = weights or {}
+        self.enabled = enabled
+        self._buckets = {name: OrderedDict() for name, _ in self.levels}
+        self._lock = threading.Lock()
+
+        self._admitted = metrics.counter("admission_admitted_total", "LLM requests admitted within budget")
+        self._charged = metrics.counter("admission_tokens_charged_total", "Estimated Gemini tokens charged to budgets")
+        self._rejected = {
+            name: metrics.counter(f"admission_rejected_{name}_total", f"LLM requests over their {name} budget")
+            for name, _ in self.levels
+        }
+
+    def _bucket(self, name, per_minute, key):
+        # Called with self._lock held
+        buckets = self._buckets[name]
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(per_minute / 60.0, per_minute)
+            if len(buckets) > self.max_tracked:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, cost, **keys):
+        """
+        Charges cost to the bucket of each level named in keys, e.g.
+        admit(500, user="U1", channel="C1", team="T1"). Returns False, charging
+        nothing, if any of them does not hold cost.
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            taken = []
+            for name, per_minute in self.levels:
+                key = keys.get(name)
+                if key is None:
+                    continue
+                bucket = self._bucket(name, per_minute, key)
+                if not bucket.try_acquire(cost):
+                    for earlier in taken:
+                        earlier.refund(cost)
+                    self._rejected[name].inc()
+                    return False
+                taken.append(bucket)
+        self._admitted.inc()
+        self._charged.inc(cost)
+        return True
+
+    def weight(self, *keys):
+        """
+        Returns the fair-queue weight of the first key with one configured, or 1.
+        """
+        for key in keys:
+            if key in self.weights:
+                return self.weights[key]
+        return 1.0
+
+    def snapshot(self, limit=20):
+        """
+        Describes current budget usage: per level, the budget and the limit keys
+        that have used the largest part of theirs.
+        """
+        levels = {}
+        with self._lock:
+            buckets = {name: list(self._buckets[name].items()) for name, _ in self.levels}
+        for name, per_minute in self.levels:
+            usage = [(key, bucket.available()) for key, bucket in buckets[name]]
+            usage.sort(key=lambda item: item[1])
+            levels[name] = {
+                "tokens_per_minute": per_minute,
+                "tracked": len(usage),
+                "rejected": self._rejected[name].value,
+                "busiest": [
+                    {"key": key, "available": round(max(available, 0.0)), "used": round(1 - max(available, 0.0) / per_minute, 3)}
+                    for key, available in usage[:limit]
+                ],
+            }
+        return {
+            "enabled": self.enabled,
+            "admitted": self._admitted.value,
+            "tokens_charged": self._charged.value,
+            "levels": levels,
+        }
+
+
+def _parse_weights(spec):
+    # "C0123=2,T0456=0.5" -> {"C0123": 2.0, "T0456": 0.5}
+    weights = {}
+    for part in (spec or "").split(","):
+        key, _, value = part.partition("=")
+        if key.strip() and value.strip():
+            weights[key.strip()] = float(value)
+    return weights
+
+
+admission = AdmissionController(
+    levels=(
+        ("user", int(os.getenv("ADMISSION_USER_TOKENS_PER_MINUTE", "5000"))),
+        ("channel", int(os.getenv("ADMISSION_CHANNEL_TOKENS_PER_MINUTE", "20000"))),
+        ("team", int(os.getenv("ADMISSION_TEAM_TOKENS_PER_MINUTE", "200000"))),
+    ),
+    max_tracked=int(os.getenv("ADMISSION_MAX_TRACKED", "10000")),
+    weights=_parse_weights(os.getenv("ADMISSION_WEIGHTS")),
+    enabled=os.getenv("ADMISSION_ENABLED", "1") == "1",
+)
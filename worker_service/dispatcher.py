@@ -0,0 +1,106 @@
+"""
+dispatcher.py
+Background work dispatch for slow Slack handlers.
+This module provides a bounded worker pool so endpoints can acknowledge Slack
+within its 3 second deadline and finish LLM and Slack API work afterwards.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics_service import metrics, tracing
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while the dispatch queue is at its depth limit.
+    """
+
+
+class Dispatcher:
+    """
+    A fixed-size pool of worker threads fed by a bounded queue.
+    Submitting to a full queue fails immediately instead of blocking the request thread.
+    """
+
+    def __init__(self, name, max_workers=4, max_queue_depth=100):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self._depth = metrics.gauge(f"{name}_queue_depth", "Jobs waiting for a worker")
+        self._rejected = metrics.counter(f"{name}_rejected_total", "Jobs rejected because the queue was full")
+        self._failed = metrics.counter(f"{name}_failed_total", "Jobs that raised an exception")
+        self._queue_wait = metrics.histogram(f"{name}_queue_wait_seconds", "Time from enqueue to job start")
+        self._enqueue_to_delivery = metrics.histogram(
+            f"{name}_enqueue_to_delivery_seconds", "Time from enqueue to job completion"
+        )
+
+    def _ensure_started(self):
+        # Threads are started on first use, and again after a fork, so that
+        # gunicorn workers never inherit a pool whose threads do not exist.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_depth)
+            self._threads = []
+            for i in range(self.max_workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Enqueues fn(*args, **kwargs) and returns a Future for its result.
+        Raises QueueFullError when the queue depth limit has been reached.
+        """
+        self._ensure_started()
+        future = Future()
+        try:
+            # The job's trace points back to the request that submitted it
+            self._queue.put_nowait((time.perf_counter(), tracing.current_trace_id(), future, fn, args, kwargs))
+        except queue.Full:
+            self._rejected.inc()
+            raise QueueFullError(f"{self.name} queue is full ({self.max_queue_depth} jobs)")
+        self._depth.set(self._queue.qsize())
+        return future
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        work_queue = self._queue
+        while True:
+            enqueued_at, parent_trace, future, fn, args, kwargs = work_queue.get()
+            self._depth.set(work_queue.qsize())
+            self._queue_wait.observe(time.perf_counter() - enqueued_at)
+            if not future.set_running_or_notify_cancel():
+                work_queue.task_done()
+                continue
+            trace = tracing.start_trace(f"{self.name}:{getattr(fn, '__name__', fn)}", parent_trace)
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                self._failed.inc()
+                print(f"Error in {self.name} job {getattr(fn, '__name__', fn)}: {e}")
+                future.set_exception(e)
+            finally:
+                tracing.end_trace(trace)
+                self._enqueue_to_delivery.observe(time.perf_counter() - enqueued_at)
+                work_queue.task_done()
+
+
+dispatcher = Dispatcher(
+    "dispatch",
+    max_workers=int(os.getenv("DISPATCH_WORKERS", "4")),
+    max_queue_depth=int(os.getenv("DISPATCH_QUEUE_DEPTH", "100")),
+)
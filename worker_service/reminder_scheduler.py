@@ -0,0 +1,207 @@
+"""
+reminder_scheduler.py
+Durable scheduler for urgent-message reminders.
+This module keeps pending reminders in SQLite and drives them from a heap with a
+single thread per process, so reminders survive restarts and fire exactly once
+across gunicorn workers.
+"""
+import heapq
+import os
+import sqlite3
+import threading
+import time
+
+from metrics_service import metrics
+from slack_service.slack_functions import send_reminder_if_no_reply
+from worker_service.dispatcher import dispatcher, QueueFullError
+
+# Delay before a reminder is tried again when the dispatch queue is full
+RETRY_SECONDS = float(os.getenv("REMINDER_RETRY_SECONDS", "5"))
+# How long a reply is remembered, so a reminder scheduled after it is not sent
+REPLIED_TTL = 24 * 3600
+
+
+class ReminderScheduler:
+    """
+    Schedules fire(channel_id, message_ts, user_id) to run after a delay unless cancelled.
+    The database row is the source of truth: firing deletes the row first, and
+    only the process whose delete succeeds sends the reminder. Each process also
+    sweeps the table for due reminders, so reminders scheduled by a worker that
+    has since exited are still sent. Cancelling also records the reply, because
+    a message's analysis may finish, and schedule its reminder, after the reply.
+    """
+
+    def __init__(self, path, fire, sweep_interval=30.0):
+        self.path = path
+        self.fire = fire
+        self.sweep_interval = sweep_interval
+        self._heap = []
+        self._entries = {}
+        self._seq = 0
+        self._conn = None
+        self._pid = None
+        self._next_sweep = 0.0
+        self._condition = threading.Condition()
+
+        self._pending = metrics.gauge("reminders_pending", "Reminders waiting in this process")
+        self._fired = metrics.counter("reminders_fired_total", "Reminders sent")
+        self._cancelled = metrics.counter("reminders_cancelled_total", "Reminders cancelled by a reply")
+
+    def _ensure_started(self):
+        # Called with the condition held. Reopens the database and restarts the thread after a fork.
+        if self._pid == os.getpid():
+            return
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reminders "
+            "(channel_id TEXT NOT NULL, message_ts TEXT NOT NULL, user_id TEXT NOT NULL, due_at REAL NOT NULL, "
+            "PRIMARY KEY (channel_id, message_ts))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS reminders_due_at ON reminders (due_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS replied "
+            "(channel_id TEXT NOT NULL, message_ts TEXT NOT NULL, replied_at REAL NOT NULL, "
+            "PRIMARY KEY (channel_id, message_ts))"
+        )
+        self._conn = conn
+        self._heap = []
+        self._entries = {}
+        self._pid = os.getpid()
+        # Reload everything still pending, including reminders from before a restart
+        self._load(float("inf"))
+        threading.Thread(target=self._run, name="reminder-scheduler", daemon=True).start()
+
+    def start(self):
+        """
+        Opens the database and starts the scheduling thread, so reminders saved
+        before a restart fire on time. Called when a worker process starts.
+        """
+        with self._condition:
+            self._ensure_started()
+
+    def _push(self, key, user_id, due_at):
+        self._entries[key] = (due_at, user_id)
+        self._seq += 1
+        heapq.heappush(self._heap, (due_at, self._seq, key))
+
+    def _load(self, until):
+        rows = self._conn.execute(
+            "SELECT channel_id, message_ts, user_id, due_at FROM reminders WHERE due_at <= ?", (until,)
+        ).fetchall()
+        for channel_id, message_ts, user_id, due_at in rows:
+            key = (channel_id, message_ts)
+            if key not in self._entries:
+                self._push(key, user_id, due_at)
+        self._pending.set(len(self._entries))
+
+    def schedule(self, channel_id, message_ts, user_id, delay):
+        """
+        Schedules a reminder for the message. Scheduling the same message twice keeps
+        the first reminder, and a message that was already replied to gets none.
+        """
+        due_at = time.time() + delay
+        key = (channel_id, message_ts)
+        with self._condition:
+            self._ensure_started()
+            if self._conn.execute(
+                "SELECT 1 FROM replied WHERE channel_id = ? AND message_ts = ?", key
+            ).fetchone():
+                return
+            self._conn.execute(
+                "INSERT OR IGNORE INTO reminders (channel_id, message_ts, user_id, due_at) VALUES (?, ?, ?, ?)",
+                (channel_id, message_ts, user_id, due_at)
+            )
+            if key in self._entries:
+                return
+            self._push(key, user_id, due_at)
+            self._pending.set(len(self._entries))
+            if self._heap[0][2] == key:
+                self._condition.notify()
+
+    def cancel(self, channel_id, message_ts):
+        """
+        Cancels the reminder for the message, whichever worker scheduled it, and
+        any reminder scheduled for it later. Returns True if a pending reminder was cancelled.
+        """
+        with self._condition:
+            self._ensure_started()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO replied (channel_id, message_ts, replied_at) VALUES (?, ?, ?)",
+                (channel_id, message_ts, time.time())
+            )
+            deleted = self._conn.execute(
+                "DELETE FROM reminders WHERE channel_id = ? AND message_ts = ?", (channel_id, message_ts)
+            ).rowcount
+            # The heap entry is skipped lazily when it reaches the top
+            self._entries.pop((channel_id, message_ts), None)
+            self._pending.set(len(self._entries))
+            if len(self._heap) > 2 * len(self._entries) + 1024:
+                self._heap = [item for item in self._heap if self._entries.get(item[2], (None,))[0] == item[0]]
+                heapq.heapify(self._heap)
+        if deleted:
+            self._cancelled.inc()
+        return bool(deleted)
+
+    def pending_count(self):
+        return len(self._entries)
+
+    def _claim_due(self):
+        # Called with the condition held. Returns the reminders this process won, and the time to sleep.
+        now = time.time()
+        if now >= self._next_sweep:
+            self._conn.execute("DELETE FROM replied WHERE replied_at < ?", (now - REPLIED_TTL,))
+            self._load(now + self.sweep_interval)
+            self._next_sweep = now + self.sweep_interval
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, _, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != due_at:
+                continue
+            del self._entries[key]
+            claimed = self._conn.execute(
+                "DELETE FROM reminders WHERE channel_id = ? AND message_ts = ?", key
+            ).rowcount
+            if claimed:
+                due.append((key[0], key[1], entry[1]))
+        self._pending.set(len(self._entries))
+        next_due = self._heap[0][0] if self._heap else float("inf")
+        return due, max(0.0, min(next_due, self._next_sweep) - now)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    try:
+                        due, sleep_for = self._claim_due()
+                    except sqlite3.Error as e:
+                        print(f"Error reading reminders: {e}")
+                        due, sleep_for = [], 1.0
+                    if due:
+                        break
+                    self._condition.wait(sleep_for)
+            for channel_id, message_ts, user_id in due:
+                try:
+                    self.fire(channel_id, message_ts, user_id)
+                    self._fired.inc()
+                except Exception as e:
+                    print(f"Error sending reminder for {channel_id}/{message_ts}: {e}")
+
+
+def _send_reminder(channel_id, message_ts, user_id):
+    # Slack calls run on the dispatcher so a slow post does not delay other reminders.
+    # When it is full the reminder is scheduled again, which a reply in the meantime still cancels
+    try:
+        dispatcher.submit(send_reminder_if_no_reply, channel_id, message_ts, user_id)
+    except QueueFullError:
+        print(f"Dispatch queue is full, retrying the reminder for {channel_id}/{message_ts} in {RETRY_SECONDS:g}s")
+        reminders.schedule(channel_id, message_ts, user_id, RETRY_SECONDS)
+
+
+reminders = ReminderScheduler(
+    os.getenv("REMINDER_DB", "reminders.db"),
+    _send_reminder,
+    sweep_interval=float(os.getenv("REMINDER_SWEEP_SECONDS", "30"))
+)
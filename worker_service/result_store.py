@@ -0,0 +1,116 @@
+"""
+result_store.py
+Bounded store of precomputed results.
+This module keeps the Futures of work started ahead of time, keyed by what the
+work is about, so a later request picks up the finished result or joins the
+computation still in flight instead of starting its own.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics_service import metrics
+
+
+class ResultStore:
+    """
+    Maps keys to Futures for ttl seconds, holding at most max_entries of them.
+    Failed computations are forgotten, so the next request starts a fresh one.
+    """
+
+    def __init__(self, name, max_entries=5000, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = metrics.counter(f"{name}_hits_total", "Requests answered by a finished precomputed result")
+        self._joined = metrics.counter(f"{name}_joined_total", "Requests that waited on a computation already in flight")
+        self._misses = metrics.counter(f"{name}_misses_total", "Requests that had to start a computation")
+        self._size = metrics.gauge(f"{name}_entries", "Results held")
+
+    def _evict(self, now):
+        # Called with self._lock held. Entries share one ttl, so the oldest are first.
+        while self._entries:
+            _, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+        self._size.set(len(self._entries))
+
+    def _forget_failed(self, key, future):
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] is future:
+                    del self._entries[key]
+                    self._size.set(len(self._entries))
+
+    def get(self, key):
+        """
+        Returns the live Future stored under key, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            return entry[1]
+
+    def get_or_start(self, key, start):
+        """
+        Returns the Future stored under key. If there is none, a placeholder Future
+        is stored and start() is called once the lock is released, so slow set-up
+        in start() holds up no other key; requests for the same key meanwhile join
+        the placeholder. It settles with the outcome of the Future start() returns.
+        An exception raised by start() fails the placeholder and is raised to the caller.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                (self._hits if entry[1].done() else self._joined).inc()
+                return entry[1]
+            self._misses.inc()
+            future = Future()
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl, future)
+            self._evict(now)
+        future.add_done_callback(lambda f: self._forget_failed(key, f))
+        try:
+            started = start()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        started.add_done_callback(lambda f: _copy_outcome(f, future))
+        return future
+
+    def put(self, key, future):
+        """
+        Stores a computation started elsewhere under key.
+        """
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl, future)
+            self._evict(now)
+        future.add_done_callback(lambda f: self._forget_failed(key, f))
+        return future
+
+
+def _copy_outcome(source, target):
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+# Tone analyses of channel messages, keyed by (channel, ts)
+analyses = ResultStore(
+    "analysis_store",
+    max_entries=int(os.getenv("ANALYSIS_STORE_MAX_ENTRIES", "5000")),
+    ttl=int(os.getenv("ANALYSIS_STORE_TTL", str(24 * 3600)))
+)
@@ -0,0 +1,82 @@
+"""
+token_bucket.py
+Thread-safe token bucket rate limiter.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Refills at rate tokens per second up to capacity. Callers take tokens with
+    try_acquire (never waits) or acquire (waits up to a timeout).
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, tokens, now):
+        # Called with the lock held. Returns how long the caller must wait for its tokens.
+        self._refill(now)
+        self._tokens -= tokens
+        wait = max(self._paused_until - now, 0.0)
+        if self._tokens < 0:
+            wait = max(wait, -self._tokens / self.rate)
+        return wait
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes tokens if they are available now. Returns True on success.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until or self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Takes tokens, sleeping until they are available. Waiters are served in
+        arrival order because each one reserves its tokens before sleeping.
+        Returns the time waited, or None (taking nothing) if that would exceed timeout.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._reserve(tokens, now)
+            if timeout is not None and wait > timeout:
+                self._tokens += tokens
+                return None
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def refund(self, tokens=1):
+        """
+        Gives back tokens taken by try_acquire that ended up unused.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def pause(self, seconds):
+        """
+        Hands out no tokens for the given number of seconds, e.g. after a Retry-After.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens